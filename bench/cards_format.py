@@ -0,0 +1,82 @@
+# bench/cards_format.py — card inventory size: full dicts (v1) vs flyweights (v2)
+#
+#   python -m bench.cards_format [--users 2000] [--cards 500] [--out cards.json]
+#
+# Builds one guild of synthetic pulls, writes it in the old v1 shape (a dict
+# per card) and the current v2 shape (template table + [t, r, atk, def] rows),
+# then loads each the way the bot does and reports file bytes, heap bytes held
+# after loading (tracemalloc) and load time.
+from __future__ import annotations
+import argparse, json, os, random, sys, tempfile, time, tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+from carddata import ALL_CARDS, RARITIES
+from cogs import cards_repo
+
+
+def _v1_shard(users: int, cards: int, seed: int = 1) -> Dict[str, Any]:
+    rnd = random.Random(seed)
+    pools = [(r, t) for r in RARITIES for t in ALL_CARDS[r]]
+    out = {}
+    for u in range(users):
+        inv = []
+        for _ in range(cards):
+            rarity, t = rnd.choice(pools)
+            inv.append({"name": t["name"], "element": t["element"], "rarity": rarity,
+                        "atk": rnd.randint(100, 600), "def": rnd.randint(100, 600)})
+        out[str(100_000_000_000_000_000 + u)] = inv
+    return {"version": 1, "users": out}
+
+
+def _measure_load(path: str, load: Callable[[Any], Any]) -> Tuple[int, float]:
+    """(heap bytes held by the loaded object, seconds) for json.load + convert."""
+    def once() -> Any:
+        with open(path, "r", encoding="utf-8") as f:
+            return load(json.load(f))
+    t0 = time.perf_counter()
+    once()
+    dt = time.perf_counter() - t0
+    tracemalloc.start()  # separate pass: tracing slows allocation-heavy loads a lot
+    obj = once()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return held, dt
+
+
+def run(users: int, cards: int) -> Dict[str, Any]:
+    doc1 = _v1_shard(users, cards)
+    inv, _ = cards_repo.from_json(doc1)
+    doc2 = cards_repo.to_json(inv)
+    del inv
+    out: Dict[str, Any] = {"users": users, "cards_per_user": cards}
+    with tempfile.TemporaryDirectory() as root:
+        for name, doc, load in (("v1_dicts", doc1, lambda d: d),
+                                ("v2_flyweight", doc2, lambda d: cards_repo.from_json(d)[0])):
+            path = os.path.join(root, f"{name}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(doc, f, separators=(",", ":"))
+            heap, secs = _measure_load(path, load)
+            out[name] = {"file_bytes": os.path.getsize(path), "heap_bytes": heap, "load_s": secs,
+                         "heap_bytes_per_card": heap / (users * cards)}
+    out["file_ratio"] = out["v1_dicts"]["file_bytes"] / out["v2_flyweight"]["file_bytes"]
+    out["heap_ratio"] = out["v1_dicts"]["heap_bytes"] / out["v2_flyweight"]["heap_bytes"]
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2_000)
+    ap.add_argument("--cards", type=int, default=500)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    doc = json.dumps({"python": sys.version.split()[0], "results": run(args.users, args.cards)}, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(doc + "\n")
+    else:
+        print(doc)
+
+
+if __name__ == "__main__":
+    main()
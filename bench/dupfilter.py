@@ -0,0 +1,100 @@
+# bench/dupfilter.py — per-message cost and accuracy of the XP repeat filter
+#
+#   python -m bench.dupfilter [--messages 200000] [--users 5000] [--out dup.json]
+#
+# Replays a synthetic chat stream through DupFilter.repeat(): most messages
+# are fresh sentences, a share are copy-pastes of the sender's earlier message
+# with a light edit (changed word, suffix, case, spacing). Reports the
+# per-message overhead (p50/p99, messages/s) and how many edited repeats were
+# caught versus fresh messages wrongly flagged.
+from __future__ import annotations
+import argparse, json, random, sys, time
+from typing import Dict, List, Tuple
+
+from cogs.dupfilter import DupFilter
+
+WORDS = ("gg wp lol anyone up for a round tonight who wants to duel me this card pull was "
+         "insane finally got the legendary after pity kicked in what level are you at now "
+         "voice chat later i think the boss is bugged again brb dinner time see you all "
+         "that song slaps queue it up next the weekly board is so close this time").split()
+
+
+def _sentence(rnd: random.Random) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(4, 18)))
+
+
+def _edit(rnd: random.Random, text: str) -> str:
+    words = text.split()
+    kind = rnd.randrange(4)
+    if kind == 0:
+        words[rnd.randrange(len(words))] = rnd.choice(WORDS)
+    elif kind == 1:
+        words.append(rnd.choice(("!!", "lol", ":)", "pls")))
+    elif kind == 2:
+        return text.upper()
+    return "  ".join(words)
+
+
+def _stream(messages: int, users: int, repeat_share: float, seed: int = 1) -> List[Tuple[int, str, bool]]:
+    rnd = random.Random(seed)
+    last: Dict[int, str] = {}
+    out = []
+    for _ in range(messages):
+        uid = rnd.randrange(users)
+        if uid in last and rnd.random() < repeat_share:
+            out.append((uid, _edit(rnd, last[uid]), True))
+        else:
+            text = last[uid] = _sentence(rnd)
+            out.append((uid, text, False))
+    return out
+
+
+def run(messages: int, users: int, repeat_share: float) -> Dict[str, object]:
+    stream = _stream(messages, users, repeat_share)
+    f = DupFilter("bench", ttl=3600)
+    samples = []
+    caught = missed = false_pos = fresh = 0
+    clock = time.perf_counter
+    for uid, text, is_repeat in stream:
+        t0 = clock()
+        dup = f.repeat(uid, text)
+        samples.append(clock() - t0)
+        if is_repeat:
+            caught += dup
+            missed += not dup
+        else:
+            fresh += 1
+            false_pos += dup
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * 1e6
+    return {
+        "messages": messages,
+        "users": users,
+        "repeat_share": repeat_share,
+        "p50_us": pick(0.50),
+        "p99_us": pick(0.99),
+        "messages_per_s": len(s) / sum(s),
+        "repeats_caught": caught / max(1, caught + missed),
+        "fresh_flagged": false_pos / max(1, fresh),
+        "tracked_users": len(f),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200_000)
+    ap.add_argument("--users", type=int, default=5_000)
+    ap.add_argument("--repeat-share", type=float, default=0.3)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    doc = json.dumps({"python": sys.version.split()[0],
+                      "results": run(args.messages, args.users, args.repeat_share)}, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(doc + "\n")
+    else:
+        print(doc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# bench/gacha_sim.py — Monte Carlo check of the gacha odds we promise players
+#
+#   python -m bench.gacha_sim [--pulls 20000000] [--py-pulls 2000000] [--players 10000]
+#                             [--batch 10] [--workers N] [--sigmas 5] [--seed 1] [--out sim.json]
+#
+# Every simulated player makes a fixed number of pulls from pity 0 through the
+# bot's own sampler (cards_cog.SAMPLER), so the soft-pity bump and the hard pity
+# at PITY_MAX are exactly what players get. Both of its code paths are checked:
+#   bulk    Sampler.draw_bulk, the numpy path !pull takes from BULK_MIN cards;
+#           pity carries across commands, so a player's --pulls / --players
+#           pulls are drawn as one stream (skipped without numpy)
+#   python  Sampler.pull(batch, pity, rnd), the per-card loop behind every
+#           smaller !pull and every pull when numpy isn't installed; a player
+#           makes --py-pulls / --players pulls as --batch-card commands with a
+#           seeded random.Random per worker
+# --batch also sets the price paid per command. Players are split over a
+# process pool.
+#
+# The targets come from the configured tables, not from the simulation: with
+# q[p] = P(legendary | pity p), the pulls to the next legendary G have
+#   P(G > k) = prod_{p<k} (1 - q[p]),
+# the long-run legendary share is 1 / E[G] (renewal), and every other rarity
+# keeps its BASE_RATES share of the rest. A player's stream is finite and
+# starts at pity 0, so the legendaries expected in it are computed exactly by
+# walking the pity distribution pull by pull, and the pulls-to-legendary check
+# uses each player's first legendary (i.i.d. like G, never cut off). Each pass
+# reports the distribution, the pulls-to-legendary histogram and coins spent;
+# the run exits 1 if, in either pass, a rarity share or the mean pulls to a
+# first legendary is more than --sigmas standard errors off, or a player ever
+# went past hard pity.
+from __future__ import annotations
+import argparse, json, math, os, random, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from cogs import gacha
+from cogs.cards_cog import BASE_RATES, PITY_MAX, PULL_COST, SAMPLER, _discount
+
+_np = gacha._np
+_SLOTS = PITY_MAX + 2  # histogram slots: [k] = legendaries on the k-th pull since the last
+
+
+def pulls_to_legendary() -> List[float]:
+    """P(G = k) for k = 1..PITY_MAX, from pity 0."""
+    pmf, alive = [], 1.0
+    for p in range(PITY_MAX):
+        q = SAMPLER.chance(p)
+        pmf.append(alive * q)
+        alive *= 1.0 - q
+    return pmf
+
+
+def expected_legendaries(pulls: int) -> float:
+    """Expected legendaries in a player's first `pulls` pulls from pity 0."""
+    q = [SAMPLER.chance(p) for p in range(PITY_MAX)]
+    dist = [1.0] + [0.0] * (PITY_MAX - 1)
+    total = 0.0
+    for _ in range(pulls):
+        hit = [d * x for d, x in zip(dist, q)]
+        h = sum(hit)
+        total += h
+        dist = [h] + [d - x for d, x in zip(dist, hit)][:-1]  # the top pity always hits
+    return total
+
+
+def shares(legendary: float) -> Dict[str, float]:
+    """Rarity shares given the legendary share (the rest keep BASE_RATES proportions)."""
+    rest = sum(v for r, v in BASE_RATES.items() if r != "legendary")
+    out = {r: (1.0 - legendary) * v / rest for r, v in BASE_RATES.items() if r != "legendary"}
+    out["legendary"] = legendary
+    return out
+
+
+def _simulate_bulk(args: Tuple[int, int, int, Any]) -> Dict[str, Any]:
+    """One worker, numpy path: players x pulls each; returns summed counts."""
+    players, pulls, _, seed = args
+    rng = _np.random.default_rng(seed)
+    counts = _np.zeros(len(SAMPLER.rarities), dtype=_np.int64)
+    gaps = _np.zeros(_SLOTS, dtype=_np.int64)
+    first = _np.zeros(_SLOTS, dtype=_np.int64)  # same, for each player's first legendary
+    worst = 0
+    for _ in range(players):
+        packed, _ = SAMPLER.draw_bulk(pulls, 0, rng)
+        r = (packed >> 32) & 0xF
+        counts += _np.bincount(r, minlength=len(counts))
+        at = _np.flatnonzero(r == SAMPLER.legendary)
+        if len(at):
+            g = _np.diff(at, prepend=-1)
+            gaps += _np.bincount(_np.minimum(g, PITY_MAX + 1), minlength=len(gaps))
+            first[min(int(g[0]), PITY_MAX + 1)] += 1
+            worst = max(worst, int(g.max()), pulls - 1 - int(at[-1]))
+        else:
+            worst = max(worst, pulls)
+    return {"counts": counts.tolist(), "gaps": gaps.tolist(), "first": first.tolist(), "worst": worst}
+
+
+def _simulate_py(args: Tuple[int, int, int, Any]) -> Dict[str, Any]:
+    """One worker, per-card path: players x pulls each in batch-card commands."""
+    players, pulls, batch, seed = args
+    rnd = random.Random(seed)
+    counts = [0] * len(SAMPLER.rarities)
+    gaps, first = [0] * _SLOTS, [0] * _SLOTS
+    legendary, worst = SAMPLER.legendary, 0
+    for _ in range(players):
+        pity, since, seen, left = 0, 0, False, pulls
+        while left:
+            cards, pity = SAMPLER.pull(min(batch, left), pity, rnd)
+            left -= len(cards)
+            for x in cards:
+                r = (x >> 32) & 0xF
+                counts[r] += 1
+                since += 1
+                if r == legendary:
+                    g = min(since, PITY_MAX + 1)
+                    gaps[g] += 1
+                    if not seen:
+                        first[g] += 1
+                        seen = True
+                    worst = max(worst, since)
+                    since = 0
+        worst = max(worst, since)
+    return {"counts": counts, "gaps": gaps, "first": first, "worst": worst}
+
+
+def _pct(h: List[int], q: float) -> int:
+    total, c = sum(h), 0
+    for k, v in enumerate(h):
+        c += v
+        if total and c >= q * total:
+            return k
+    return 0
+
+
+def _sum(parts: List[Dict[str, Any]], field: str) -> List[int]:
+    return [sum(col) for col in zip(*(p[field] for p in parts))]
+
+
+def _run_pass(sim: Callable[[Tuple[int, int, int, Any]], Dict[str, Any]], seeds: List[Any],
+              players: int, per: int, batch: int, workers: int) -> Tuple[List[Dict[str, Any]], float]:
+    chunks = len(seeds)
+    jobs = [(players // chunks + (i < players % chunks), per, batch, s) for i, s in enumerate(seeds)]
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(sim, jobs))
+    else:
+        parts = [sim(j) for j in jobs]
+    return parts, time.perf_counter() - t0
+
+
+def _check(parts: List[Dict[str, Any]], secs: float, per: int, batch: int, sigmas: float) -> Dict[str, Any]:
+    """One pass's distribution, pulls-to-legendary and coins against the targets."""
+    counts, gaps, first = _sum(parts, "counts"), _sum(parts, "gaps"), _sum(parts, "first")
+    worst = max(p["worst"] for p in parts)
+    total = sum(counts)
+
+    pmf = pulls_to_legendary()
+    mean_want = sum((k + 1) * x for k, x in enumerate(pmf))
+    var_want = sum((k + 1) ** 2 * x for k, x in enumerate(pmf)) - mean_want ** 2
+    long_run = shares(1.0 / mean_want)
+    target = shares(expected_legendaries(per) / per)
+
+    failures: List[str] = []
+    dist = {}
+    for i, r in enumerate(SAMPLER.rarities):
+        want = target.get(r, 0.0)
+        got = counts[i] / total
+        if r == "legendary":  # a renewal count: variance ~ var(G) / E[G]^3 per pull
+            se = math.sqrt(var_want / mean_want ** 3 / total)
+        else:
+            se = math.sqrt(want * (1.0 - want) / total)
+        z = (got - want) / (se or 1.0 / total)
+        dist[r] = {"long_run": long_run.get(r, 0.0), "target": want, "observed": got, "z": round(z, 2)}
+        if abs(z) > sigmas:
+            failures.append(f"{r} share {got:.5f} vs target {want:.5f} (z={z:.1f})")
+
+    # pulls to a first legendary: mean vs target, and nobody past hard pity
+    n_leg, n_first = sum(gaps), sum(first)
+    mean_got = sum(k * v for k, v in enumerate(first)) / n_first if n_first else float("inf")
+    z = (mean_got - mean_want) / math.sqrt(var_want / max(n_first, 1))
+    if abs(z) > sigmas:
+        failures.append(f"mean pulls to a legendary {mean_got:.2f} vs target {mean_want:.2f} (z={z:.1f})")
+    if worst > PITY_MAX:
+        failures.append(f"a player went {worst} pulls without a legendary (hard pity is {PITY_MAX})")
+
+    cost = int(round(PULL_COST * batch * (1.0 - _discount(batch))))  # one !pull <batch>
+    per_pull = cost / batch
+    return {
+        "pulls": total, "pulls_per_player": per, "seconds": round(secs, 2), "pulls_per_s": round(total / secs),
+        "rarity": dist,
+        "pulls_to_legendary": {
+            "target_mean": round(mean_want, 3), "first_mean": round(mean_got, 3), "z": round(z, 2),
+            "p50": _pct(gaps, 0.5), "p90": _pct(gaps, 0.9), "p99": _pct(gaps, 0.99), "max": worst,
+            "hard_pity_share": round(gaps[PITY_MAX] / n_leg, 4) if n_leg else 0.0,
+            "histogram": {k: v for k, v in enumerate(gaps) if v},
+        },
+        "coins": {
+            "per_command": cost, "per_player": round(per * per_pull),
+            "per_legendary": round(total * per_pull / n_leg) if n_leg else None,
+            "to_first_legendary_p50": round(_pct(first, 0.5) * per_pull),
+            "to_first_legendary_p90": round(_pct(first, 0.9) * per_pull),
+        },
+        "failures": failures,
+    }
+
+
+def run(pulls: int, py_pulls: int, players: int, batch: int, workers: int, sigmas: float,
+        seed: int) -> Dict[str, Any]:
+    chunks = min(players, max(1, workers) * 4)
+    passes: Dict[str, Any] = {}
+    if pulls and _np is not None:
+        seeds = _np.random.SeedSequence(seed).spawn(chunks)
+        per = pulls // players
+        passes["bulk"] = _check(*_run_pass(_simulate_bulk, seeds, players, per, batch, workers),
+                                per, batch, sigmas)
+    if py_pulls:
+        seeds = [f"gacha_sim/{seed}/{i}" for i in range(chunks)]
+        per = py_pulls // players
+        passes["python"] = _check(*_run_pass(_simulate_py, seeds, players, per, batch, workers),
+                                  per, batch, sigmas)
+    return {
+        "config": {"legendary_chance_at_pity_0": SAMPLER.chance(0), "pity_max": PITY_MAX,
+                   "pull_cost": PULL_COST, "batch": batch, "players": players,
+                   "bulk_min": gacha.BULK_MIN, "numpy": _np is not None},
+        "passes": passes,
+        "failures": [f"{name}: {msg}" for name, res in passes.items() for msg in res["failures"]],
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pulls", type=int, default=20_000_000, help="pulls through the numpy bulk path (0 skips it)")
+    ap.add_argument("--py-pulls", type=int, default=2_000_000, help="pulls through the per-card path (0 skips it)")
+    ap.add_argument("--players", type=int, default=10_000)
+    ap.add_argument("--batch", type=int, default=10, help="cards per !pull (sets the price and the per-card commands)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--sigmas", type=float, default=5.0, help="allowed drift in standard errors")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    if args.pulls and _np is None:
+        print("[gacha_sim] numpy is not installed; skipping the bulk pass", file=sys.stderr)
+        args.pulls = 0
+    if not args.pulls and not args.py_pulls:
+        sys.exit("nothing to simulate")
+    for n in (args.pulls, args.py_pulls):
+        if n and n // args.players < PITY_MAX:
+            sys.exit(f"need at least PITY_MAX ({PITY_MAX}) pulls per player in each pass")
+    if args.batch < 1:
+        sys.exit("--batch must be at least 1")
+    res = run(args.pulls, args.py_pulls, args.players, args.batch, args.workers, args.sigmas, args.seed)
+    doc = json.dumps({"python": sys.version.split()[0], "results": res}, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(doc + "\n")
+    else:
+        print(doc)
+    for msg in res["failures"]:
+        print(f"[gacha_sim] DRIFT: {msg}", file=sys.stderr)
+    sys.exit(1 if res["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench/loop_lag.py — event-loop lag while the bank store is being saved
+#
+#   python -m bench.loop_lag [--users 200000] [--saves 5]
+#
+# "before" runs the old on-loop json.dump(indent=2) + os.replace save,
+# "after" runs bank_compact_async() over the per-guild shards (snapshot on loop,
+# write in a thread).
+from __future__ import annotations
+import argparse, asyncio, json, os, random, tempfile
+
+from cogs import bank
+from cogs.persist import LoopLagMonitor
+
+
+def _fill(users: int, guilds: int) -> None:
+    rnd = random.Random(1)
+    bank.bank_load()
+    for i in range(users):
+        g = bank._guild(10_000 + i % guilds)
+        j = g.slot(1_000_000_000 + i)
+        g.balance[j] = rnd.randint(0, 100_000)
+        g.daily[j] = 1_750_000_000 + rnd.randint(0, 86_400)
+        g.pity[j] = rnd.randint(0, 99)
+
+
+async def _compact_all(guilds: int) -> None:
+    for i in range(guilds):  # one write per guild so every shard is rewritten
+        bank.add_balance(10_000 + i, 1_000_000_000 + i, 0)
+    await bank.bank_compact_async()
+
+
+def _old_save(path: str, data: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+async def _measure(save, saves: int) -> dict:
+    mon = LoopLagMonitor(interval=0.005, window=100_000)
+    mon.start()
+    await asyncio.sleep(0.1)
+    for _ in range(saves):
+        await save()
+        await asyncio.sleep(0.05)
+    mon.stop()
+    return mon.stats()
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200_000)
+    ap.add_argument("--guilds", type=int, default=50)
+    ap.add_argument("--saves", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "bank.json")
+        bank.set_path(path)
+        _fill(args.users, args.guilds)
+        legacy = bank.bank_to_json()  # the old in-memory layout was this dict
+
+        async def before():
+            _old_save(path, legacy)
+
+        result = {
+            "users": args.users,
+            "before": await _measure(before, args.saves),
+            "after": await _measure(lambda: _compact_all(args.guilds), args.saves),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
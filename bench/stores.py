@@ -0,0 +1,166 @@
+# bench/stores.py — synthetic-scale numbers for the bank and XP stores
+#
+#   python -m bench.stores [--sizes 1000,100000,1000000] [--guilds 500] [--out stores.json]
+#
+# For each size, per-guild bank/ and xp/ shards are generated in a temp dir and
+# a fresh subprocess measures load, save, add_balance, level_from_total and the
+# XP leaderboard (index build, page, rank, indexed and buffered xp), so peak
+# RSS is per size. Output is one JSON document (stdout or --out) keyed by
+# size; compare two runs' files to spot regressions.
+from __future__ import annotations
+import argparse, json, os, random, resource, subprocess, sys, tempfile, time
+from typing import Callable, Dict, List
+
+from cogs import bank, xp
+from cogs.persist import write_json_atomic
+
+UID_BASE = 100_000_000_000_000_000
+OPS = 100_000  # timed calls for the per-op paths
+
+
+def _generate(root: str, users: int, guilds: int, seed: int = 1) -> List[int]:
+    """Write bank/<gid>.json and xp/<gid>.json shards; returns the guild ids."""
+    rnd = random.Random(seed)
+    gids = [1_000 + g for g in range(guilds)]
+    per = [[] for _ in gids]
+    for i in range(users):
+        per[i % guilds].append(UID_BASE + i)
+    for gid, uids in zip(gids, per):
+        write_json_atomic(os.path.join(root, "bank", f"{gid}.json"), {
+            "balances": {str(u): rnd.randint(0, 100_000) for u in uids},
+            "daily": {str(u): 1_750_000_000 + rnd.randint(0, 86_400) for u in uids},
+            "pity": {str(u): rnd.randint(0, 99) for u in uids},
+        })
+        write_json_atomic(os.path.join(root, "xp", f"{gid}.json"), {
+            "users": {str(u): {"xp": rnd.randint(0, 250_000)} for u in uids},
+        })
+    return gids
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    total = sum(s)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * 1e6
+    return {
+        "ops": len(s),
+        "ops_per_s": len(s) / total if total else 0.0,
+        "p50_us": pick(0.50),
+        "p99_us": pick(0.99),
+        "total_s": total,
+    }
+
+
+def _timed(fn: Callable[[int], object], n: int) -> Dict[str, float]:
+    samples = []
+    clock = time.perf_counter
+    for i in range(n):
+        t0 = clock()
+        fn(i)
+        samples.append(clock() - t0)
+    return _stats(samples)
+
+
+def _once(fn: Callable[[], object]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _guilds_for(users: int, guilds: int) -> int:
+    return max(1, min(guilds, users // 5))
+
+
+def run_one(users: int, guilds: int, root: str) -> Dict[str, object]:
+    """Measure against shards already generated under root (child process)."""
+    gids = [1_000 + g for g in range(guilds)]
+    rnd = random.Random(2)
+    out: Dict[str, object] = {"users": users, "guilds": guilds}
+    out["file_bytes"] = {"bank": _dir_bytes(os.path.join(root, "bank")),
+                         "xp": _dir_bytes(os.path.join(root, "xp"))}
+    # bank: bank_load() only prepares the shard dir; the cold read touches every guild
+    bank.set_path(os.path.join(root, "bank.json"))
+    out["bank_load_s"] = _once(bank.bank_load)
+    out["bank_cold_read"] = _timed(lambda i: bank._guild(gids[i]), len(gids))
+
+    n = min(OPS, users * 2)
+    rows = [rnd.randrange(users) for _ in range(n)]  # existing users, in their own guild
+    picks = [(gids[r % guilds], UID_BASE + r, rnd.randint(-50, 50)) for r in rows]
+    out["add_balance"] = _timed(lambda i: bank.add_balance(*picks[i]), n)
+
+    batch = 1_000
+    def save_after_batch(i: int) -> None:
+        for gid, uid, d in picks[i * batch:(i + 1) * batch]:
+            bank.add_balance(gid, uid, d)
+        bank.bank_save()
+    saves = max(1, min(20, n // batch))
+    out["bank_save_1k_writes"] = _timed(save_after_batch, saves)  # includes the 1k adds
+    out["bank_compact_s"] = _once(bank.bank_compact)
+
+    # xp
+    xp_path = os.path.join(root, "xp.json")
+    out["xp_load_s"] = _once(lambda: xp.xp_load(xp_path))
+    out["xp_cold_read"] = _timed(lambda i: xp.GUILDS.get(gids[i]), len(gids))
+
+    def xp_save_all(_: int) -> None:
+        xp._DIRTY.update(gids)
+        xp.xp_save()
+    out["xp_save_all_guilds"] = _timed(xp_save_all, 3)
+
+    values = [rnd.randint(0, 250_000) for _ in range(OPS)]
+    out["level_from_total"] = _timed(lambda i: xp.level_from_total(values[i]), OPS)
+
+    big = max(gids, key=lambda gid: len(xp.GUILDS.get(gid)))
+    g = xp.GUILDS.get(big)
+    out["xptop_guild_users"] = len(g)
+    out["xp_rank_build_s"] = _once(lambda: xp.xp_ranked_count(big))  # first query builds the index
+    pages = max(1, len(g) // 10)
+    out["xptop"] = _timed(lambda i: xp.xp_top(big, (i % pages) * 10, 10), 1_000)
+    members = [g.uids[rnd.randrange(len(g))] for _ in range(1_000)]
+    out["xp_rank"] = _timed(lambda i: xp.xp_rank(big, members[i]), 1_000)
+    out["add_xp_ranked"] = _timed(lambda i: xp.add_xp(big, members[i], 20), 1_000)
+    out["buffer_xp"] = _timed(lambda i: xp.buffer_xp(big, members[i % 1_000], 20), OPS)
+    out["fold_s"] = _once(xp._fold_all)  # OPS buffered credits into the indexed table
+
+    out["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,100000,1000000")
+    ap.add_argument("--guilds", type=int, default=500)
+    ap.add_argument("--out", default="")
+    ap.add_argument("--one", type=int, default=0, help=argparse.SUPPRESS)  # child process: one size
+    ap.add_argument("--root", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.one:
+        print(json.dumps(run_one(args.one, args.guilds, args.root)))
+        return
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        guilds = _guilds_for(size, args.guilds)
+        with tempfile.TemporaryDirectory() as root:
+            _generate(root, size, guilds)  # here, so the child's peak RSS is the stores alone
+            child = subprocess.run(
+                [sys.executable, "-m", "bench.stores", "--one", str(size),
+                 "--guilds", str(guilds), "--root", root],
+                check=True, capture_output=True, text=True,
+            )
+        results[str(size)] = json.loads(child.stdout.strip().splitlines()[-1])
+        print(f"[bench] {size:,} users done", file=sys.stderr)
+    doc = json.dumps({"python": sys.version.split()[0], "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(doc + "\n")
+    else:
+        print(doc)
+
+
+if __name__ == "__main__":
+    main()
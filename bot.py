@@ -9,16 +9,21 @@ from discord.ext import commands, tasks
 import wavelink
 
 from cogs.cards_cog import Cards
-from cogs.xp import XP
+from cogs.xp import XP, pending_xp
 from cogs.duel import Duel
 from cogs.gamble import Gamble
 from cogs.funpack import KamiFunPack
 from cogs.kami_adventure import KamiAdventure
+from cogs.persist import SCHEDULER as FLUSH_SCHEDULER, LoopLagMonitor
+from cogs.admin import is_kami_owner
+from cogs import cardindex, cooldown, dupfilter, guildcache
+from cogs.rolequeue import ROLE_QUEUE
 from cogs.bank import (
-    set_path as bank_set_path,
-    bank_load, bank_save,
+    set_path as bank_set_path, use_sqlite as bank_use_sqlite,
+    bank_load,
     get_balance, add_balance,
     get_last_daily, set_last_daily,
+    balance_top, balance_rank, ranked_count, add_balance_many,
 )
 
 # --- BEGIN: minimal, reliable env config ---
@@ -59,7 +64,11 @@ PASSWORD: Final[str] = LAVALINK_PASSWORD
 
 # Data paths used by various cogs (override in .env if you like)
 BANK_DATA_PATH: Final[str] = os.getenv("BANK_DATA_PATH", "data/bank.json")
+BANK_BACKEND: Final[str] = os.getenv("BANK_BACKEND", "json").lower()  # "json" or "sqlite"
+BANK_DB_PATH: Final[str] = os.getenv("BANK_DB_PATH", "bank.db")
 XP_DATA_PATH: Final[str] = os.getenv("XP_DATA_PATH", "data/xp.json")
+GUILD_IDLE_MIN: Final[int] = int(os.getenv("GUILD_IDLE_MIN", "30"))                  # evict guild state idle this long
+GUILD_CACHE_MAX_ROWS: Final[int] = int(os.getenv("GUILD_CACHE_MAX_ROWS", "500000"))  # per store, before LRU eviction
 FUNPACK_DATA_PATH: Final[str] = os.getenv("FUNPACK_DATA_PATH", "funpack_data.json")
 KAMI_ADVENTURE_PATH: Final[str] = os.getenv("KAMI_ADVENTURE_PATH", "data/kami")
 
@@ -75,6 +84,7 @@ MAX_QUEUE_SIZE = 100
 
 BANK_PATH = "bank.json"
 DAILY_AMOUNT = 250
+BALTOP_PAGE = 10
 DAILY_COOLDOWN_SEC = 24 * 60 * 60
 
 KAMI_DATA_DIR = "data/kami"  # per-guild JSONs will be stored here
@@ -281,23 +291,16 @@ class KamiHelp(commands.MinimalHelpCommand):
         await self.get_destination().send(embed=embed)
 
 
-# ---------- autosave ----------
-@tasks.loop(minutes=5)
-async def autosave():
+# ---------- persistence ----------
+# Stores mark themselves dirty and FLUSH_SCHEDULER writes them (debounced, off-loop);
+# Bot.close() does the final flush. Per-guild state (bank, XP, cards) loads on
+# first use; evict_idle writes back and drops guilds nobody has touched lately.
+@tasks.loop(seconds=60)
+async def evict_idle():
     try:
-        bank_save()
+        await guildcache.sweep_all()
     except Exception as e:
-        print(f"[autosave] bank_save failed: {e!r}")
-    xp_cog = bot.get_cog("XP")
-    if xp_cog and hasattr(xp_cog, "save"):
-        try:
-            await xp_cog.save()  # type: ignore
-        except Exception as e:
-            print(f"[autosave] xp.save() failed: {e!r}")
-
-@autosave.before_loop
-async def _wait_ready():
-    await bot.wait_until_ready()
+        print(f"[guildcache] sweep failed: {e!r}")
 
 # ---------- Music (unchanged core) ----------
 class Music(commands.Cog, name="Music"):
@@ -475,12 +478,81 @@ def _fmt_delta(seconds: int) -> str:
     return " ".join(parts)
 
 class General(commands.Cog, name="General"):
+    @commands.command(name="looplag", hidden=True)
+    @is_kami_owner()
+    async def looplag_cmd(self, ctx):
+        s = ctx.bot.loop_lag.stats()
+        await ctx.send(f"⏱️ Event-loop lag over {s['samples']} samples — "
+                       f"p50 **{s['p50_ms']:.1f}ms**, p99 **{s['p99_ms']:.1f}ms**, max **{s['max_ms']:.1f}ms**.")
+
+    @commands.command(name="flushstats", hidden=True)
+    @is_kami_owner()
+    async def flushstats_cmd(self, ctx):
+        lines = ["💾 **Store flushes** (requested / coalesced / written / bytes)"]
+        for name, s in FLUSH_SCHEDULER.stats().items():
+            lines.append(f"• **{name}**{' *(dirty)*' if s['dirty'] else ''} — "
+                         f"{s['requested']} / {s['coalesced']} / {s['flushes']} / {s['bytes_written']:,}")
+        lines.append("🗂️ **Guild caches** (resident guilds / rows / loads / evictions)")
+        for c in guildcache.CACHES:
+            lines.append(f"• **{c.name}** — {len(c)} / {c.rows():,} / {c.loads} / {c.evictions}")
+        lines.append(f"✨ **XP buffer** — {pending_xp():,} user(s) waiting to be folded")
+        q = ROLE_QUEUE.stats()
+        lines.append(f"🎁 **Role grants** — {q['pending']} pending / {q['granted']} granted / "
+                     f"{q['coalesced']} coalesced / {q['retried']} retried / {q['failed']} failed")
+        lines.append("⏱️ **Cooldowns** (tracked keys / passed / blocked / expired)")
+        for name, s in cooldown.stats().items():
+            lines.append(f"• **{name}** — {s['size']:,} / {s['hits']} / {s['blocked']} / {s['evictions']}")
+        for name, s in dupfilter.stats().items():
+            lines.append(f"• **{name}** — {s['size']:,} users / {s['checked']} checked / {s['repeats']} repeats")
+        ci = cardindex.stats()
+        lines.append(f"🃏 **Card indexes** — {ci['indexed_users']} user(s) / {ci['indexed_cards']:,} cards")
+        await ctx.send("\n".join(lines))
+
     @commands.command(name="balance", aliases=["bal"])
     async def balance_cmd(self, ctx, member: Optional[discord.Member] = None):
         member = member or ctx.author
         coins = get_balance(ctx.guild.id, member.id)
         await ctx.send(f"💰 **{member.display_name}** has **{coins} KamiCoins**.")
 
+    @commands.command(name="baltop", aliases=["richest"])
+    async def baltop_cmd(self, ctx, page: int = 1):
+        """Richest members of this server, BALTOP_PAGE per page."""
+        gid = ctx.guild.id
+        pages = max(1, -(-ranked_count(gid) // BALTOP_PAGE))
+        page = max(1, min(page, pages))
+        start = (page - 1) * BALTOP_PAGE
+        lines = [f"💰 **Richest members** — page {page}/{pages}"]
+        for n, (uid, coins) in enumerate(balance_top(gid, start, BALTOP_PAGE), start=start + 1):
+            m = ctx.guild.get_member(uid)
+            name = m.display_name if m else f"<left:{uid}>"
+            lines.append(f"**{n}.** {name} — {coins} KamiCoins")
+        if len(lines) == 1:
+            lines.append("Nobody has KamiCoins yet.")
+        await ctx.send("\n".join(lines))
+
+    @commands.command(name="balrank", aliases=["coinrank"])
+    async def balrank_cmd(self, ctx, member: Optional[discord.Member] = None):
+        """Your (or someone's) place on the coin leaderboard."""
+        member = member or ctx.author
+        gid = ctx.guild.id
+        rank = balance_rank(gid, member.id)
+        if rank is None:
+            return await ctx.send(f"📉 **{member.display_name}** has no KamiCoins yet.")
+        await ctx.send(f"🏅 **{member.display_name}** is **#{rank}** of {ranked_count(gid)} "
+                       f"with **{get_balance(gid, member.id)} KamiCoins**.")
+
+    @commands.command(name="airdrop")
+    @commands.has_permissions(administrator=True)
+    async def airdrop_cmd(self, ctx, amount: int, role: Optional[discord.Role] = None):
+        """Give KamiCoins to every member (or every member of a role). Admin only."""
+        members = role.members if role else ctx.guild.members
+        try:
+            n = add_balance_many(ctx.guild.id, (m.id for m in members if not m.bot), amount)
+        except ValueError as e:  # OutOfRange: nobody was paid
+            return await ctx.send(f"❌ {e} Usage: `!airdrop <amount> [@role]`")
+        target = f" with {role.name}" if role else ""
+        await ctx.send(f"🪂 Airdropped **{amount} KamiCoins** to **{n}** member(s){target}.")
+
     @commands.command(name="daily")
     async def daily_cmd(self, ctx):
         gid, uid = ctx.guild.id, ctx.author.id
@@ -502,9 +574,12 @@ class Bot(commands.Bot):
         super().__init__(**kwargs)
         # make data_dir available to the Adventure cog setup()
         self.kami_data_dir = KAMI_DATA_DIR
+        self.loop_lag = LoopLagMonitor()
 
     async def setup_hook(self):
         bank_set_path(BANK_PATH)
+        if BANK_BACKEND == "sqlite":
+            bank_use_sqlite(BANK_DB_PATH)  # first run migrates bank.json into the db
         bank_load()
         await self.add_cog(Cards(self, bank_path=BANK_PATH))
         await self.add_cog(XP(self))
@@ -514,10 +589,19 @@ class Bot(commands.Bot):
         await self.add_cog(Music(self))
         await self.add_cog(General())
         await self.add_cog(KamiAdventure(self, data_dir=self.kami_data_dir))
-        if not autosave.is_running():
-            autosave.start()
+        self.loop_lag.start()
+        guildcache.configure(idle_sec=GUILD_IDLE_MIN * 60, max_rows=GUILD_CACHE_MAX_ROWS)
+        if not evict_idle.is_running():
+            evict_idle.start()
         asyncio.create_task(self._connect_lavalink_retry())
 
+    async def close(self):
+        try:
+            await FLUSH_SCHEDULER.flush_all()
+        except Exception as e:
+            print(f"[shutdown] final flush failed: {e!r}")
+        await super().close()
+
     async def _connect_lavalink_retry(self):
         tries = 0
         while True:
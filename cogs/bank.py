@@ -1,91 +1,595 @@
 # cogs/bank.py
 from __future__ import annotations
-import json, os
-from typing import Dict
-
-# JSON layout per guild:
-# {
-#   "<guild_id>": {
-#     "balances": { "<user_id>": int, ... },
-#     "daily":    { "<user_id>": int_unix, ... },
-#     "pity":     { "<user_id>": int, ... }   # for gacha pity counters
-#   }, ...
-# }
+import asyncio, json, os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, IO, Iterable, List, Optional, Set, Tuple
+
+from .bank_sqlite import SqliteBank, migrate_from_json
+from .columns import SlotTable, Snapshot, checked
+from .guildcache import GuildCache
+from .persist import SCHEDULER, OffloopWriter, mark_dirty, write_json_atomic
+from .ranking import BULK_REINDEX, RankIndex, key as rank_key, unkey as rank_unkey
+
+# Every guild is its own shard under "<bank path without .json>/":
+#   <gid>.json      snapshot
+#                   {"balances": {"<user_id>": int}, "daily": {"<user_id>": int_unix},
+#                    "pity": {"<user_id>": int}}   # pity is for gacha
+#   <gid>.journal   one compact record per mutation (one JSON array per line):
+#                     ["b", uid, value]   balance
+#                     ["d", uid, value]   last daily timestamp
+#                     ["p", uid, value]   pity counter
+#                     ["t", [[op, uid, value], ...]]   transaction(): all legs or none
+# Records hold the new absolute value, so replaying them over a snapshot is
+# idempotent. Compaction moves a guild's journal aside to "<gid>.journal.1",
+# writes a fresh snapshot and deletes the rotated file; loading replays ".1"
+# then the live journal, so a crash at any point loses nothing.
+#
+# A guild is read from its shard on first access and evicted (compacted, then
+# dropped) once idle, see guildcache.py. bank_load() only splits a legacy
+# single-file bank.json (+ its journal) into shards, once.
+#
+# use_sqlite() swaps all of the above for a SQLite file (see bank_sqlite.py);
+# the functions below keep the same signatures for either backend.
+
+_NO_DAILY = -1  # "never claimed" in the daily column
+
+def _ranked(uid: int) -> bool:
+    return uid > 0  # leaves out house accounts such as Gamble's BANKER_UID (-42)
+
+class BankTable(SlotTable):
+    """One guild's bank: int uid -> slot, array('q') columns for balance/daily/pity."""
+    COLUMNS = (("balance", 0), ("daily", _NO_DAILY), ("pity", 0))
+    __slots__ = ("balance", "daily", "pity", "rank")
+
+    def __init__(self):
+        super().__init__()
+        self.rank: Optional[RankIndex] = None  # built by the first leaderboard query
+
+    def slot(self, uid: int) -> int:
+        i = self.index.get(uid)
+        if i is None:
+            i = super().slot(uid)
+            if self.rank is not None and _ranked(uid):
+                self.rank.add(rank_key(0, uid))
+        return i
+
+    @classmethod
+    def from_json(cls, g: Dict[str, Dict[str, int]]) -> "BankTable":
+        t = cls()
+        for field, col in (("balances", t.balance), ("daily", t.daily), ("pity", t.pity)):
+            for uid, v in (g.get(field) or {}).items():
+                col[t.slot(int(uid))] = int(v)
+        return t
+
+def _table_json(snap: Snapshot) -> Dict[str, Dict[str, int]]:
+    uids, cols = snap
+    bal, daily, pity = cols["balance"], cols["daily"], cols["pity"]
+    return {
+        "balances": {str(u): bal[i] for i, u in enumerate(uids)},
+        "daily": {str(u): daily[i] for i, u in enumerate(uids) if daily[i] != _NO_DAILY},
+        "pity": {str(u): pity[i] for i, u in enumerate(uids) if pity[i]},
+    }
 
 _BANK_PATH = "bank.json"
-_DATA: Dict[str, Dict[str, Dict[str, int]]] = {}  # gid -> {balances, daily, pity}
+
+COMPACT_AFTER_BYTES = 1024 * 1024  # roll a guild's journal into its snapshot past this size
+FLUSH_INTERVAL_MS = 1000           # at most one journal fsync per second
+
+_FIELDS = {"b": "balance", "d": "daily", "p": "pity"}  # journal op -> column
+_JOURNALS: Dict[int, IO[str]] = {}     # gid -> open append handle
+_JOURNAL_BYTES: Dict[int, int] = {}    # gid -> journal size on disk + buffered
+_UNSYNCED: Dict[int, int] = {}         # gid -> bytes appended since the last fsync
+_LOCKS: Dict[int, asyncio.Lock] = {}   # gid -> held while that guild compacts
+_TX_LOCKS: Dict[int, asyncio.Lock] = {}  # gid -> held for the body of a transaction()
+_SQL: Optional[SqliteBank] = None      # set by use_sqlite()
+
+def _shard_dir() -> str:
+    return os.path.splitext(_BANK_PATH)[0]
+
+def _shard(gid: int, ext: str = ".json") -> str:
+    return os.path.join(_shard_dir(), f"{gid}{ext}")
+
+def _shard_gids() -> Set[int]:
+    try:
+        names = os.listdir(_shard_dir())
+    except FileNotFoundError:
+        return set()
+    stems = (n.split(".", 1)[0] for n in names if n.endswith((".json", ".journal", ".journal.1")))
+    return {int(s) for s in stems if s.isdigit()}
+
+def _close_journal(gid: int) -> None:
+    f = _JOURNALS.pop(gid, None)
+    if f is not None:
+        f.close()
+
+def _close_journals() -> None:
+    for gid in list(_JOURNALS):
+        _close_journal(gid)
+
+def _append(op: str, gid: int, uid: int, value: int) -> None:
+    """Append one mutation record (buffered; bank_save() makes it durable)."""
+    _write_record(gid, f'["{op}",{int(uid)},{int(value)}]\n')
+
+def _append_legs(gid: int, legs: List[Tuple[str, int, int]]) -> None:
+    """Append a transaction as one record; a torn line drops every leg together."""
+    body = ",".join(f'["{op}",{int(uid)},{int(value)}]' for op, uid, value in legs)
+    _write_record(gid, f'["t",[{body}]]\n')
+
+def _write_record(gid: int, rec: str) -> None:
+    f = _JOURNALS.get(gid)
+    if f is None:
+        f = _JOURNALS[gid] = open(_shard(gid, ".journal"), "a", encoding="utf-8")
+    f.write(rec)
+    _JOURNAL_BYTES[gid] = _JOURNAL_BYTES.get(gid, 0) + len(rec)
+    _UNSYNCED[gid] = _UNSYNCED.get(gid, 0) + len(rec)
+    mark_dirty("bank")
+
+def _replay_file(t: BankTable, path: str) -> int:
+    """Apply one journal file over t; cut off a torn final line. Returns good bytes."""
+    if not os.path.exists(path):
+        return 0
+    good = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                legs = rec[1] if rec[0] == "t" else (rec,)
+                sets = [(getattr(t, _FIELDS[op]), uid, value) for op, uid, value in legs]
+            except (ValueError, KeyError, IndexError, TypeError):
+                break  # partial write from a crash; everything after it is dropped
+            for col, uid, value in sets:
+                col[t.slot(uid)] = value
+            good += len(line)
+    if good != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    return good
+
+def _read_guild(gid: int) -> Tuple[BankTable, int]:
+    """Snapshot + journal replay for one guild; returns (table, journal bytes)."""
+    t = BankTable()
+    path = _shard(gid)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            t = BankTable.from_json(json.load(f))
+    n = _replay_file(t, _shard(gid, ".journal.1")) + _replay_file(t, _shard(gid, ".journal"))
+    return t, n
+
+def _load_guild(gid: int) -> BankTable:
+    t, _JOURNAL_BYTES[gid] = _read_guild(gid)
+    return t
+
+def _rotate_journal(gid: int) -> None:
+    """Move a guild's live journal aside so new records land in a fresh file."""
+    _close_journal(gid)
+    live, old = _shard(gid, ".journal"), _shard(gid, ".journal.1")
+    if os.path.exists(live):
+        if os.path.exists(old):  # leftover from an interrupted compaction
+            with open(live, "rb") as src, open(old, "ab") as dst:
+                dst.write(src.read())
+            os.remove(live)
+        else:
+            os.replace(live, old)
+    _JOURNAL_BYTES[gid] = 0
+    _UNSYNCED.pop(gid, None)  # the rotated file is fsynced before the snapshot replaces it
+
+def _needs_compact(gid: int) -> bool:
+    return bool(_JOURNAL_BYTES.get(gid)) or os.path.exists(_shard(gid, ".journal.1"))
+
+def _write_shard(gid: int, snap: Snapshot) -> int:
+    old = _shard(gid, ".journal.1")
+    if os.path.exists(old):
+        fd = os.open(old, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return write_json_atomic(_shard(gid), _table_json(snap))
+
+def _drop_rotated(gid: int) -> None:
+    try:
+        os.remove(_shard(gid, ".journal.1"))
+    except FileNotFoundError:
+        pass
+
+def _compact_guild(gid: int, g: BankTable) -> int:
+    _rotate_journal(gid)
+    n = _write_shard(gid, g.snapshot())
+    _drop_rotated(gid)
+    return n
+
+async def _compact_guild_async(gid: int, g: BankTable) -> int:
+    """Rotate on the loop, write the snapshot in a worker thread (one at a time per guild)."""
+    lock = _LOCKS.get(gid)
+    if lock is None:
+        lock = _LOCKS[gid] = asyncio.Lock()
+    async with lock:
+        _rotate_journal(gid)
+        n = await asyncio.to_thread(_write_shard, gid, g.snapshot())  # column memcpy on the loop
+        _drop_rotated(gid)
+    return n
+
+async def _evict_guild(gid: int, g: BankTable) -> None:
+    """GuildCache hook: fold the journal into the shard, then release the guild."""
+    if _SQL is None and _needs_compact(gid):
+        await _compact_guild_async(gid, g)
+    if gid not in _CACHE:  # not touched again while the snapshot was written
+        _close_journal(gid)
+        _JOURNAL_BYTES.pop(gid, None)
+        _UNSYNCED.pop(gid, None)
+        _LOCKS.pop(gid, None)
+        lock = _TX_LOCKS.get(gid)
+        if lock is not None and not lock.locked():
+            del _TX_LOCKS[gid]
+
+_CACHE = GuildCache("bank", _load_guild, _evict_guild)
+
+def _migrate_legacy() -> None:
+    """Split a single-file bank.json and its journal into per-guild shards (once)."""
+    journals = [_BANK_PATH + ".journal.1", _BANK_PATH + ".journal"]
+    if not any(os.path.exists(p) for p in [_BANK_PATH, *journals]):
+        return
+    tables: Dict[int, BankTable] = {}
+    if os.path.exists(_BANK_PATH):
+        with open(_BANK_PATH, "r", encoding="utf-8") as f:
+            tables = {int(gid): BankTable.from_json(g) for gid, g in json.load(f).items()}
+    for path in journals:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    op, gid, uid, value = json.loads(line)  # legacy records carry the gid
+                    field = _FIELDS[op]
+                except (ValueError, KeyError):
+                    break
+                t = tables.get(gid)
+                if t is None:
+                    t = tables[gid] = BankTable()
+                getattr(t, field)[t.slot(uid)] = value
+    for gid, t in tables.items():
+        write_json_atomic(_shard(gid), _table_json(t.snapshot()))
+    if os.path.exists(_BANK_PATH):
+        os.replace(_BANK_PATH, _BANK_PATH + ".migrated")
+    for path in journals:
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"[bank] split {_BANK_PATH} into {len(tables)} guild shards under {_shard_dir()}/")
 
 def set_path(path: str) -> None:
     """Change JSON path (call once at startup)."""
     global _BANK_PATH
+    if path != _BANK_PATH:
+        _close_journals()
+        _CACHE.clear()
     _BANK_PATH = path
 
+def use_sqlite(db_path: str) -> None:
+    """Switch to the SQLite backend. A missing db is seeded once from the JSON bank."""
+    global _SQL
+    if _SQL is not None:
+        _SQL.close()
+    if not os.path.exists(db_path) and (os.path.exists(_BANK_PATH) or _shard_gids()):
+        bank_load()
+        migrate_from_json(bank_to_json(), db_path)
+    _close_journals()
+    _CACHE.clear()
+    _SQL = SqliteBank(db_path)
+
 def bank_load() -> None:
-    """Load from disk (safe if file is missing)."""
-    global _DATA
-    if os.path.exists(_BANK_PATH):
-        with open(_BANK_PATH, "r", encoding="utf-8") as f:
-            _DATA = json.load(f)
-    else:
-        _DATA = {}
+    """Prepare the shard directory; guilds themselves load on first access."""
+    if _SQL is not None:
+        return  # rows are read on demand
+    _close_journals()  # flush anything buffered so the next load replays it
+    os.makedirs(_shard_dir(), exist_ok=True)
+    _migrate_legacy()
+    _CACHE.clear()
+    _JOURNAL_BYTES.clear()
+    _UNSYNCED.clear()
+
+def bank_to_json() -> Dict[str, Dict[str, Dict[str, int]]]:
+    """The whole bank in the legacy single-file JSON shape (reads every shard)."""
+    out = {}
+    for gid in sorted(_shard_gids() | {gid for gid, _ in _CACHE.items()}):
+        g = _CACHE.peek(gid)
+        if g is None:
+            g, _ = _read_guild(gid)  # one-off read; not cached
+        out[str(gid)] = _table_json(g.snapshot())
+    return out
+
+# ------------ persistence ------------
+def _fsync_prepare() -> Tuple[List[int], int]:
+    """On the loop: push buffered records to the OS, hand dup'd fds to the thread."""
+    fds, n = [], 0
+    for gid, k in _UNSYNCED.items():
+        n += k
+        f = _JOURNALS.get(gid)
+        if f is not None:
+            f.flush()
+            fds.append(os.dup(f.fileno()))
+    _UNSYNCED.clear()
+    return fds, n
+
+def _fsync_write(job: Tuple[List[int], int]) -> int:
+    fds, n = job
+    for fd in fds:
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return n
+
+_FSYNC = OffloopWriter("bank journal", _fsync_prepare, _fsync_write)
 
 def bank_save() -> None:
-    """Atomic save to disk."""
-    tmp = _BANK_PATH + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(_DATA, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, _BANK_PATH)
-
-def _guild(gid: int) -> Dict[str, Dict[str, int]]:
-    g = _DATA.setdefault(str(gid), {})
-    g.setdefault("balances", {})
-    g.setdefault("daily", {})
-    g.setdefault("pity", {})
-    return g
+    """Make appended journal records durable (cost tracks changes, not bank size)."""
+    if _SQL is not None:
+        _SQL.commit()
+        return
+    _FSYNC.save_sync()
+
+async def bank_save_async() -> None:
+    """bank_save() with the fsync in a worker thread; concurrent calls coalesce."""
+    if _SQL is not None:
+        _SQL.commit()
+        return
+    await _FSYNC.save()
+
+def bank_journal_size() -> int:
+    """Bytes appended across resident guilds since their last compaction."""
+    return sum(_JOURNAL_BYTES.values())
+
+def bank_compact() -> int:
+    """Roll every resident guild's journal into its snapshot (blocking; startup/shutdown)."""
+    if _SQL is not None:
+        _SQL.commit()
+        return 0
+    return sum(_compact_guild(gid, g) for gid, g in _CACHE.items() if _needs_compact(gid))
+
+async def bank_compact_async() -> int:
+    """Compact resident guilds with journal records; snapshots are written off the loop."""
+    if _SQL is not None:
+        _SQL.commit()
+        return 0
+    n = 0
+    for gid, g in _CACHE.items():
+        if _needs_compact(gid):
+            n += await _compact_guild_async(gid, g)
+    return n
+
+async def _flush() -> int:
+    """FlushScheduler hook: fsync the journals, compact guilds whose journal has grown."""
+    before = _FSYNC.bytes_written
+    await bank_save_async()
+    n = _FSYNC.bytes_written - before
+    if _SQL is None:
+        for gid, g in _CACHE.items():
+            if _JOURNAL_BYTES.get(gid, 0) >= COMPACT_AFTER_BYTES:
+                n += await _compact_guild_async(gid, g)
+    return n
+
+SCHEDULER.register("bank", _flush, interval_ms=FLUSH_INTERVAL_MS)
+
+def _guild(gid: int) -> BankTable:
+    return _CACHE.get(gid)
+
+def _rank_index(g: BankTable) -> RankIndex:
+    if g.rank is None:
+        g.rank = RankIndex(rank_key(g.balance[i], u) for i, u in enumerate(g.uids) if _ranked(u))
+    return g.rank
+
+def _set_balance(g: BankTable, i: int, uid: int, new: int) -> None:
+    """Write one balance and keep the guild's leaderboard (if built) in step.
+    The column is stored first, so a value it refuses never reaches the index."""
+    new = checked(new, "A balance")
+    old = g.balance[i]
+    g.balance[i] = new
+    if g.rank is not None and _ranked(uid):
+        g.rank.replace(rank_key(old, uid), rank_key(new, uid))
 
 # ------------ balances ------------
 def get_balance(gid: int, uid: int) -> int:
+    if _SQL is not None:
+        return _SQL.get_balance(gid, uid)
     g = _guild(gid)
-    return int(g["balances"].get(str(uid), 0))
+    i = g.find(uid)
+    return g.balance[i] if i >= 0 else 0
 
 def add_balance(gid: int, uid: int, delta: int) -> int:
+    new = checked(get_balance(gid, uid) + int(delta), "A balance")  # before a slot is claimed
+    if _SQL is not None:
+        mark_dirty("bank")
+        return _SQL.add_balance(gid, uid, delta)
     g = _guild(gid)
-    key = str(uid)
-    new = int(g["balances"].get(key, 0)) + int(delta)
-    g["balances"][key] = new
+    _set_balance(g, g.slot(uid), uid, new)
+    _append("b", gid, uid, new)
     return new
 
+def add_balance_many(gid: int, uids: Iterable[int], delta: int) -> int:
+    """Add delta to every uid in one pass: one journal record, one dirty mark.
+    Duplicate ids count once; returns the number of users changed. Every new
+    balance is range-checked before any is applied, so a batch lands whole or
+    not at all (OutOfRange)."""
+    uids = list(dict.fromkeys(int(u) for u in uids))
+    delta = checked(delta, "An amount")
+    if not uids or not delta:
+        return 0
+    for uid in uids:
+        checked(get_balance(gid, uid) + delta, "A balance")
+    if _SQL is not None:
+        _SQL.add_balance_many(gid, uids, delta)
+        mark_dirty("bank")
+        return len(uids)
+    g = _guild(gid)
+    if g.rank is not None and len(uids) > BULK_REINDEX:
+        g.rank = None  # cheaper to rebuild on the next leaderboard query than to move each key
+    legs: List[Tuple[str, int, int]] = []
+    for uid in uids:
+        i = g.slot(uid)
+        new = g.balance[i] + delta
+        _set_balance(g, i, uid, new)
+        legs.append(("b", uid, new))
+    _append_legs(gid, legs)
+    return len(uids)
+
+# ------------ leaderboard ------------
+def balance_top(gid: int, start: int = 0, count: int = 10) -> List[Tuple[int, int]]:
+    """(uid, balance) for ranks start+1 .. start+count, richest first."""
+    if _SQL is not None:
+        return _SQL.balance_top(gid, start, count)
+    return [rank_unkey(k) for k in _rank_index(_guild(gid)).slice(start, start + count)]
+
+def balance_rank(gid: int, uid: int) -> Optional[int]:
+    """1-based coin rank of uid, or None if the user has no bank row."""
+    if _SQL is not None:
+        return _SQL.balance_rank(gid, uid)
+    g = _guild(gid)
+    i = g.find(uid)
+    if i < 0 or not _ranked(uid):
+        return None
+    return _rank_index(g).index(rank_key(g.balance[i], uid)) + 1
+
+def ranked_count(gid: int) -> int:
+    """Members on the coin leaderboard."""
+    if _SQL is not None:
+        return _SQL.ranked_count(gid)
+    return len(_rank_index(_guild(gid)))
+
 # ------------ daily timestamps ------------
 def get_last_daily(gid: int, uid: int) -> int | None:
+    if _SQL is not None:
+        return _SQL.get_last_daily(gid, uid)
     g = _guild(gid)
-    v = g["daily"].get(str(uid))
-    return int(v) if v is not None else None
+    i = g.find(uid)
+    v = g.daily[i] if i >= 0 else _NO_DAILY
+    return v if v != _NO_DAILY else None
 
 def set_last_daily(gid: int, uid: int, ts: int) -> None:
+    ts = checked(ts, "A daily timestamp")
+    if _SQL is not None:
+        mark_dirty("bank")
+        return _SQL.set_last_daily(gid, uid, ts)
     g = _guild(gid)
-    g["daily"][str(uid)] = int(ts)
+    g.daily[g.slot(uid)] = ts
+    _append("d", gid, uid, ts)
 
 # ------------ pity counters (for gacha) ------------
 def get_pity(gid: int, uid: int) -> int:
     """Return current pity counter (defaults to 0)."""
+    if _SQL is not None:
+        return _SQL.get_pity(gid, uid)
     g = _guild(gid)
-    return int(g["pity"].get(str(uid), 0))
+    i = g.find(uid)
+    return g.pity[i] if i >= 0 else 0
 
 def set_pity(gid: int, uid: int, value: int) -> int:
     """Set pity to an exact value; returns the stored value."""
+    value = checked(value, "Pity")
+    if _SQL is not None:
+        mark_dirty("bank")
+        return _SQL.set_pity(gid, uid, value)
     g = _guild(gid)
-    g["pity"][str(uid)] = int(value)
-    return int(value)
+    g.pity[g.slot(uid)] = value
+    _append("p", gid, uid, value)
+    return value
 
 def add_pity(gid: int, uid: int, delta: int = 1) -> int:
     """Increment pity by delta; returns new pity."""
+    if _SQL is not None:
+        checked(_SQL.get_pity(gid, uid) + int(delta), "Pity")
+        mark_dirty("bank")
+        return _SQL.add_pity(gid, uid, delta)
     g = _guild(gid)
-    key = str(uid)
-    new = int(g["pity"].get(key, 0)) + int(delta)
-    g["pity"][key] = new
+    i = g.slot(uid)
+    new = checked(g.pity[i] + int(delta), "Pity")
+    g.pity[i] = new
+    _append("p", gid, uid, new)
     return new
 
 def reset_pity(gid: int, uid: int) -> None:
     """Reset pity to 0."""
+    if _SQL is not None:
+        mark_dirty("bank")
+        _SQL.set_pity(gid, uid, 0)
+        return
     g = _guild(gid)
-    g["pity"][str(uid)] = 0
+    g.pity[g.slot(uid)] = 0
+    _append("p", gid, uid, 0)
+
+# ------------ transactions ------------
+class InsufficientFunds(ValueError):
+    """A transaction() leg would take a user's balance below zero."""
+
+    def __init__(self, uid: int, balance: int, needed: int):
+        super().__init__(f"user {uid} has {balance}, needs {needed}")
+        self.uid, self.balance, self.needed = uid, balance, needed
+
+class Transaction:
+    """Legs collected inside `async with transaction(gid) as tx`; applied together on exit."""
+    __slots__ = ("gid", "_deltas", "_pity")
+
+    def __init__(self, gid: int):
+        self.gid = gid
+        self._deltas: Dict[int, int] = {}  # uid -> balance delta
+        self._pity: Dict[int, int] = {}    # uid -> new pity
+
+    def balance(self, uid: int) -> int:
+        """Balance including this transaction's pending legs."""
+        return get_balance(self.gid, uid) + self._deltas.get(uid, 0)
+
+    def add(self, uid: int, delta: int) -> int:
+        """Queue a balance change; returns the pending balance."""
+        self._deltas[uid] = self._deltas.get(uid, 0) + int(delta)
+        return self.balance(uid)
+
+    def pity(self, uid: int) -> int:
+        v = self._pity.get(uid)
+        return v if v is not None else get_pity(self.gid, uid)
+
+    def set_pity(self, uid: int, value: int) -> None:
+        self._pity[uid] = checked(value, "Pity")
+
+    def _commit(self) -> None:
+        gid = self.gid
+        for uid, delta in self._deltas.items():
+            if not delta:
+                continue
+            have = get_balance(gid, uid)
+            if delta < 0 and _ranked(uid) and have + delta < 0:  # house accounts may run negative, users may not
+                raise InsufficientFunds(uid, have, -delta)
+            checked(have + delta, "A balance")  # every leg is checked before any is applied
+        if _SQL is not None:
+            _SQL.apply(gid, self._deltas, self._pity)
+            mark_dirty("bank")
+            return
+        g = _guild(gid)
+        legs: List[Tuple[str, int, int]] = []
+        for uid, delta in self._deltas.items():
+            if delta:
+                i = g.slot(uid)
+                new = g.balance[i] + delta
+                _set_balance(g, i, uid, new)
+                legs.append(("b", uid, new))
+        for uid, value in self._pity.items():
+            g.pity[g.slot(uid)] = value
+            legs.append(("p", uid, value))
+        if legs:
+            _append_legs(gid, legs)
+
+@asynccontextmanager
+async def transaction(gid: int) -> AsyncIterator[Transaction]:
+    """Group balance/pity legs into one validated mutation.
+
+    Holds the guild's transaction lock for the body, so a check like
+    tx.balance(uid) >= bet cannot interleave with another transaction. On a
+    clean exit every leg is applied, with one journal record and one dirty
+    mark; if the body raises, a user would go negative (InsufficientFunds) or
+    a balance would leave the int64 range (OutOfRange), nothing is applied.
+    """
+    lock = _TX_LOCKS.get(gid)
+    if lock is None:
+        lock = _TX_LOCKS[gid] = asyncio.Lock()
+    async with lock:
+        tx = Transaction(gid)
+        yield tx
+        tx._commit()
@@ -0,0 +1,164 @@
+# cogs/bank_sqlite.py
+from __future__ import annotations
+import os, sqlite3, sys
+from typing import Dict, Optional
+
+# One row per (guild, user); the composite primary key is the B-tree used for
+# every lookup, so point reads and single-row updates stay O(log n).
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bank (
+    gid     INTEGER NOT NULL,
+    uid     INTEGER NOT NULL,
+    balance INTEGER NOT NULL DEFAULT 0,
+    daily   INTEGER,
+    pity    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (gid, uid)
+) WITHOUT ROWID
+"""
+
+# leaderboard order; house accounts (negative uids) are left out of rankings
+_INDEX = "CREATE INDEX IF NOT EXISTS bank_rank ON bank (gid, balance DESC, uid)"
+
+# statements are module constants so sqlite3's statement cache reuses them
+_SQL_GET = "SELECT balance, daily, pity FROM bank WHERE gid = ? AND uid = ?"
+_SQL_ADD_BAL = ("INSERT INTO bank (gid, uid, balance) VALUES (?, ?, ?) "
+                "ON CONFLICT (gid, uid) DO UPDATE SET balance = balance + excluded.balance")
+_SQL_SET_DAILY = ("INSERT INTO bank (gid, uid, daily) VALUES (?, ?, ?) "
+                  "ON CONFLICT (gid, uid) DO UPDATE SET daily = excluded.daily")
+_SQL_SET_PITY = ("INSERT INTO bank (gid, uid, pity) VALUES (?, ?, ?) "
+                 "ON CONFLICT (gid, uid) DO UPDATE SET pity = excluded.pity")
+_SQL_ADD_PITY = ("INSERT INTO bank (gid, uid, pity) VALUES (?, ?, ?) "
+                 "ON CONFLICT (gid, uid) DO UPDATE SET pity = pity + excluded.pity")
+_SQL_IMPORT = ("INSERT INTO bank (gid, uid, balance, daily, pity) VALUES (?, ?, ?, ?, ?) "
+               "ON CONFLICT (gid, uid) DO UPDATE SET balance = excluded.balance, "
+               "daily = excluded.daily, pity = excluded.pity")
+_SQL_TOP = ("SELECT uid, balance FROM bank WHERE gid = ? AND uid > 0 "
+            "ORDER BY balance DESC, uid LIMIT ? OFFSET ?")
+_SQL_RANK = ("SELECT COUNT(*) FROM bank WHERE gid = ? AND uid > 0 "
+             "AND (balance > ? OR (balance = ? AND uid < ?))")
+_SQL_COUNT = "SELECT COUNT(*) FROM bank WHERE gid = ? AND uid > 0"
+
+COMMIT_EVERY = 500  # writes per implicit commit between explicit saves
+
+
+class SqliteBank:
+    """SQLite storage for cogs/bank.py (WAL, batched commits)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, cached_statements=32)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(_SCHEMA)
+        self.db.execute(_INDEX)
+        self.db.commit()
+        self._pending = 0
+
+    def _row(self, gid: int, uid: int):
+        return self.db.execute(_SQL_GET, (int(gid), int(uid))).fetchone()
+
+    def _wrote(self) -> None:
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self) -> None:
+        if self._pending or self.db.in_transaction:
+            self.db.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.db.close()
+
+    # ------------ balances ------------
+    def get_balance(self, gid: int, uid: int) -> int:
+        row = self._row(gid, uid)
+        return int(row[0]) if row else 0
+
+    def add_balance(self, gid: int, uid: int, delta: int) -> int:
+        self.db.execute(_SQL_ADD_BAL, (int(gid), int(uid), int(delta)))
+        self._wrote()
+        return self.get_balance(gid, uid)
+
+    def add_balance_many(self, gid: int, uids, delta: int) -> None:
+        self.db.executemany(_SQL_ADD_BAL, ((int(gid), int(u), int(delta)) for u in uids))
+        self.commit()  # one commit for the whole batch
+
+    def apply(self, gid: int, deltas: Dict[int, int], pity: Dict[int, int]) -> None:
+        """A bank.Transaction's legs as one SQLite transaction: all of them land or none."""
+        gid = int(gid)
+        self.commit()  # earlier writes aren't part of it (a rollback would take them too)
+        with self.db:
+            self.db.executemany(_SQL_ADD_BAL, ((gid, int(u), int(d)) for u, d in deltas.items() if d))
+            self.db.executemany(_SQL_SET_PITY, ((gid, int(u), int(v)) for u, v in pity.items()))
+
+    # ------------ daily timestamps ------------
+    def get_last_daily(self, gid: int, uid: int) -> Optional[int]:
+        row = self._row(gid, uid)
+        return int(row[1]) if row and row[1] is not None else None
+
+    def set_last_daily(self, gid: int, uid: int, ts: int) -> None:
+        self.db.execute(_SQL_SET_DAILY, (int(gid), int(uid), int(ts)))
+        self._wrote()
+
+    # ------------ pity counters ------------
+    def get_pity(self, gid: int, uid: int) -> int:
+        row = self._row(gid, uid)
+        return int(row[2]) if row else 0
+
+    def set_pity(self, gid: int, uid: int, value: int) -> int:
+        self.db.execute(_SQL_SET_PITY, (int(gid), int(uid), int(value)))
+        self._wrote()
+        return int(value)
+
+    def add_pity(self, gid: int, uid: int, delta: int) -> int:
+        self.db.execute(_SQL_ADD_PITY, (int(gid), int(uid), int(delta)))
+        self._wrote()
+        return self.get_pity(gid, uid)
+
+
+    # ------------ leaderboard ------------
+    def balance_top(self, gid: int, start: int, count: int):
+        rows = self.db.execute(_SQL_TOP, (int(gid), int(count), int(start))).fetchall()
+        return [(int(u), int(b)) for u, b in rows]
+
+    def balance_rank(self, gid: int, uid: int) -> Optional[int]:
+        row = self._row(gid, uid)
+        if row is None or uid <= 0:
+            return None
+        bal = int(row[0])
+        return self.db.execute(_SQL_RANK, (int(gid), bal, bal, int(uid))).fetchone()[0] + 1
+
+    def ranked_count(self, gid: int) -> int:
+        return self.db.execute(_SQL_COUNT, (int(gid),)).fetchone()[0]
+
+
+def migrate_from_json(data: dict, db_path: str) -> int:
+    """One-shot import of the bank.json layout into db_path; returns rows written."""
+    rows = []
+    for gid, g in data.items():
+        balances = g.get("balances", {})
+        daily = g.get("daily", {})
+        pity = g.get("pity", {})
+        for uid in set(balances) | set(daily) | set(pity):
+            d = daily.get(uid)
+            rows.append((int(gid), int(uid), int(balances.get(uid, 0)),
+                         int(d) if d is not None else None, int(pity.get(uid, 0))))
+    store = SqliteBank(db_path)
+    with store.db:
+        store.db.executemany(_SQL_IMPORT, rows)
+    store.close()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # python -m cogs.bank_sqlite bank.json bank.db
+    if len(sys.argv) != 3:
+        raise SystemExit("usage: python -m cogs.bank_sqlite <bank.json> <bank.db>")
+    from . import bank
+    bank.set_path(sys.argv[1])
+    bank.bank_load()  # snapshot + journal tail
+    n = migrate_from_json(bank.bank_to_json(), sys.argv[2])
+    print(f"migrated {n} rows into {sys.argv[2]}")
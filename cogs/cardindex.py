@@ -0,0 +1,334 @@
+# cogs/cardindex.py
+from __future__ import annotations
+import heapq, shlex
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from carddata import ELEMENTS, RARITIES
+from . import catalog
+from .ranking import BULK_REINDEX, RankIndex, key, unkey
+
+# Secondary indexes over one user's cards, for !inv queries. An inventory only
+# ever grows at the end (cards_repo.add_cards), so a card's position is a
+# stable id: cards are grouped by (catalog template, rarity) (element and
+# series belong to the template), each group an array of positions kept in
+# pull order just by appending along with its best atk/def, and each sort is a
+# RankIndex of key(score, position), best first. A user's index is built on
+# their first query and extended on every pull after that; only the MAX_USERS
+# most recently queried users keep one.
+#
+# A query starts from its smallest candidate set (see CardIndex.plan): empty
+# means no matches, groups are merged when the sort is pull order, up to
+# DIRECT_SORT cards are filtered and sorted outright, and otherwise the sort
+# order itself is walked, filtering as it goes, from the best score the
+# matching groups can reach down to the minimum on the sorted stat. A page
+# then costs about PAGE / (share of cards that match) steps, later pages
+# resume where the last one stopped, and the collection size doesn't enter.
+
+PAGE = 10            # cards per !inv page
+MAX_USERS = 256      # users whose indexes are kept
+DIRECT_SORT = 2048   # candidate sets up to this size are sorted directly
+_WALK = 256          # keys read from a sort index at a time
+
+_STAT = 0xFFFF
+
+
+def _atk(x: int) -> int:
+    return (x >> 16) & _STAT
+
+def _def(x: int) -> int:
+    return x & _STAT
+
+def _power(x: int) -> int:
+    return ((x >> 16) & _STAT) + (x & _STAT)
+
+def _rarity(x: int) -> int:
+    """Rarity first, then power."""
+    return (((x >> 32) & 0xF) << 17) | _power(x)
+
+SORTS: Dict[str, Optional[Callable[[int], int]]] = {
+    "rarity": _rarity, "power": _power, "atk": _atk, "def": _def,
+    "new": None, "old": None,  # pull order
+}
+_ALIASES = {"r": "rarity", "e": "element", "s": "series", "elem": "element", "attack": "atk",
+            "defense": "def", "order": "sort"}
+
+
+@dataclass(frozen=True)
+class Query:
+    rarity: Optional[int] = None     # index into RARITIES
+    element: Optional[str] = None    # lower-cased
+    series: Optional[str] = None     # lower-cased
+    min_atk: int = 0
+    min_def: int = 0
+    sort: str = "rarity"
+
+    def describe(self) -> str:
+        parts = []
+        if self.rarity is not None:
+            parts.append(RARITIES[self.rarity])
+        if self.element:
+            parts.append(self.element.title())
+        if self.series:
+            parts.append(f"series {self.series.title()}")
+        if self.min_atk:
+            parts.append(f"ATK ≥ {self.min_atk}")
+        if self.min_def:
+            parts.append(f"DEF ≥ {self.min_def}")
+        return ", ".join(parts)
+
+
+_KEYS = ("rarity", "element", "series", "atk", "def", "sort")
+
+
+def parse_query(text: str, keys: Tuple[str, ...] = _KEYS) -> Query:
+    """`rarity:epic element:fire series:"one piece" atk>=300 def:250 sort:power` -> Query.
+
+    keys limits the filters a command takes (the catalog has no rolled stats).
+    Raises ValueError with a user-facing message for anything it can't read.
+    """
+    try:
+        tokens = shlex.split(text)
+    except ValueError:
+        raise ValueError("Unbalanced quotes in the filter.")
+    q: Dict[str, object] = {}
+    for tok in tokens:
+        for sep in (">=", ":", "="):
+            if sep in tok:
+                k, v = tok.split(sep, 1)
+                break
+        else:
+            raise ValueError(f"Don't know `{tok}` — use key:value, e.g. `rarity:epic` or `sort:atk`.")
+        k, v = _ALIASES.get(k.lower(), k.lower()), v.strip().lower()
+        if k not in keys:
+            what = f"`{k}` doesn't work here" if k in _KEYS else f"Unknown filter `{k}`"
+            raise ValueError(f"{what} — try {', '.join(keys[:-1])} or {keys[-1]}.")
+        if k == "rarity":
+            if v not in RARITIES:
+                raise ValueError(f"Rarity is one of {', '.join(RARITIES)}.")
+            q["rarity"] = RARITIES.index(v)
+        elif k == "element":
+            q[k] = catalog.resolve_element(v)
+            if q[k] is None:
+                raise ValueError(f"Element is one of {', '.join(ELEMENTS)}.")
+        elif k == "series":
+            q[k] = catalog.resolve_series(v)
+            if q[k] is None:
+                raise ValueError(f"No series called `{v}` — try one of {', '.join(catalog.series_names())}.")
+        elif k in ("atk", "def"):
+            if not v.isdigit():
+                raise ValueError(f"`{k}` needs a number, e.g. `{k}>=300`.")
+            q["min_" + k] = int(v)
+        elif k == "sort":
+            if v not in SORTS:
+                raise ValueError(f"Sort by one of {', '.join(SORTS)}.")
+            q["sort"] = v
+    return Query(**q)
+
+
+class CardIndex:
+    """Postings and sort orders over one user's packed cards."""
+    __slots__ = ("cards", "size", "groups", "best", "orders")
+
+    def __init__(self, cards: array):
+        self.cards = cards
+        self.size = 0                                       # cards indexed so far
+        self.groups: Dict[int, array] = {}                  # tid << 4 | rarity -> positions, pull order
+        self.best: Dict[int, int] = {}                      # same key -> max atk << 16 | max def
+        self.orders: Dict[str, RankIndex] = {s: RankIndex() for s, f in SORTS.items() if f}
+        self.extend()
+
+    def extend(self) -> None:
+        """Index cards pulled since the last call."""
+        cards, start, n = self.cards, self.size, len(self.cards)
+        if n <= start:
+            return
+        groups, best = self.groups, self.best
+        for pos in range(start, n):
+            x = cards[pos]
+            g = x >> 32
+            post = groups.get(g)
+            if post is None:
+                post = groups[g] = array("q")
+                best[g] = 0
+            post.append(pos)
+            b = best[g]
+            if (x >> 16) & _STAT > b >> 16 or x & _STAT > b & _STAT:
+                best[g] = (max((x >> 16) & _STAT, b >> 16) << 16) | max(x & _STAT, b & _STAT)
+        for s, idx in self.orders.items():
+            f = SORTS[s]
+            if n - start > BULK_REINDEX:
+                self.orders[s] = RankIndex(key(f(cards[p]), p) for p in range(n))
+            else:
+                for p in range(start, n):
+                    idx.add(key(f(cards[p]), p))
+        self.size = n
+
+    def plan(self, q: Query) -> Tuple[Iterator[int], Optional[int]]:
+        """(positions of matching cards in q's order, exact match count or None).
+
+        Two candidate sets are sized from the indexes: the (template, rarity)
+        groups that match the rarity/element/series filters and can reach the
+        atk/def minimums, and the top of the atk or def order for a minimum.
+        The smaller drives the query: empty means no matches, short ones are
+        filtered and sorted outright, and otherwise the sort order is walked.
+        """
+        cands: List[Tuple[int, str, List[int]]] = []
+        stats = q.min_atk or q.min_def
+        if q.rarity is not None or q.element or q.series or stats:
+            gs = [g for g, b in self.best.items()
+                  if (q.rarity is None or g & 0xF == q.rarity)
+                  and b >> 16 >= q.min_atk and b & _STAT >= q.min_def
+                  and ((not q.element and not q.series) or _template_matches(catalog.template(g >> 4), q))]
+            cands.append((sum(len(self.groups[g]) for g in gs), "groups", gs))
+        for stat, floor in (("atk", q.min_atk), ("def", q.min_def)):
+            if floor:
+                cands.append((self.orders[stat].index(key(floor - 1, 0)), stat, []))
+        if not cands:
+            return self._walk(q), self.size
+        ceiling = self._ceiling(q, cands[0][2]) if cands[0][1] == "groups" else None
+        m, kind, gs = min(cands, key=lambda c: c[0])
+        exact = m if kind == "groups" and not stats else None
+        if m == 0:
+            return iter(()), 0
+        f = SORTS[q.sort]
+        if kind == q.sort:  # already in order; the floor ends the walk
+            return self._walk(q, ceiling), exact
+        if f is None and kind == "groups":  # group postings are in pull order: merge them
+            posts = [self.groups[g] for g in gs]
+            if q.sort == "new":
+                merged = heapq.merge(*(reversed(p) for p in posts), reverse=True)
+            else:
+                merged = heapq.merge(*posts)
+            return filter(self._matcher(q), merged), exact
+        if m > DIRECT_SORT:
+            return self._walk(q, ceiling), exact
+        ok = self._matcher(q)
+        if kind == "groups":
+            hits = [p for g in gs for p in self.groups[g] if ok(p)]
+        else:
+            hits = [pos for pos, _ in map(unkey, self.orders[kind].slice(0, m)) if ok(pos)]
+        if f is None:
+            hits.sort(reverse=q.sort == "new")
+        else:
+            cards = self.cards
+            hits.sort(key=lambda p: (-f(cards[p]), p))
+        return iter(hits), len(hits)
+
+    def _matcher(self, q: Query) -> Callable[[int], bool]:
+        cards, size, templates = self.cards, self.size, catalog.TEMPLATES
+
+        def ok(pos: int) -> bool:
+            if pos >= size:  # pulled after the query started
+                return False
+            x = cards[pos]
+            if q.rarity is not None and (x >> 32) & 0xF != q.rarity:
+                return False
+            if (x >> 16) & _STAT < q.min_atk or x & _STAT < q.min_def:
+                return False
+            return not (q.element or q.series) or _template_matches(templates[x >> 36], q)
+        return ok
+
+    def _ceiling(self, q: Query, gs: List[int]) -> Optional[int]:
+        """Highest sort score any card in groups gs can have (None for pull order)."""
+        if SORTS[q.sort] is None or not gs:
+            return None
+        best = self.best
+        if q.sort == "atk":
+            return max(best[g] >> 16 for g in gs)
+        if q.sort == "def":
+            return max(best[g] & _STAT for g in gs)
+        power = max((best[g] >> 16) + (best[g] & _STAT) for g in gs)
+        return power if q.sort == "power" else (max(g & 0xF for g in gs) << 17) | power
+
+    def _walk(self, q: Query, ceiling: Optional[int] = None) -> Iterator[int]:
+        """Matches in q's order by walking the pull order or sort index (from the ceiling down)."""
+        ok, f = self._matcher(q), SORTS[q.sort]
+        if f is None:
+            n = self.size
+            yield from filter(ok, range(n - 1, -1, -1) if q.sort == "new" else range(n))
+            return
+        # best first; nothing below the floor can match
+        floor = {"atk": q.min_atk, "def": q.min_def, "power": q.min_atk + q.min_def}.get(q.sort, 0)
+        idx = self.orders[q.sort]
+        i = idx.index(key(ceiling, 0)) if ceiling is not None else 0  # nothing above it can match
+        while True:
+            chunk = idx.slice(i, i + _WALK)
+            if not chunk:
+                return
+            for k in chunk:
+                pos, score = unkey(k)
+                if score < floor:
+                    return
+                if ok(pos):
+                    yield pos
+            i = idx.index(chunk[-1]) + 1  # by key, so pulls made meanwhile don't shift the walk
+
+
+def _template_matches(t: catalog.Template, q: Query) -> bool:
+    return ((not q.element or t["element"].lower() == q.element)
+            and (not q.series or t.get("series", "").lower() == q.series))
+
+
+class Cursor:
+    """One !inv query's results, materialised a page at a time."""
+    __slots__ = ("cards", "query", "total", "rows", "_it", "_done")
+
+    def __init__(self, index: CardIndex, q: Query):
+        self.cards = index.cards
+        self.query = q
+        self._it, self.total = index.plan(q)
+        self.rows: List[int] = []  # positions found so far
+        self._done = False
+
+    def _fill(self, n: int) -> None:
+        while len(self.rows) < n and not self._done:
+            pos = next(self._it, None)
+            if pos is None:
+                self._done = True
+            else:
+                self.rows.append(pos)
+
+    def page(self, page: int) -> Tuple[List[Tuple[int, int]], int, Optional[int]]:
+        """([(position, packed card)], page, pages) for a 1-based page, clamped; pages None if unknown."""
+        page = max(1, page)
+        self._fill(page * PAGE + 1)  # one extra to know whether a next page exists
+        last = max(1, -(-len(self.rows) // PAGE)) if self._done else None
+        if last is not None:
+            page = min(page, last)
+        pages = last if last is not None else (-(-self.total // PAGE) if self.total is not None else None)
+        rows = self.rows[(page - 1) * PAGE:page * PAGE]
+        return [(p, self.cards[p]) for p in rows], page, pages
+
+    def has_next(self, page: int) -> bool:
+        return len(self.rows) > page * PAGE
+
+
+_INDEXES: "OrderedDict[Tuple[int, int], CardIndex]" = OrderedDict()
+
+
+def index_for(gid: int, uid: int, cards: array) -> CardIndex:
+    """The user's index over `cards` (their live inventory array), built or caught up."""
+    k = (gid, uid)
+    idx = _INDEXES.get(k)
+    if idx is None or idx.cards is not cards:  # first query, or the guild was reloaded
+        idx = _INDEXES[k] = CardIndex(cards)
+        while len(_INDEXES) > MAX_USERS:
+            _INDEXES.popitem(last=False)
+    else:
+        idx.extend()
+    _INDEXES.move_to_end(k)
+    return idx
+
+
+def on_pull(gid: int, uid: int, cards: array) -> None:
+    """Keep an existing index current after cards were appended (no-op if none)."""
+    idx = _INDEXES.get((gid, uid))
+    if idx is not None and idx.cards is cards:
+        idx.extend()
+
+
+def stats() -> Dict[str, int]:
+    return {"indexed_users": len(_INDEXES), "indexed_cards": sum(i.size for i in _INDEXES.values())}
@@ -1,54 +1,37 @@
 # cogs/cards_cog.py
 from __future__ import annotations
-import json, os, random
-from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 
 import discord
+from discord import app_commands
 from discord.ext import commands
 
-# ---- safety helpers (robust JSON I/O) ----
-def _normalize_cards_data(data: Any) -> Dict[str, Any]:
-    """Always return a dict like: {'guilds': {...}}."""
-    if not isinstance(data, dict):
-        data = {}
-    if not isinstance(data.get("guilds"), dict):
-        data["guilds"] = {}
-    return data
-
-def _read_json(path: Path) -> Dict[str, Any]:
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        return {"guilds": {}}
-    except Exception:
-        # corrupted/empty file -> start fresh
-        return {"guilds": {}}
-    return _normalize_cards_data(data)
-
-def _write_json(path: Path, data: Dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(_normalize_cards_data(data), f, indent=2)
-
 # ---- bank helpers (your bank.py lives in cogs/) ----
 from .bank import (
-    bank_load, bank_save, set_path as bank_set_path,
-    get_balance, add_balance, get_pity, set_pity,
+    bank_load, set_path as bank_set_path,
+    get_balance,
     get_last_daily, set_last_daily,
+    transaction, InsufficientFunds,
 )
 
 # ---- card pools + element chart + stat ranges ----
 # carddata is the top-level folder sitting next to bot.py
-from carddata import ALL_CARDS, STAT_RANGES, ADV
-
-DATA_DIR = Path("data") / "cards"
-DATA_FILE = DATA_DIR / "cards.json"
+from carddata import ALL_CARDS, STAT_RANGES, ADV, ELEMENTS, RARITIES
+from carddata.utils import ELEMENT_EMOJI
+from . import cards_repo, catalog, collection
+from .cardindex import Cursor, index_for, parse_query
+from .cards_repo import add_cards, inventory, rarity_of, view
+from .gacha import Sampler
+from .pager import Pager, send_paged
 
 # gacha settings
 PULL_COST = 100
-DISCOUNTS = {5: 0.05, 10: 0.10}  # 5% and 10% off
+DISCOUNTS = {5: 0.05, 10: 0.10}  # 5% off from 5 pulls, 10% off from 10
+MAX_PULL = 100                   # one command's worth of pulls
+SHOW_PULLS = 10                  # bigger pulls are summarised per rarity
+CATALOG_PAGE = 10
+COLLECTIONTOP_PAGE = 10
+MISSING_SHOWN = 15               # !collection <series> lists this many missing cards
 LEGENDARY_RATE = 0.005           # 0.5% base
 PITY_MAX = 100                   # guaranteed legendary on 100th pity
 
@@ -61,59 +44,91 @@ BASE_RATES = {                    # will get normalized after pity check
     "common": 0.60,
 }
 
-def _load_cards() -> Dict[str, Any]:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    if DATA_FILE.exists():
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def _save_cards(data: Dict[str, Any]) -> None:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-def _user_inv(data: Dict[str, Any], gid: int, uid: int) -> List[Dict[str, Any]]:
-    g = data.setdefault(str(gid), {})
-    return g.setdefault(str(uid), [])
-
-def _roll_stats(rarity: str) -> Dict[str, int]:
-    r = STAT_RANGES.get(rarity, {"atk": (100, 100), "def": (100, 100)})
-    atk = random.randint(*r["atk"])
-    de  = random.randint(*r["def"])
-    return {"atk": atk, "def": de}
-
-def _pick_rarity(gid: int, uid: int) -> str:
-    pity = get_pity(gid, uid)
-    if pity >= PITY_MAX - 1:
-        return "legendary"
-
-    # normalize rates to sum=1 (legendary base gets a tiny bump from pity if you want)
-    rates = dict(BASE_RATES)
-    # optional gentle pity curve:
-    rates["legendary"] = LEGENDARY_RATE + (pity / PITY_MAX) * LEGENDARY_RATE
-
-    total = sum(rates.values())
-    roll = random.random() * total
-    acc = 0.0
-    for r in RARITY_ORDER[::-1]:  # check from common up, or reverse — doesn’t matter with acc
-        acc += rates[r]
-        if roll <= acc:
-            return r
-    return "common"
-
-def _pick_card(rarity: str) -> Dict[str, Any]:
-    pool = ALL_CARDS.get(rarity, [])
-    if not pool:
-        raise commands.CommandError(f"No cards defined for rarity '{rarity}'.")
-    base = random.choice(pool)
-    stats = _roll_stats(rarity)
-    return {
-        "name": base["name"],
-        "element": base["element"],
-        "rarity": rarity,
-        **stats,
-    }
+# rarity/template/stat tables built once; pulls draw in O(1) per card (gacha.py)
+SAMPLER = Sampler(
+    BASE_RATES, LEGENDARY_RATE, PITY_MAX,
+    {r: [catalog.tid_for(t["id"]) for t in ALL_CARDS.get(r, [])] for r in RARITIES},
+    STAT_RANGES, RARITIES,
+)
+
+def _discount(amount: int) -> float:
+    """Best bulk discount the amount qualifies for."""
+    return max((d for n, d in DISCOUNTS.items() if amount >= n), default=0.0)
+
+def inv_page(owner: str, cursor: Cursor, page: int):
+    """(text, page, pages) for one !inv page; pages is None until the end is known."""
+    rows, page, pages = cursor.page(page)
+    q = cursor.query
+    head = f"📦 **{owner}'s cards**"
+    if q.describe():
+        head += f" — {q.describe()}"
+    head += f" *(sorted by {q.sort})*"
+    if not rows:
+        return f"{head}\nNo cards match.", 1, 1
+    lines = [head]
+    for pos, x in rows:
+        c = view(x)
+        lines.append(f"`#{pos + 1}` {c['name']} — {c['element']} · {c['rarity'].title()} "
+                     f"*(ATK {c['atk']} / DEF {c['def']})*")
+    total = f" · {cursor.total} card(s)" if cursor.total is not None else ""
+    lines.append(f"Page {page}/{pages if pages is not None else '?'}{total}")
+    return "\n".join(lines), page, pages
+
+# ---- catalog lookups (shared by the prefix and slash commands) ----
+def card_text(tid: int) -> str:
+    t = catalog.template(tid)
+    e, r = t["element"], t["rarity"]
+    rng = STAT_RANGES.get(r, {"atk": (100, 100), "def": (100, 100)})
+    return (f"🃏 **{t['name']}** — {ELEMENT_EMOJI.get(e, '')}{e} · {r.title()}\n"
+            f"Series: {t.get('series') or '—'} · beats {', '.join(ADV.get(e, [])) or 'nothing'}\n"
+            f"Pulls roll ATK {rng['atk'][0]}–{rng['atk'][1]} / DEF {rng['def'][0]}–{rng['def'][1]}")
+
+def card_lookup(text: str) -> str:
+    """!card / /card: the best match, plus near misses when the name wasn't exact."""
+    tids = catalog.search(text, limit=6)
+    if not tids:
+        return f"❌ No card called `{text}`."
+    out = card_text(tids[0])
+    if len(tids) > 1:
+        out += "\n*Also:* " + ", ".join(catalog.template(t)["name"] for t in tids[1:])
+    return out
+
+def _choice(tid: int) -> app_commands.Choice[str]:
+    t = catalog.template(tid)
+    label = f"{t['name']} · {t['rarity'].title()} · {t.get('series') or '?'}"
+    return app_commands.Choice(name=label[:100], value=t["id"])
+
+def catalog_page(tids: List[int], title: str, page: int):
+    """(text, page, pages) for one page of catalog templates."""
+    pages = max(1, -(-len(tids) // CATALOG_PAGE))
+    page = max(1, min(page, pages))
+    lines = [f"📚 **{title}** — {len(tids)} card(s)"]
+    for tid in tids[(page - 1) * CATALOG_PAGE:page * CATALOG_PAGE]:
+        t = catalog.template(tid)
+        lines.append(f"• {t['name']} — {ELEMENT_EMOJI.get(t['element'], '')}{t['element']} · "
+                     f"{t['rarity'].title()} · {t.get('series') or '—'}")
+    if not tids:
+        lines.append("No cards match.")
+    lines.append(f"Page {page}/{pages}")
+    return "\n".join(lines), page, pages
+
+def catalog_query(series: Optional[str], element: Optional[str], rarity: Optional[str]) -> List[int]:
+    """Templates for !cards / /cards, rarest first then by name."""
+    tids = catalog.lookup(series, element, rarity)
+    order = {r: i for i, r in enumerate(RARITY_ORDER)}
+    return sorted(tids, key=lambda t: order.get(catalog.template(t)["rarity"], len(order)))
+
+# ---- collection completion ----
+def _guild_collections(gid: int) -> collection.GuildCollections:
+    return collection.for_guild(gid, cards_repo.guild_cards(gid))
+
+def _bar(pct: float, width: int = 10) -> str:
+    full = int(round(pct / 100 * width))
+    return "▰" * full + "▱" * (width - full)
+
+def _completion(bits: int, mask: int) -> str:
+    pct = collection.percent(bits, mask)
+    return f"{_bar(pct)} {collection.collected(bits, mask)}/{collection.collected(mask, mask)} ({pct:.0f}%)"
 
 class Cards(commands.Cog, name="Cards"):
     """Gacha pulls + inventory."""
@@ -126,60 +141,143 @@ class Cards(commands.Cog, name="Cards"):
             bank_set_path(bank_path)
         bank_load()
 
-        # ensure folder exists
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-        # 20-second safeguard: always load a valid structure
-        data = _normalize_cards_data(_read_json(DATA_FILE))
-        _write_json(DATA_FILE, data)   # write back the healed structure
-        self._cards = data
+        # inventories live in per-guild shards (cards_repo); nothing is read until a guild is used
+        cards_repo.init()
 
     @commands.command(name="initcards", aliases=["initcard"])
     async def init_cmd(self, ctx: commands.Context):
         """Create folders/files needed by the cards system."""
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        if not DATA_FILE.exists():
-            _save_cards({})
+        cards_repo.GUILDS_DIR.mkdir(parents=True, exist_ok=True)
         await ctx.send("✅ Cards system initialized.")
 
     @commands.command(name="inventory", aliases=["inv"])
-    async def inv_cmd(self, ctx: commands.Context, member: Optional[discord.Member] = None):
-        """Show your (or another member's) pulled cards."""
+    async def inv_cmd(self, ctx: commands.Context, member: Optional[discord.Member] = None, *, query: str = ""):
+        """Browse your (or another member's) cards: !inv [@member] [rarity:epic element:fire series:"one piece" atk>=300 def>=300 sort:power]"""
         member = member or ctx.author
-        data = _load_cards()
-        inv = _user_inv(data, ctx.guild.id, member.id)
-
+        try:
+            q = parse_query(query)
+        except ValueError as e:
+            return await ctx.send(f"❌ {e}")
+        inv = inventory(ctx.guild.id, member.id)
         if not inv:
-            await ctx.send(f"📦 {member.display_name} has no cards yet.")
-            return
-
-        # group by rarity for prettier display
-        by_r = {"legendary": [], "epic": [], "rare": [], "uncommon": [], "common": []}
-        for c in inv:
-            by_r.get(c.get("rarity", "common"), []).append(c)
-
-        lines = []
-        for r in RARITY_ORDER[::-1]:  # show common -> legendary
-            bucket = by_r[r]
-            if not bucket:
-                continue
-            lines.append(f"**{r.title()}** ({len(bucket)}):")
-            for card in bucket[:10]:
-                n = card["name"]; e = card["element"]; a = card.get("atk", "?"); d = card.get("def", "?")
-                lines.append(f"• {n} — {e}  *(ATK {a} / DEF {d})*")
-            if len(bucket) > 10:
-                lines.append(f"…and {len(bucket)-10} more.")
+            return await ctx.send(f"📦 {member.display_name} has no cards yet.")
+
+        cursor = Cursor(index_for(ctx.guild.id, member.id, inv), q)
+        text, page, pages = inv_page(member.display_name, cursor, 1)
+        pager = Pager(lambda p: inv_page(member.display_name, cursor, p), page, pages, ctx.author.id)
+        await send_paged(ctx, text, pager)
+
+    @commands.command(name="card")
+    async def card_cmd(self, ctx: commands.Context, *, name: str):
+        """Look a card up by name (prefixes and typos are fine)."""
+        await ctx.send(card_lookup(name))
+
+    @commands.command(name="cards", aliases=["catalog"])
+    async def cards_cmd(self, ctx: commands.Context, *, query: str = ""):
+        """Browse the card catalog: !cards [series:<x>] [element:<x>] [rarity:<x>]"""
+        try:
+            q = parse_query(query, keys=("series", "element", "rarity"))
+        except ValueError as e:
+            return await ctx.send(f"❌ {e}")
+        await self._send_catalog(ctx, ctx.author.id, q.series, q.element,
+                                 RARITIES[q.rarity] if q.rarity is not None else None)
+
+    async def _send_catalog(self, dest: Union[commands.Context, discord.Interaction], author_id: int,
+                            series: Optional[str], element: Optional[str], rarity: Optional[str]):
+        tids = catalog_query(series, element, rarity)
+        title = " · ".join(x.title() for x in (series, element, rarity) if x) or "All cards"
+        text, page, pages = catalog_page(tids, title, 1)
+        await send_paged(dest, text, Pager(lambda p: catalog_page(tids, title, p), page, pages, author_id))
+
+    # ---- slash versions, with autocomplete from the catalog indexes ----
+    @app_commands.command(name="card", description="Look up a card in the catalog.")
+    @app_commands.describe(name="Card name")
+    async def slash_card(self, interaction: discord.Interaction, name: str):
+        await interaction.response.send_message(card_lookup(name))
+
+    @slash_card.autocomplete("name")
+    async def _card_name_choices(self, interaction: discord.Interaction, current: str):
+        return [_choice(tid) for tid in catalog.suggest(current)]
+
+    @app_commands.command(name="cards", description="Browse the card catalog by series, element or rarity.")
+    @app_commands.describe(series="Series", element="Element", rarity="Rarity")
+    async def slash_cards(self, interaction: discord.Interaction, series: Optional[str] = None,
+                          element: Optional[str] = None, rarity: Optional[str] = None):
+        s = catalog.resolve_series(series) if series else None
+        e = catalog.resolve_element(element) if element else None
+        r = rarity.lower() if rarity else None
+        if (series and s is None) or (element and e is None) or (r and r not in RARITIES):
+            return await interaction.response.send_message("❌ Pick the filters from the suggestions.", ephemeral=True)
+        await self._send_catalog(interaction, interaction.user.id, s, e, r)
+
+    @slash_cards.autocomplete("series")
+    async def _series_choices(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=n, value=n) for n in catalog.series_names(current)]
+
+    @slash_cards.autocomplete("element")
+    async def _element_choices(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=e, value=e) for e in ELEMENTS if e.lower().startswith(current.lower())]
+
+    @slash_cards.autocomplete("rarity")
+    async def _rarity_choices(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=r.title(), value=r) for r in RARITIES if r.startswith(current.lower())]
+
+    @commands.command(name="collection", aliases=["col"])
+    async def collection_cmd(self, ctx: commands.Context, member: Optional[discord.Member] = None, *, series: str = ""):
+        """How much of the catalog you (or a member) have collected, overall or for one series."""
+        member = member or ctx.author
+        bits = _guild_collections(ctx.guild.id).bits.get(member.id, 0)
+        if series:
+            s = catalog.resolve_series(series)
+            if s is None:
+                return await ctx.send(f"❌ No series called `{series}` — try one of {', '.join(catalog.series_names())}.")
+            mask = collection.SERIES_MASKS[s]
+            lines = [f"📚 **{member.display_name}** — {catalog.SERIES[s]}: {_completion(bits, mask)}"]
+            gaps = collection.missing(bits, mask)
+            if gaps:
+                names = [catalog.template(t)["name"] for t in gaps[:MISSING_SHOWN]]
+                more = f" …and {len(gaps) - MISSING_SHOWN} more" if len(gaps) > MISSING_SHOWN else ""
+                lines.append("Missing: " + ", ".join(names) + more)
+            else:
+                lines.append("✨ Complete!")
+            return await ctx.send("\n".join(lines))
+
+        lines = [f"📚 **{member.display_name}'s collection** — {_completion(bits, collection.ALL)}"]
+        for r in RARITY_ORDER:
+            lines.append(f"• {r.title()}: {_completion(bits, collection.RARITY_MASKS[r])}")
+        for s, mask in sorted(collection.SERIES_MASKS.items()):
+            lines.append(f"• {catalog.SERIES[s]}: {_completion(bits, mask)}")
+        await ctx.send("\n".join(lines))
+
+    @commands.command(name="collectiontop", aliases=["coltop"])
+    async def collectiontop_cmd(self, ctx: commands.Context, page: int = 1):
+        """Completionist leaderboard: most catalog cards collected in this server."""
+        g = _guild_collections(ctx.guild.id)
+        total = collection.collected(collection.ALL)
+        pages = max(1, -(-len(g.rank) // COLLECTIONTOP_PAGE))
+        page = max(1, min(page, pages))
+        start = (page - 1) * COLLECTIONTOP_PAGE
+        lines = [f"🏆 **Completionists** — page {page}/{pages}"]
+        for n, (uid, have) in enumerate(g.top(start, COLLECTIONTOP_PAGE), start=start + 1):
+            m = ctx.guild.get_member(uid)
+            name = m.display_name if m else f"<left:{uid}>"
+            lines.append(f"**{n}.** {name} — {have}/{total} ({100.0 * have / total:.0f}%)")
+        if len(lines) == 1:
+            lines.append("Nobody has pulled a card yet.")
+        place = g.rank_of(ctx.author.id)
+        if place is not None:
+            lines.append(f"You're **#{place}** of {len(g.rank)}.")
         await ctx.send("\n".join(lines))
 
     @commands.command(name="pull")
     async def pull_cmd(self, ctx: commands.Context, amount: int = 1):
-        """Pull 1/5/10 cards, pay with KamiCoins (discounts for 5/10)."""
-        if amount not in (1, 5, 10):
-            return await ctx.send("Choose 1, 5, or 10 pulls.")
+        """Pull 1-100 cards, pay with KamiCoins (discounts from 5 and 10)."""
+        if not 1 <= amount <= MAX_PULL:
+            return await ctx.send(f"Choose between 1 and {MAX_PULL} pulls.")
 
         # cost with discount
         cost = PULL_COST * amount
-        disc = DISCOUNTS.get(amount, 0.0)
+        disc = _discount(amount)
         if disc:
             cost = int(round(cost * (1.0 - disc)))
 
@@ -187,41 +285,36 @@ class Cards(commands.Cog, name="Cards"):
         if bal < cost:
             return await ctx.send(f"❌ You need {cost} KamiCoins, you have {bal}.")
 
-        # pay
-        add_balance(ctx.guild.id, ctx.author.id, -cost)
+        try:
+            # pay + pity as one bank transaction; cards are only handed out once it commits
+            async with transaction(ctx.guild.id) as tx:
+                tx.add(ctx.author.id, -cost)
+                pulls, pity = SAMPLER.pull(amount, tx.pity(ctx.author.id))
+                tx.set_pity(ctx.author.id, pity)
+        except InsufficientFunds as e:
+            return await ctx.send(f"❌ You need {cost} KamiCoins, you have {e.balance}.")
 
-        data = _load_cards()
-        inv = _user_inv(data, ctx.guild.id, ctx.author.id)
+        add_cards(ctx.guild.id, ctx.author.id, pulls)
 
-        pulls: List[Dict[str, Any]] = []
-        pity = get_pity(ctx.guild.id, ctx.author.id)
-
-        for _ in range(amount):
-            rarity = _pick_rarity(ctx.guild.id, ctx.author.id)
-            card = _pick_card(rarity)
-            pulls.append(card)
-            inv.append(card)
-
-            # pity update
-            if rarity == "legendary":
-                pity = 0
-            else:
-                pity = min(PITY_MAX, pity + 1)
-
-        set_pity(ctx.guild.id, ctx.author.id, pity)
-        _save_cards(data)
-        bank_save()
-
-        # show results
-        by_r = {}
+        # show results (the rarest SHOW_PULLS of a big pull, with per-rarity counts)
+        lines = [f"🪄 **You pulled {amount}!** *(paid {cost} KamiCoins)*"]
+        counts: Dict[str, int] = {}
         for c in pulls:
+            r = rarity_of(c)
+            counts[r] = counts.get(r, 0) + 1
+        if amount > SHOW_PULLS:
+            lines.append(" · ".join(f"{r.title()} ×{counts[r]}" for r in RARITY_ORDER if r in counts))
+            pulls = sorted(pulls, key=lambda c: RARITY_ORDER.index(rarity_of(c)))[:SHOW_PULLS]
+
+        by_r: Dict[str, List[Dict[str, Any]]] = {}
+        for c in map(view, pulls):
             by_r.setdefault(c["rarity"], []).append(c)
-
-        lines = [f"🪄 **You pulled {amount}!** *(paid {cost} KamiCoins)*"]
         for r in RARITY_ORDER:  # legendary first
             if r not in by_r: continue
-            lines.append(f"\n**{r.title()}** ×{len(by_r[r])}:")
+            lines.append(f"\n**{r.title()}** ×{counts[r]}:")
             for c in by_r[r]:
                 lines.append(f"• {c['name']} — {c['element']} *(ATK {c['atk']} / DEF {c['def']})*")
+            if len(by_r[r]) < counts[r]:
+                lines.append(f"…and {counts[r] - len(by_r[r])} more.")
 
-        await ctx.send("\n".join(lines))
\ No newline at end of file
+        await ctx.send("\n".join(lines))
@@ -0,0 +1,256 @@
+# cogs/cards_repo.py
+from __future__ import annotations
+import json, os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from carddata import RARITIES
+from . import cardindex, catalog, collection
+from .guildcache import GuildCache
+from .persist import SCHEDULER, OffloopWriter, mark_dirty, write_json_atomic
+
+# Card inventories, shared by the Cards and Duel cogs. Each guild lives in its
+# own shard, loaded on first access into {uid: array('q')} and written back by
+# one off-loop writer a couple of seconds after it changes (and before the
+# guild is evicted when idle); a snapshot is one memcpy per user.
+#
+# A card instance is a flyweight: one int packing the catalog template index
+# (catalog.py), the rarity index into carddata.RARITIES and the rolled atk/def,
+#   tid << 36 | rarity << 32 | atk << 16 | def
+# Name, element and series are looked up from the catalog when a card is shown.
+#
+# Canonical shard (SCHEMA_VERSION 2):
+#   {"version": 2, "templates": ["<card id>", ...],
+#    "users": {"<uid>": [[template, rarity, atk, def], ...]}}
+# where template indexes the shard's own "templates" list of carddata slug ids
+# ({"id", "name", "element"} for cards no longer in carddata), so catalog order
+# never leaks into files. Older shapes are upgraded as they
+# are read: v1 shards of full card dicts, the single cards.json (guilds nested
+# under "guilds" or at the top level), unversioned shards of {"<uid>": [cards]},
+# and users stored as {"cards": [...]}.
+
+DATA_DIR = Path("data") / "cards"
+DATA_FILE = DATA_DIR / "cards.json"  # legacy single file; split into GUILDS_DIR once
+GUILDS_DIR = DATA_DIR / "guilds"     # <gid>.json, canonical schema above
+SCHEMA_VERSION = 2
+FLUSH_INTERVAL_MS = 2000
+
+Card = Dict[str, Any]            # a rendered card (view())
+Inventory = Dict[int, array]     # uid -> packed cards, oldest first
+
+_DIRTY: Set[int] = set()  # guilds changed (or upgraded) since their last write
+
+_STAT = 0xFFFF
+_RARITY = {r: i for i, r in enumerate(RARITIES)}
+
+
+# ---- instances ----
+def pack(tid: int, rarity: int, atk: int, de: int) -> int:
+    return (tid << 36) | (rarity << 32) | (min(max(atk, 0), _STAT) << 16) | min(max(de, 0), _STAT)
+
+def unpack(x: int) -> Tuple[int, int, int, int]:
+    """(template index, rarity index, atk, def)"""
+    return x >> 36, (x >> 32) & 0xF, (x >> 16) & _STAT, x & _STAT
+
+def rarity_of(x: int) -> str:
+    return RARITIES[(x >> 32) & 0xF]
+
+def power(x: int) -> int:
+    """atk + def, read straight from the packed int."""
+    return ((x >> 16) & _STAT) + (x & _STAT)
+
+def new_card(card_id: str, rarity: str, atk: int, de: int) -> int:
+    return pack(catalog.tid_for(card_id), _RARITY.get(rarity, 0), atk, de)
+
+def view(x: int) -> Card:
+    """The card as a dict for display, resolved from the catalog."""
+    tid, r, atk, de = unpack(x)
+    t = catalog.template(tid)
+    return {"id": t["id"], "name": t["name"], "element": t["element"], "series": t.get("series", ""),
+            "rarity": RARITIES[r], "atk": atk, "def": de}
+
+
+# ---- schema ----
+def _from_dict(c: Any) -> Optional[int]:
+    """A pre-v2 card dict as a packed instance, or None if it can't be read."""
+    if not isinstance(c, dict) or not c.get("name"):
+        return None
+    try:
+        element = str(c.get("element", "?"))
+        tid = (catalog.tid_for(str(c["id"]), str(c["name"]), element) if c.get("id")
+               else catalog.tid_for_name(str(c["name"]), element))
+        return pack(tid, _RARITY.get(str(c.get("rarity", "common")).lower(), 0),
+                    int(c.get("atk", 100)), int(c.get("def", 100)))
+    except (TypeError, ValueError):
+        return None
+
+def _user_cards(v: Any) -> array:
+    if isinstance(v, dict):  # {"cards": [...]}
+        v = v.get("cards")
+    if not isinstance(v, list):
+        return array("q")
+    return array("q", (x for x in map(_from_dict, v) if x is not None))
+
+def from_json(data: Any) -> Tuple[Inventory, bool]:
+    """(inventory, upgraded) for any known shard shape."""
+    if not isinstance(data, dict):
+        return {}, True
+    inv: Inventory = {}
+    if data.get("version") == SCHEMA_VERSION:
+        tids = [catalog.tid_for(t["id"], t.get("name"), t.get("element", "?")) if isinstance(t, dict)
+                else catalog.tid_for(str(t)) for t in data.get("templates") or []]
+        for uid, rows in (data.get("users") or {}).items():
+            inv[int(uid)] = array("q", [(tids[t] << 36) | (r << 32) | (a << 16) | d for t, r, a, d in rows])
+        return inv, False
+    users = data.get("users") if data.get("version") == 1 else data  # v1, or unversioned {"<uid>": [cards]}
+    for uid, v in (users if isinstance(users, dict) else {}).items():
+        if str(uid).isdigit():
+            inv[int(uid)] = _user_cards(v)
+    return inv, True
+
+def to_json(inv: Inventory) -> Dict[str, Any]:
+    local: Dict[int, int] = {}  # catalog tid -> index into this shard's "templates"
+    users = {}
+    for uid, cards in inv.items():
+        if cards:
+            users[str(uid)] = [[local.setdefault(x >> 36, len(local)), (x >> 32) & 0xF, (x >> 16) & _STAT, x & _STAT]
+                               for x in cards]
+    return {"version": SCHEMA_VERSION,
+            "templates": [_template_ref(catalog.template(tid)) for tid in local],
+            "users": users}
+
+def _template_ref(t: Dict[str, Any]) -> Any:
+    """A carddata id, or the id with name/element for cards no longer in carddata."""
+    if t.get("placeholder"):
+        return {"id": t["id"], "name": t["name"], "element": t["element"]}
+    return t["id"]
+
+
+# ---- shards ----
+def _shard(gid: int) -> Path:
+    return GUILDS_DIR / f"{gid}.json"
+
+def _load_guild(gid: int) -> Inventory:
+    try:
+        with _shard(gid).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[cards] unreadable shard for {gid}, starting empty: {e!r}")
+        return {}
+    inv, upgraded = from_json(data)
+    if upgraded:
+        _DIRTY.add(gid)  # rewritten in the canonical shape on the next flush
+        mark_dirty("cards")
+    return inv
+
+def _prepare() -> Dict[int, Inventory]:
+    snaps = {}
+    for gid in _DIRTY:
+        inv = _CACHE.peek(gid)
+        if inv is not None:
+            snaps[gid] = {u: cards[:] for u, cards in inv.items()}  # memcpy per user
+    _DIRTY.clear()
+    return snaps
+
+def _write(snaps: Dict[int, Inventory]) -> int:
+    return sum(write_json_atomic(str(_shard(gid)), to_json(inv)) for gid, inv in snaps.items())
+
+_WRITER = OffloopWriter("cards", _prepare, _write, on_failed=_DIRTY.update)  # a failed write leaves its guilds dirty
+
+async def _evict_guild(gid: int, inv: Inventory) -> None:
+    collection.forget(gid)
+    if gid in _DIRTY:
+        await _WRITER.save()
+
+_CACHE = GuildCache("cards", _load_guild, _evict_guild)
+
+async def flush() -> int:
+    before = _WRITER.bytes_written
+    await _WRITER.save()
+    return _WRITER.bytes_written - before
+
+
+# ---- migration ----
+def _migrate_legacy() -> None:
+    """Split the single-file cards.json into per-guild shards (once)."""
+    if not DATA_FILE.exists():
+        return
+    try:
+        with DATA_FILE.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"[cards] unreadable {DATA_FILE}, not migrating: {e!r}")
+        return
+    if not isinstance(data, dict):
+        data = {}
+    nested = data.pop("guilds", None)
+    guilds = {**(nested if isinstance(nested, dict) else {}), **data}  # nested and top-level gid shapes
+    n = 0
+    for gid, g in guilds.items():
+        if isinstance(g, dict) and str(gid).isdigit():
+            inv, _ = from_json(g)
+            write_json_atomic(str(_shard(int(gid))), to_json(inv))
+            n += 1
+    os.replace(DATA_FILE, str(DATA_FILE) + ".migrated")
+    print(f"[cards] split {DATA_FILE} into {n} guild shards")
+
+def upgrade_all() -> int:
+    """Rewrite every shard still in an old shape; returns shards upgraded."""
+    n = 0
+    for p in GUILDS_DIR.glob("*.json"):
+        if not p.stem.isdigit():
+            continue
+        with p.open("r", encoding="utf-8") as f:
+            inv, upgraded = from_json(json.load(f))
+        if upgraded:
+            write_json_atomic(str(p), to_json(inv))
+            n += 1
+    return n
+
+_READY = False
+
+def init() -> None:
+    """Migrate old data and register the writer (idempotent; both cogs call it)."""
+    global _READY
+    if _READY:
+        return
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    _migrate_legacy()
+    GUILDS_DIR.mkdir(parents=True, exist_ok=True)
+    SCHEDULER.register("cards", flush, interval_ms=FLUSH_INTERVAL_MS)
+    _READY = True
+
+
+# ---- access ----
+def guild_cards(gid: int) -> Inventory:
+    """uid -> packed cards for one guild (loaded on first access). Treat as read-only."""
+    return _CACHE.get(gid)
+
+def inventory(gid: int, uid: int) -> array:
+    """A user's packed cards, oldest first (empty if none). Treat as read-only."""
+    return _CACHE.get(gid).get(uid) or array("q")
+
+def add_cards(gid: int, uid: int, cards: Iterable[int]) -> int:
+    """Append pulled (packed) cards to a user's inventory; returns their new card count."""
+    guild = _CACHE.get(gid)
+    inv = guild.get(uid)
+    if inv is None:
+        inv = guild[uid] = array("q")
+    start = len(inv)
+    inv.extend(cards)
+    cardindex.on_pull(gid, uid, inv)
+    collection.on_pull(gid, uid, guild, inv[start:])
+    _DIRTY.add(gid)
+    mark_dirty("cards")
+    return len(inv)
+
+
+if __name__ == "__main__":
+    # python -m cogs.cards_repo  -> split a legacy cards.json and upgrade old shards in place
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    _migrate_legacy()
+    GUILDS_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"[cards] upgraded {upgrade_all()} shard(s) to schema v{SCHEMA_VERSION}")
@@ -0,0 +1,223 @@
+# cogs/catalog.py
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional
+
+from carddata import ALL_CARDS, ELEMENTS, RARITIES
+from carddata.utils import slugify
+
+# The card catalog: every template in carddata, addressed by a small int
+# (template index, "tid") for the life of the process. Pulled cards store the
+# tid and look name/element/series up here when rendered; on disk they are
+# keyed by the template's slug id, so reordering or extending carddata never
+# changes an existing card. Ids that are no longer in carddata (or came from
+# an old file) are interned as placeholder templates rather than dropped.
+#
+# Lookups are indexed once at import, over the carddata templates only
+# (placeholders are never search results): id and name maps, inverted lists of
+# tids per series / element / rarity, a trie over the words of every name and
+# a trigram index for typos. Every trie node keeps the tids of all names with a
+# word under that prefix, in name order, so a suggestion is a walk down the
+# typed prefix plus a slice, however large the catalog - well inside Discord's
+# autocomplete deadline.
+
+Template = Dict[str, Any]
+
+TEMPLATES: List[Template] = []    # tid -> {"id", "name", "element", "series", "rarity", "atk", "def"}
+_BY_ID: Dict[str, int] = {}
+_BY_NAME: Dict[str, int] = {}
+
+
+def _add(t: Template) -> int:
+    tid = len(TEMPLATES)
+    TEMPLATES.append(t)
+    _BY_ID[t["id"]] = tid
+    _BY_NAME.setdefault(t["name"].lower(), tid)
+    return tid
+
+
+for _rarity in RARITIES:
+    for _t in ALL_CARDS.get(_rarity, []):
+        _add({**_t, "rarity": _rarity})
+
+
+def tid_for(card_id: str, name: Optional[str] = None, element: str = "?") -> int:
+    """Template index for a slug id, interning unknown ids."""
+    tid = _BY_ID.get(card_id)
+    if tid is None:
+        tid = _add({"id": card_id, "name": name or card_id, "element": element, "series": "",
+                    "rarity": "common", "atk": 0, "def": 0, "placeholder": True})
+    return tid
+
+
+def tid_for_name(name: str, element: str = "?") -> int:
+    """Template index for a card name (old files stored names, not ids)."""
+    tid = _BY_NAME.get(name.lower())
+    return tid if tid is not None else tid_for(slugify(name), name, element)
+
+
+def template(tid: int) -> Template:
+    return TEMPLATES[tid]
+
+
+def find(card_id: str) -> Optional[Template]:
+    tid = _BY_ID.get(card_id)
+    return TEMPLATES[tid] if tid is not None else None
+
+
+# ---- search indexes ----
+MAX_SUGGEST = 25      # Discord's cap on autocomplete choices
+FUZZY_MIN = 0.3       # share of a query's trigrams a typo match must have
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _grams(text: str) -> set:
+    t = f" {' '.join(_words(text))} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+class _Node:
+    __slots__ = ("kids", "tids")
+
+    def __init__(self):
+        self.kids: Dict[str, _Node] = {}
+        self.tids: List[int] = []   # every name with a word under this prefix, in name order
+
+
+_TRIE = _Node()
+_BY_SERIES: Dict[str, List[int]] = {}    # lower-cased series -> tids
+_BY_ELEMENT: Dict[str, List[int]] = {}   # lower-cased element -> tids
+_BY_RARITY: Dict[str, List[int]] = {}
+_GRAMS: Dict[str, List[int]] = {}        # name trigram -> tids
+_GRAM_COUNT: Dict[int, int] = {}
+SERIES: Dict[str, str] = {}              # lower-cased -> as written in carddata
+_NAMED: List[int] = []                   # indexed tids, in name order
+
+
+def _index(tid: int) -> None:
+    t = TEMPLATES[tid]
+    for w in dict.fromkeys(_words(t["name"])):
+        node = _TRIE
+        for ch in w:
+            node = node.kids.setdefault(ch, _Node())
+            if not node.tids or node.tids[-1] != tid:  # two words of one name can share a prefix
+                node.tids.append(tid)
+    series = t.get("series", "")
+    if series:
+        SERIES.setdefault(series.lower(), series)
+        _BY_SERIES.setdefault(series.lower(), []).append(tid)
+    _BY_ELEMENT.setdefault(t["element"].lower(), []).append(tid)
+    _BY_RARITY.setdefault(t["rarity"], []).append(tid)
+    grams = _grams(t["name"])
+    for g in grams:
+        _GRAMS.setdefault(g, []).append(tid)
+    _GRAM_COUNT[tid] = len(grams)
+    _NAMED.append(tid)
+
+
+for _tid in sorted(range(len(TEMPLATES)), key=lambda i: (TEMPLATES[i]["name"].lower(), i)):
+    _index(_tid)
+
+
+def _prefix(word: str) -> List[int]:
+    node = _TRIE
+    for ch in word:
+        node = node.kids.get(ch)
+        if node is None:
+            return []
+    return node.tids
+
+
+def fuzzy(text: str, limit: int = MAX_SUGGEST) -> List[int]:
+    """Names sharing the most of text's trigrams (catches typos), best first."""
+    q = _grams(text)
+    shared: Dict[int, int] = {}
+    for g in q:
+        for tid in _GRAMS.get(g, ()):
+            shared[tid] = shared.get(tid, 0) + 1
+    # share of the query found in the name, then closeness of the whole name
+    scored = [(n / len(q), n / (len(q) + _GRAM_COUNT[tid] - n), tid) for tid, n in shared.items()
+              if n >= 2 and n >= FUZZY_MIN * len(q)]
+    scored.sort(key=lambda x: (-x[0], -x[1], TEMPLATES[x[2]]["name"].lower()))
+    return [tid for _, _, tid in scored[:limit]]
+
+
+def suggest(text: str, limit: int = MAX_SUGGEST) -> List[int]:
+    """Names with a word starting with each typed word, in name order; typo matches if none."""
+    words = _words(text)
+    if not words:
+        return _NAMED[:limit]
+    lists = sorted((_prefix(w) for w in words), key=len)
+    if not lists[0]:
+        return fuzzy(text, limit)
+    rest = [set(lst) for lst in lists[1:]]
+    out = []
+    for tid in lists[0]:  # already in name order
+        if all(tid in r for r in rest):
+            out.append(tid)
+            if len(out) == limit:
+                break
+    return out or fuzzy(text, limit)
+
+
+def search(text: str, limit: int = MAX_SUGGEST) -> List[int]:
+    """An exact id or name first, then suggest()."""
+    text = text.strip()
+    exact = _BY_ID.get(text, _BY_NAME.get(text.lower()))
+    if exact is not None and not TEMPLATES[exact].get("placeholder"):
+        return [exact]
+    return suggest(text, limit)
+
+
+def resolve_series(text: str) -> Optional[str]:
+    """Lower-cased series for what a user typed: exact, unique word prefix, or the closest name."""
+    t = " ".join(_words(text))
+    if not t:
+        return None
+    norm = {" ".join(_words(k)): k for k in _BY_SERIES}
+    if t in norm:
+        return norm[t]
+    hits = [k for n, k in norm.items()
+            if n.replace(" ", "").startswith(t.replace(" ", "")) or any(w.startswith(t) for w in n.split())]
+    if len(hits) == 1:
+        return hits[0]
+    q = _grams(t)
+    score, best = max(((len(q & _grams(n)) / len(q | _grams(n)), n) for n in norm), default=(0.0, ""))
+    return norm[best] if score >= FUZZY_MIN else None
+
+
+def resolve_element(text: str) -> Optional[str]:
+    """Lower-cased element for an exact or unique prefix match."""
+    t = text.strip().lower()
+    hits = [e.lower() for e in ELEMENTS if e.lower().startswith(t)] if t else []
+    return t if t in hits else (hits[0] if len(hits) == 1 else None)
+
+
+def lookup(series: Optional[str] = None, element: Optional[str] = None,
+           rarity: Optional[str] = None) -> List[int]:
+    """Catalog tids matching every given filter (lower-cased keys), in name order."""
+    lists = []
+    if series is not None:
+        lists.append(_BY_SERIES.get(series, []))
+    if element is not None:
+        lists.append(_BY_ELEMENT.get(element, []))
+    if rarity is not None:
+        lists.append(_BY_RARITY.get(rarity, []))
+    if not lists:
+        return list(_NAMED)
+    lists.sort(key=len)
+    rest = [set(lst) for lst in lists[1:]]
+    return [tid for tid in lists[0] if all(tid in r for r in rest)]  # lists are in name order
+
+
+def series_names(prefix: str = "", limit: int = MAX_SUGGEST) -> List[str]:
+    """Series as written in carddata whose name (or a word of it) starts with prefix."""
+    t = " ".join(_words(prefix))
+    out = [v for k, v in sorted(SERIES.items())
+           if not t or " ".join(_words(k)).startswith(t) or any(w.startswith(t) for w in _words(k))]
+    return out[:limit]
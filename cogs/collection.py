@@ -0,0 +1,115 @@
+# cogs/collection.py
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from carddata import RARITIES
+from . import catalog
+from .ranking import RankIndex, key, unkey
+
+# Collection completion. A user's collection is one int used as a bitset over
+# catalog template indexes (bit tid set = owns at least one copy). A guild's
+# bitsets are built from its inventories the first time it is asked about and
+# OR-ed on every pull after that (cards_repo.add_cards), so nothing rescans an
+# inventory. Completion against the whole catalog, a series or a rarity is a
+# popcount of bits & mask, with the masks precomputed from the catalog, and
+# each guild keeps a RankIndex of key(templates collected, uid) that a pull only
+# touches when it brings a template the user didn't have yet.
+
+Bits = int
+
+try:
+    _popcount = int.bit_count            # 3.10+
+except AttributeError:
+    def _popcount(b: int) -> int:
+        return bin(b).count("1")
+
+
+def _mask(tids: Iterable[int]) -> Bits:
+    m = 0
+    for tid in tids:
+        m |= 1 << tid
+    return m
+
+
+ALL: Bits = _mask(catalog.lookup())                                   # every real template
+SERIES_MASKS: Dict[str, Bits] = {s: _mask(catalog.lookup(series=s)) for s in catalog.SERIES}
+RARITY_MASKS: Dict[str, Bits] = {r: _mask(catalog.lookup(rarity=r)) for r in RARITIES}
+
+
+def bits_of(cards: Iterable[int]) -> Bits:
+    """Bitset of the templates among packed cards."""
+    return _mask({x >> 36 for x in cards})
+
+
+def collected(bits: Bits, mask: Bits = ALL) -> int:
+    return _popcount(bits & mask)
+
+
+def percent(bits: Bits, mask: Bits = ALL) -> float:
+    total = _popcount(mask)
+    return 100.0 * collected(bits, mask) / total if total else 0.0
+
+
+def missing(bits: Bits, mask: Bits = ALL) -> List[int]:
+    """tids in mask the bitset lacks, lowest first."""
+    out, rest = [], mask & ~bits
+    while rest:
+        low = rest & -rest
+        out.append(low.bit_length() - 1)
+        rest ^= low
+    return out
+
+
+class GuildCollections:
+    """uid -> bitset for one guild, plus the completion leaderboard."""
+    __slots__ = ("inv", "bits", "rank")
+
+    def __init__(self, inv: Dict[int, Iterable[int]]):
+        self.inv = inv  # the cards_repo inventory this was built from
+        self.bits: Dict[int, Bits] = {uid: bits_of(cards) for uid, cards in inv.items()}
+        self.rank = RankIndex(key(collected(b), uid) for uid, b in self.bits.items() if collected(b))
+
+    def add(self, uid: int, cards: Iterable[int]) -> None:
+        old = self.bits.get(uid, 0)
+        new = old | bits_of(cards)
+        if new == old:
+            return
+        self.bits[uid] = new
+        before, after = collected(old), collected(new)
+        if after != before:
+            if before:
+                self.rank.replace(key(before, uid), key(after, uid))
+            else:
+                self.rank.add(key(after, uid))
+
+    def top(self, start: int, count: int) -> List[Tuple[int, int]]:
+        """[(uid, templates collected)] best first."""
+        return [unkey(k) for k in self.rank.slice(start, start + count)]
+
+    def rank_of(self, uid: int) -> Optional[int]:
+        """1-based place, or None if the user has collected nothing."""
+        n = collected(self.bits.get(uid, 0))
+        return self.rank.index(key(n, uid)) + 1 if n else None
+
+
+_GUILDS: Dict[int, GuildCollections] = {}
+
+
+def for_guild(gid: int, inv: Dict[int, Iterable[int]]) -> GuildCollections:
+    """The guild's collections over `inv` (its live cards_repo inventory), built on first use."""
+    g = _GUILDS.get(gid)
+    if g is None or g.inv is not inv:  # first use, or the guild was reloaded
+        g = _GUILDS[gid] = GuildCollections(inv)
+    return g
+
+
+def on_pull(gid: int, uid: int, inv: Dict[int, Iterable[int]], cards: Iterable[int]) -> None:
+    """OR freshly pulled cards into a built guild (no-op until the guild is asked about)."""
+    g = _GUILDS.get(gid)
+    if g is not None and g.inv is inv:
+        g.add(uid, cards)
+
+
+def forget(gid: int) -> None:
+    """Drop a guild's bitsets (its inventory was evicted)."""
+    _GUILDS.pop(gid, None)
@@ -0,0 +1,62 @@
+# cogs/columns.py
+from __future__ import annotations
+from array import array
+from typing import Dict, Tuple
+
+# Compact per-guild user tables: an int user-id -> slot index plus one
+# array('q') column per field (8 bytes per user per field, no per-user objects).
+# The JSON files keep their old str-keyed shape; conversion happens only when
+# loading and when a snapshot is written.
+
+Snapshot = Tuple[array, Dict[str, array]]  # (uids, {column: values})
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1  # what an array('q') slot holds
+
+
+class OutOfRange(ValueError):
+    """A value an int64 column can't hold; the message is user-facing."""
+
+
+def checked(value: int, what: str = "value") -> int:
+    """value as an int, or OutOfRange if a column can't store it.
+
+    Every column writer calls this before touching a column (or anything kept
+    in step with one, like a leaderboard index), so an out-of-range amount is
+    refused up front instead of failing halfway through an update.
+    """
+    v = int(value)
+    if not INT64_MIN <= v <= INT64_MAX:
+        raise OutOfRange(f"{what} must stay between {INT64_MIN:,} and {INT64_MAX:,}.")
+    return v
+
+
+class SlotTable:
+    COLUMNS: Tuple[Tuple[str, int], ...] = ()  # (name, default) per column
+    __slots__ = ("index", "uids")
+
+    def __init__(self):
+        self.index: Dict[int, int] = {}  # uid -> slot
+        self.uids = array("q")
+        for name, _ in self.COLUMNS:
+            setattr(self, name, array("q"))
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def find(self, uid: int) -> int:
+        """Slot of uid, or -1 if the user has no row."""
+        return self.index.get(uid, -1)
+
+    def slot(self, uid: int) -> int:
+        """Slot of uid, appending a row of defaults on first sight."""
+        i = self.index.get(uid)
+        if i is None:
+            i = self.index[uid] = len(self.uids)
+            self.uids.append(uid)
+            for name, default in self.COLUMNS:
+                getattr(self, name).append(default)
+        return i
+
+    def snapshot(self) -> Snapshot:
+        """Copy of the columns (memcpy per column) for an off-loop writer."""
+        return self.uids[:], {name: getattr(self, name)[:] for name, _ in self.COLUMNS}
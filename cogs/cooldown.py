@@ -0,0 +1,89 @@
+# cogs/cooldown.py
+from __future__ import annotations
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+# Per-key cooldowns that forget keys on their own. Two generations of dicts,
+# each spanning one TTL: writes go to the current one and a read checks both.
+# When a generation ends the older dict is dropped wholesale, so every entry
+# lives between one and two TTLs and memory follows the users active in the
+# last 2 * ttl instead of every user ever seen. check-and-set stays two dict
+# lookups, and eviction costs nothing per key.
+
+COOLDOWNS: List["Cooldown"] = []
+
+
+class Generations:
+    """Two generation-swapped dicts, each spanning ttl seconds (see above).
+
+    Subclasses keep their entries in _cur/_old and call _rotate(now) once now
+    reaches _gen_end, before touching either dict.
+    """
+    __slots__ = ("ttl", "_cur", "_old", "_gen_end", "evictions")
+
+    def __init__(self, ttl: float):
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.ttl = float(ttl)
+        self._cur: Dict[Hashable, Any] = {}
+        self._old: Dict[Hashable, Any] = {}
+        self._gen_end = 0.0
+        self.evictions = 0   # keys forgotten by generation swaps
+
+    def __len__(self) -> int:
+        return len(self._cur) + len(self._old)
+
+    def _rotate(self, now: float) -> None:
+        if now >= self._gen_end + self.ttl:  # idle for a whole generation: both are stale
+            self.evictions += len(self._cur) + len(self._old)
+            self._cur, self._old = {}, {}
+            self._gen_end = now + self.ttl
+        else:
+            self.evictions += len(self._old)
+            self._cur, self._old = {}, self._cur
+            self._gen_end += self.ttl
+
+    def clear(self) -> None:
+        self._cur.clear()
+        self._old.clear()
+
+
+class Cooldown(Generations):
+    """key -> last accepted ts, forgotten automatically after ttl seconds."""
+    __slots__ = ("name", "hits", "blocked")
+
+    def __init__(self, name: str, ttl: float):
+        super().__init__(ttl)
+        self.name = name
+        # counters
+        self.hits = 0        # keys let through (and stamped)
+        self.blocked = 0     # keys still cooling down
+        COOLDOWNS.append(self)
+
+    def last(self, key: Hashable) -> Optional[float]:
+        ts = self._cur.get(key)
+        return ts if ts is not None else self._old.get(key)
+
+    def hit(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """True (and restart the cooldown) if key is not cooling down, else False."""
+        now = time.monotonic() if now is None else now
+        if now >= self._gen_end:
+            self._rotate(now)
+        ts = self._cur.get(key)
+        if ts is None:
+            ts = self._old.get(key)
+        if ts is not None and now - ts < self.ttl:
+            self.blocked += 1
+            return False
+        self._old.pop(key, None)  # keep each key in one generation
+        self._cur[key] = now
+        self.hits += 1
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": len(self), "ttl": self.ttl, "hits": self.hits,
+                "blocked": self.blocked, "evictions": self.evictions}
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    return {c.name: c.stats() for c in COOLDOWNS}
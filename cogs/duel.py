@@ -1,28 +1,18 @@
 # cogs/duel.py
 from __future__ import annotations
-import json, random
-from pathlib import Path
-from typing import Dict, Any, List, Tuple
+import random
+from typing import Dict, Any, Sequence
 
 import discord
 from discord.ext import commands
 from carddata import ADV  # element advantages
+from . import cards_repo
+from .cards_repo import inventory, power, view
 
-CARDS_FILE = Path("data") / "cards" / "cards.json"
 ADV_MULT = 1.20     # winner element vs loser
 DISADV_MULT = 0.80  # loser vs winner
 RNG_SWAY = 0.05     # ±5% randomness
 
-def _load_cards() -> Dict[str, Any]:
-    if CARDS_FILE.exists():
-        import json
-        with open(CARDS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def _inv(data: Dict[str, Any], gid: int, uid: int) -> List[Dict[str, Any]]:
-    return data.get(str(gid), {}).get(str(uid), [])
-
 def _elem_mult(a_el: str, b_el: str) -> float:
     if b_el in ADV.get(a_el, []):
         return ADV_MULT
@@ -38,16 +28,17 @@ def _score(attacker: Dict[str, Any], defender: Dict[str, Any]) -> float:
     sway = 1.0 + random.uniform(-RNG_SWAY, RNG_SWAY)
     return base * sway
 
-def _best_card(inv: List[Dict[str, Any]]) -> Dict[str, Any]:
+def _best_card(inv: Sequence[int]) -> Dict[str, Any]:
     if not inv: return {}
-    # pick the highest simple “power”
-    return max(inv, key=lambda c: c.get("atk",0) + c.get("def",0))
+    # pick the highest simple “power” (atk + def, read off the packed ints)
+    return view(max(inv, key=power))
 
 class Duel(commands.Cog, name="Duel"):
     """Duel using card ATK/DEF and elemental advantage."""
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        cards_repo.init()  # shared with Cards; safe whichever cog loads first
 
     @commands.command(name="duel", aliases=["battle"])
     async def duel_cmd(self, ctx: commands.Context, member: discord.Member):
@@ -55,9 +46,8 @@ class Duel(commands.Cog, name="Duel"):
         if member.bot:
             return await ctx.send("Be nice. Don’t bully bots.")
 
-        data = _load_cards()
-        a = _inv(data, ctx.guild.id, ctx.author.id)
-        b = _inv(data, ctx.guild.id, member.id)
+        a = inventory(ctx.guild.id, ctx.author.id)
+        b = inventory(ctx.guild.id, member.id)
 
         if not a:
             return await ctx.send("You have no cards. Pull some first!")
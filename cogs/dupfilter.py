@@ -0,0 +1,83 @@
+# cogs/dupfilter.py
+from __future__ import annotations
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from .cooldown import Generations
+
+# Near-duplicate detection for XP farming. A message is reduced to a bottom-k
+# MinHash sketch: the K smallest hashes of its lower-cased words. The overlap
+# of two sketches estimates the Jaccard similarity of the messages' word sets
+# (exactly, for messages under K distinct words), so copy-pastes with a word
+# changed, a suffix tacked on or different case/spacing still match, while
+# different messages don't. Word features rather than character shingles keep
+# a check at a few microseconds. Each user keeps only their last KEEP sketches,
+# in generation-swapped dicts (cooldown.Generations), so memory is fixed per
+# active user and idle users are forgotten.
+
+K = 16               # hashes per sketch
+KEEP = 4             # recent sketches compared per user
+MAX_CHARS = 512      # only the head of long messages is sketched
+THRESHOLD = 0.7      # estimated Jaccard at or above this counts as a repeat
+
+Sketch = Tuple[int, ...]
+
+FILTERS: List["DupFilter"] = []
+
+
+def sketch(text: str) -> Sketch:
+    hs = set(map(hash, text[:MAX_CHARS].lower().split()))
+    return tuple(hs) if len(hs) <= K else tuple(sorted(hs)[:K])
+
+
+def similarity(a: Sketch, b: Sketch) -> float:
+    """Estimated Jaccard similarity of two sketched messages."""
+    inter = len(set(a).intersection(b))
+    union = len(a) + len(b) - inter
+    return inter / union if union else 1.0
+
+
+class DupFilter(Generations):
+    """key -> last KEEP sketches, forgotten after ttl seconds without a check."""
+    __slots__ = ("name", "threshold", "checked", "repeats")
+
+    def __init__(self, name: str, ttl: float, threshold: float = THRESHOLD):
+        super().__init__(ttl)
+        self.name = name
+        self.threshold = threshold
+        # counters
+        self.checked = 0
+        self.repeats = 0
+        FILTERS.append(self)
+
+    def repeat(self, key: Hashable, text: str, now: Optional[float] = None) -> bool:
+        """Record text for key; True if it nearly repeats one of key's recent messages."""
+        now = time.monotonic() if now is None else now
+        if now >= self._gen_end:
+            self._rotate(now)
+        self.checked += 1
+        s = sketch(text)
+        recent = self._cur.get(key)
+        if recent is None:
+            recent = self._old.pop(key, ())
+        dup = False
+        if recent:
+            ss, n, threshold = set(s), len(s), self.threshold
+            for r in recent:
+                inter = len(ss.intersection(r))
+                union = n + len(r) - inter
+                if not union or inter >= threshold * union:  # similarity() inlined
+                    dup = True
+                    break
+        self._cur[key] = (s,) + recent[:KEEP - 1]
+        if dup:
+            self.repeats += 1
+        return dup
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": len(self), "checked": self.checked, "repeats": self.repeats,
+                "evictions": self.evictions}
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    return {f.name: f.stats() for f in FILTERS}
@@ -36,6 +36,8 @@ try:
 except Exception:
     KAMI_BANK = False
 
+from cogs.persist import SCHEDULER, json_writer, mark_dirty
+
 # ---------- Version / constants ----------
 FUNPACK_VERSION = "2025-08-10"
 SHIP = "🚢"
@@ -72,8 +74,8 @@ def _load_store() -> Dict:
         return {}
 
 def _save_store(store: Dict) -> None:
-    with open(FUNPACK_DATA, "w", encoding="utf-8") as f:
-        json.dump(store, f, ensure_ascii=False, indent=2)
+    """Mark the store dirty; the flush scheduler writes it (debounced, off-loop)."""
+    mark_dirty("funpack")
 
 def _now_local() -> datetime:
     return datetime.now(TZ)
@@ -545,6 +547,8 @@ class KamiFunPack(commands.Cog, name="Kami Fun Pack"):
         self._synced = False  # global slash sync guard
         self.store = _load_store()
         self.self_trivia_sessions = {}
+        self._writer = json_writer(FUNPACK_DATA, lambda: self.store)
+        SCHEDULER.register("funpack", self._flush_store, interval_ms=1000)
 
         # bootstrap defaults
         self.store.setdefault("trivia_bank", [asdict(q) for q in DEFAULT_TRIVIA])
@@ -574,6 +578,11 @@ class KamiFunPack(commands.Cog, name="Kami Fun Pack"):
         self._weekly_loop.start()
         self._wyr_loop.start()
 
+    async def _flush_store(self) -> int:
+        before = self._writer.bytes_written
+        await self._writer.save()
+        return self._writer.bytes_written - before
+
     # ---------- global slash sync once + register persistent view ----------
     @commands.Cog.listener()
     async def on_ready(self):
@@ -0,0 +1,174 @@
+# cogs/gacha.py
+from __future__ import annotations
+import random
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+try:  # optional: bulk pulls draw everything in a handful of array ops
+    import numpy as _np
+except ImportError:
+    _np = None
+
+# Gacha draws from precomputed tables instead of re-summing the rate dict per
+# card. Pity only moves the legendary rate, and every rate is renormalised by
+# the same total, so the odds of each non-legendary rarity *given* no
+# legendary never change. A draw is therefore two steps:
+#   1. legendary iff u < LEGENDARY_P[pity]   (one table lookup per pity level;
+#      1.0 from PITY_MAX - 1 on, the guarantee)
+#   2. otherwise a Walker alias table over the other rarities (O(1) per draw)
+# followed by a uniform template from that rarity's pool and uniform atk/def
+# rolls. The pity counter is applied exactly: a bulk pull walks it from one
+# legendary to the next, so the loop runs once per legendary, not per card.
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) build, O(1) draw from a discrete distribution."""
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("alias table needs positive weights")
+        scaled = [w * n / total for w in weights]
+        self.prob = [0.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:  # leftovers are 1 up to rounding
+            self.prob[i] = 1.0
+
+    def draw(self, u: float, v: float) -> int:
+        """Outcome for two independent uniforms in [0, 1)."""
+        i = int(u * len(self.prob))
+        return i if v < self.prob[i] else self.alias[i]
+
+    def probabilities(self) -> List[float]:
+        """The distribution the table encodes (for checks)."""
+        n = len(self.prob)
+        out = [0.0] * n
+        for i, (p, a) in enumerate(zip(self.prob, self.alias)):
+            out[i] += p / n
+            out[a] += (1.0 - p) / n
+        return out
+
+
+class Sampler:
+    """Rarity/template/stat sampler for one rate table; draws packed cards (see cards_repo)."""
+
+    def __init__(self, base_rates: Mapping[str, float], legendary_rate: float, pity_max: int,
+                 pools: Mapping[str, Sequence[int]], stat_ranges: Mapping[str, Mapping[str, Tuple[int, int]]],
+                 rarities: Sequence[str]):
+        self.pity_max = pity_max
+        self.rarities = list(rarities)                   # packed rarity index order
+        self.legendary = self.rarities.index("legendary")
+        others = [r for r in self.rarities if r != "legendary" and base_rates.get(r, 0) > 0]
+        self.others = [self.rarities.index(r) for r in others]
+        self.table = AliasTable([base_rates[r] for r in others])
+        rest = sum(base_rates[r] for r in others)
+        # P(legendary | pity) with the same gentle curve as before, renormalised
+        self.legendary_p = []
+        for p in range(pity_max):
+            lr = legendary_rate + (p / pity_max) * legendary_rate
+            self.legendary_p.append(1.0 if p >= pity_max - 1 else lr / (rest + lr))
+        self.pools = [list(pools.get(r, ())) for r in self.rarities]
+        for r, pool in zip(self.rarities, self.pools):
+            if not pool and (r == "legendary" or r in others):
+                raise ValueError(f"no cards defined for rarity {r!r}")
+        default = {"atk": (100, 100), "def": (100, 100)}
+        self.atk = [stat_ranges.get(r, default)["atk"] for r in self.rarities]
+        self.de = [stat_ranges.get(r, default)["def"] for r in self.rarities]
+        self._arrays = self._build_arrays() if _np is not None else None
+
+    def _build_arrays(self) -> dict:
+        """The tables above as numpy arrays, for pull_bulk."""
+        sizes = _np.asarray([len(p) for p in self.pools], dtype=_np.int64)
+        alo, ahi = map(_np.asarray, zip(*self.atk))
+        dlo, dhi = map(_np.asarray, zip(*self.de))
+        return {
+            "legendary_p": _np.asarray(self.legendary_p),
+            "prob": _np.asarray(self.table.prob), "alias": _np.asarray(self.table.alias),
+            "others": _np.asarray(self.others, dtype=_np.int64),
+            "sizes": sizes, "offsets": _np.concatenate(([0], _np.cumsum(sizes)[:-1])),
+            "tids": _np.asarray([t for p in self.pools for t in p], dtype=_np.int64),
+            "alo": alo, "aspan": ahi - alo + 1, "dlo": dlo, "dspan": dhi - dlo + 1,
+        }
+
+    def chance(self, pity: int) -> float:
+        """Probability that the next card is legendary at this pity."""
+        return self.legendary_p[min(max(pity, 0), self.pity_max - 1)]
+
+    def _next_pity(self, pity: int, legendary: bool) -> int:
+        return 0 if legendary else min(self.pity_max, pity + 1)
+
+    # ---- one card at a time (small pulls, no numpy needed) ----
+    def pull(self, n: int, pity: int, rnd: Optional[random.Random] = None) -> Tuple[List[int], int]:
+        """n packed cards and the pity after them."""
+        if n >= BULK_MIN and _np is not None and rnd is None:
+            return self.pull_bulk(n, pity)
+        out = []
+        rand, legendary_p, top = (rnd or random).random, self.legendary_p, self.pity_max - 1
+        for _ in range(n):
+            if rand() < legendary_p[min(pity, top)]:
+                r = self.legendary
+            else:
+                r = self.others[self.table.draw(rand(), rand())]
+            pity = self._next_pity(pity, r == self.legendary)
+            out.append(self._card(r, rand))
+        return out, pity
+
+    def _card(self, r: int, rand) -> int:
+        pool = self.pools[r]
+        tid = pool[int(rand() * len(pool))]
+        (alo, ahi), (dlo, dhi) = self.atk[r], self.de[r]
+        atk = alo + int(rand() * (ahi - alo + 1))
+        de = dlo + int(rand() * (dhi - dlo + 1))
+        return (tid << 36) | (r << 32) | (atk << 16) | de
+
+    # ---- bulk: every draw of a large pull in a few array ops ----
+    def legendary_mask(self, u: "_np.ndarray", pity: int) -> Tuple["_np.ndarray", int]:
+        """Which of the uniforms u are legendaries, walking pity exactly."""
+        lp = self._arrays["legendary_p"]
+        n, top = len(u), self.pity_max - 1
+        hit = _np.zeros(n, dtype=bool)
+        i = 0
+        while i < n:
+            # the next legendary is at most top - pity draws away (the guarantee)
+            m = min(n - i, top - min(pity, top) + 1)
+            j = _np.flatnonzero(u[i:i + m] < lp[_np.minimum(pity + _np.arange(m), top)])
+            if not len(j):
+                pity = min(self.pity_max, pity + m)
+                break
+            i += int(j[0])
+            hit[i] = True
+            pity = 0
+            i += 1
+        return hit, pity
+
+    def pull_bulk(self, n: int, pity: int, rng: Optional["_np.random.Generator"] = None) -> Tuple[List[int], int]:
+        if _np is None:
+            return self.pull(n, pity)
+        packed, pity = self.draw_bulk(n, pity, rng)
+        return packed.tolist(), pity
+
+    def draw_bulk(self, n: int, pity: int, rng: Optional["_np.random.Generator"] = None) -> Tuple["_np.ndarray", int]:
+        """pull_bulk as an int64 array (needs numpy); the simulator reads it directly."""
+        rng, t = rng or _RNG, self._arrays
+        u = rng.random((6, n))
+        hit, pity = self.legendary_mask(u[0], pity)
+        col = (u[1] * len(t["prob"])).astype(_np.int64)
+        pick = _np.where(u[2] < t["prob"][col], col, t["alias"][col])
+        r = _np.where(hit, self.legendary, t["others"][pick])
+        tid = t["tids"][t["offsets"][r] + (u[3] * t["sizes"][r]).astype(_np.int64)]
+        atk = t["alo"][r] + (u[4] * t["aspan"][r]).astype(_np.int64)
+        de = t["dlo"][r] + (u[5] * t["dspan"][r]).astype(_np.int64)
+        return (tid << 36) | (r << 32) | (atk << 16) | de, pity
+
+
+BULK_MIN = 20  # pulls at least this big take the numpy path when numpy is installed
+_RNG = _np.random.default_rng() if _np is not None else None
@@ -8,8 +8,9 @@ from discord.ext import commands
 
 from .bank import (
     set_path as bank_set_path,
-    bank_load, bank_save,
+    bank_load,
     get_balance, add_balance,
+    transaction, InsufficientFunds,
 )
 
 KAMICOIN_NAME = "KamiCoins"
@@ -55,19 +56,23 @@ def _user_add(ctx: commands.Context, delta: int, uid: Optional[int] = None) -> i
     return add_balance(ctx.guild.id, uid or ctx.author.id, delta)
 
 # === Casino-style settlement ===
-# Place bet: move bet from user -> house.
-def _take_bet(ctx: commands.Context, bet: int) -> None:
-    _user_add(ctx, -bet)
-    _house_add(ctx, +bet)
+# Each settlement is one bank transaction: both legs land together, and the
+# funds check happens under the guild's lock.
+# Place bet: move bet from user -> house. False if the user can't cover it.
+async def _take_bet(ctx: commands.Context, bet: int) -> bool:
+    try:
+        async with transaction(ctx.guild.id) as tx:
+            tx.add(ctx.author.id, -bet)
+            tx.add(BANKER_UID, +bet)
+    except InsufficientFunds:
+        return False
+    return True
 
 # Pay total to user (includes returning the stake):
-def _payout_total(ctx: commands.Context, total: int) -> int:
-    _house_add(ctx, -total)
-    return _user_add(ctx, +total)
-
-def _save_silent():
-    try: bank_save()
-    except Exception: pass
+async def _payout_total(ctx: commands.Context, total: int) -> int:
+    async with transaction(ctx.guild.id) as tx:
+        tx.add(BANKER_UID, -total)
+        return tx.add(ctx.author.id, +total)
 
 
 # =================== Blackjack engine ===================
@@ -201,11 +206,12 @@ class Gamble(commands.Cog, name="Gamble"):
                 return await ctx.send("Pick **heads** or **tails** (or omit to just flip).")
             user_pick = "heads" if g.startswith("h") else "tails"
 
-        _take_bet(ctx, bet)
+        if not await _take_bet(ctx, bet):
+            return await ctx.send(f"Not enough funds. Balance: {_fmt(_user_bal(ctx))}.")
         outcome = random.choice(("heads", "tails"))
 
         if user_pick and user_pick == outcome:
-            new_bal = _payout_total(ctx, bet * 2)
+            new_bal = await _payout_total(ctx, bet * 2)
             msg = f"🪙 **{outcome}**! You won **{_fmt(bet)}**. Balance: **{_fmt(new_bal)}**."
         else:
             new_bal = _user_bal(ctx)
@@ -214,7 +220,6 @@ class Gamble(commands.Cog, name="Gamble"):
                   (f"🪙 It’s **{outcome}**. No call, no payout. Balance: **{_fmt(new_bal)}**.")
         msg += f"\n🏯 Kami Bank: **{_fmt(_house_bal(ctx))}**."
         await ctx.send(msg)
-        _save_silent()
 
     # ---------- DICE ----------
     @commands.command(
@@ -240,19 +245,19 @@ class Gamble(commands.Cog, name="Gamble"):
                 return await ctx.send("Guess **1-6**, or **high**/**low**.")
             exact, mult = n, 5.0
 
-        _take_bet(ctx, bet)
+        if not await _take_bet(ctx, bet):
+            return await ctx.send(f"Not enough funds. Balance: {_fmt(_user_bal(ctx))}.")
         roll = random.randint(1, 6)
         win = (roll == exact) if exact else ((roll >= 4) if g.startswith("h") else (roll <= 3))
 
         if win:
             total = int(bet * mult)
-            new_bal = _payout_total(ctx, total)
+            new_bal = await _payout_total(ctx, total)
             await ctx.send(f"🎲 **{roll}** — WIN! +{_fmt(total - bet)} (payout {mult:g}×). "
                            f"Bal: **{_fmt(new_bal)}** | 🏯 **{_fmt(_house_bal(ctx))}**.")
         else:
             await ctx.send(f"🎲 **{roll}** — lost **{_fmt(bet)}**. Bal: **{_fmt(_user_bal(ctx))}** | "
                            f"🏯 **{_fmt(_house_bal(ctx))}**.")
-        _save_silent()
 
     # ---------- SLOTS ----------
     @commands.command(
@@ -268,7 +273,8 @@ class Gamble(commands.Cog, name="Gamble"):
         if bet < MIN_BET: return await ctx.send(f"Bet must be ≥ {MIN_BET}. Balance: {_fmt(bal)}.")
         if bet > bal:     return await ctx.send(f"Not enough funds. Balance: {_fmt(bal)}.")
 
-        _take_bet(ctx, bet)
+        if not await _take_bet(ctx, bet):
+            return await ctx.send(f"Not enough funds. Balance: {_fmt(_user_bal(ctx))}.")
         icons = ["🍒","🍋","🔔","⭐","7️⃣","🍀"]
         r = [random.choice(icons) for _ in range(3)]
         a, b, c = r
@@ -279,13 +285,12 @@ class Gamble(commands.Cog, name="Gamble"):
 
         if mult:
             total = bet * mult
-            new_bal = _payout_total(ctx, total)
+            new_bal = await _payout_total(ctx, total)
             await ctx.send(f"🎰 {' '.join(r)} — **WIN {mult}×** (+{_fmt(total - bet)}). "
                            f"Bal: **{_fmt(new_bal)}** | 🏯 **{_fmt(_house_bal(ctx))}**.")
         else:
             await ctx.send(f"🎰 {' '.join(r)} — lost **{_fmt(bet)}**. Bal: **{_fmt(_user_bal(ctx))}** | "
                            f"🏯 **{_fmt(_house_bal(ctx))}**.")
-        _save_silent()
 
     # ---------- BACCARAT ----------
     @commands.command(
@@ -308,7 +313,8 @@ class Gamble(commands.Cog, name="Gamble"):
             return await ctx.send("Pick **player**, **banker**, or **tie**.")
         s = {"p":"player","b":"banker","t":"tie"}.get(s, s)
 
-        _take_bet(ctx, bet)
+        if not await _take_bet(ctx, bet):
+            return await ctx.send(f"Not enough funds. Balance: {_fmt(_user_bal(ctx))}.")
 
         pool = []
         for name, w in BACCARAT_WEIGHTS.items():
@@ -318,16 +324,16 @@ class Gamble(commands.Cog, name="Gamble"):
         if s == outcome:
             if outcome == "player":
                 total = bet * 2
-                new_bal = _payout_total(ctx, total)
+                new_bal = await _payout_total(ctx, total)
                 note = f"You won **{_fmt(bet)}**."
             elif outcome == "banker":
                 win_net = math.floor(bet * 0.95)     # net
                 total = bet + win_net
-                new_bal = _payout_total(ctx, total)
+                new_bal = await _payout_total(ctx, total)
                 note = f"You won **{_fmt(win_net)}** after 5% commission."
             else:  # tie
                 total = bet * 9
-                new_bal = _payout_total(ctx, total)
+                new_bal = await _payout_total(ctx, total)
                 note = f"You won **{_fmt(bet * 8)}** (8:1)."
         else:
             new_bal = _user_bal(ctx)
@@ -338,7 +344,6 @@ class Gamble(commands.Cog, name="Gamble"):
                f"{note} Your balance: **{_fmt(new_bal)}**.\n"
                f"🏯 **Kami Bank**: **{_fmt(_house_bal(ctx))}**.")
         await ctx.send(msg)
-        _save_silent()
 
     # ---------- VIDEO POKER (Jacks-or-Better) ----------
     @commands.command(
@@ -357,7 +362,8 @@ class Gamble(commands.Cog, name="Gamble"):
         if bet < MIN_BET: return await ctx.send(f"Bet must be ≥ {MIN_BET}. Balance: {_fmt(bal)}.")
         if bet > bal:     return await ctx.send(f"Not enough funds. Balance: {_fmt(bal)}.")
 
-        _take_bet(ctx, bet)
+        if not await _take_bet(ctx, bet):
+            return await ctx.send(f"Not enough funds. Balance: {_fmt(_user_bal(ctx))}.")
 
         ranks = "23456789TJQKA"
         suits = "♠♥♦♣"
@@ -368,14 +374,13 @@ class Gamble(commands.Cog, name="Gamble"):
         mult, name = _evaluate_video_poker(hand, ranks)
         if mult >= 1:
             total = bet * (mult + 1)  # return stake + net
-            new_bal = _payout_total(ctx, total)
+            new_bal = await _payout_total(ctx, total)
             await ctx.send(f"🃏 **{' '.join(hand)}** — {name}! Payout {mult+1}× "
                            f"(+{_fmt(bet*mult)}). Bal: **{_fmt(new_bal)}** | "
                            f"🏯 **{_fmt(_house_bal(ctx))}**.")
         else:
             await ctx.send(f"🃏 **{' '.join(hand)}** — no hand. Lost **{_fmt(bet)}**. "
                            f"Bal: **{_fmt(_user_bal(ctx))}** | 🏯 **{_fmt(_house_bal(ctx))}**.")
-        _save_silent()
 
     # ---------- ROULETTE ----------
     @commands.command(
@@ -405,7 +410,8 @@ class Gamble(commands.Cog, name="Gamble"):
             except Exception:
                 return await ctx.send("Bet **red/black/odd/even** or a **number 0–36**.")
 
-        _take_bet(ctx, bet)
+        if not await _take_bet(ctx, bet):
+            return await ctx.send(f"Not enough funds. Balance: {_fmt(_user_bal(ctx))}.")
 
         number = random.randint(0, 36)
         red_nums = {1,3,5,7,9,12,14,16,18,19,21,23,25,27,30,32,34,36}
@@ -424,7 +430,7 @@ class Gamble(commands.Cog, name="Gamble"):
                 win = True; total = bet * 2
 
         if win:
-            new_bal = _payout_total(ctx, total)
+            new_bal = await _payout_total(ctx, total)
             await ctx.send(f"🎡 **{number} {color}** — WIN! "
                            f"{'number' if num_choice is not None else kind} pays "
                            f"{(36 if num_choice is not None else 2)}×. "
@@ -432,7 +438,6 @@ class Gamble(commands.Cog, name="Gamble"):
         else:
             await ctx.send(f"🎡 **{number} {color}** — lost **{_fmt(bet)}**. "
                            f"Bal: **{_fmt(_user_bal(ctx))}** | 🏯 **{_fmt(_house_bal(ctx))}**.")
-        _save_silent()
 
     # ---------------- BLACKJACK ----------------
     @commands.group(
@@ -456,7 +461,8 @@ class Gamble(commands.Cog, name="Gamble"):
         if bet < MIN_BET: return await ctx.send(f"Bet must be ≥ {MIN_BET}. Balance: {_fmt(bal)}.")
         if bet > bal:     return await ctx.send(f"Not enough funds. Balance: {_fmt(bal)}.")
 
-        _take_bet(ctx, bet)
+        if not await _take_bet(ctx, bet):
+            return await ctx.send(f"Not enough funds. Balance: {_fmt(_user_bal(ctx))}.")
         game = BJGame(ctx.guild.id, ctx.channel.id, ctx.author.id, bet)
         game.deal_initial()
         self._bj_games[key] = game
@@ -477,7 +483,6 @@ class Gamble(commands.Cog, name="Gamble"):
             return
         msg += "Type **`!hit`**, **`!stand`**, or **`!double`**. ⏳"
         await ctx.send(msg)
-        _save_silent()
 
     @commands.command(name="hit")
     async def bj_hit(self, ctx: commands.Context):
@@ -496,11 +501,9 @@ class Gamble(commands.Cog, name="Gamble"):
             game.active = False
             await ctx.send(f"🃏 You drew **{c}** → **{_fmt_cards(game.player)}** (**{total}**) — **BUST**.\n"
                            f"🏯 Kami Bank: **{_fmt(_house_bal(ctx))}**.")
-            _save_silent()
             return
         await ctx.send(f"🃏 Hit: drew **{c}** → **{_fmt_cards(game.player)}** (**{total}**). "
                        f"Type **`!hit`** or **`!stand`**.")
-        _save_silent()
 
     @commands.command(name="stand")
     async def bj_stand(self, ctx: commands.Context):
@@ -528,7 +531,8 @@ class Gamble(commands.Cog, name="Gamble"):
             return await ctx.send("Not enough balance to double your bet.")
 
         # take additional bet
-        _take_bet(ctx, game.bet)
+        if not await _take_bet(ctx, game.bet):
+            return await ctx.send("Not enough balance to double your bet.")
         game.bet *= 2
         game.doubled = True
 
@@ -538,7 +542,6 @@ class Gamble(commands.Cog, name="Gamble"):
             game.active = False
             await ctx.send(f"🃏 Double-down drew **{c}** → **{_fmt_cards(game.player)}** (**{total}**) — **BUST**.\n"
                            f"🏯 Kami Bank: **{_fmt(_house_bal(ctx))}**.")
-            _save_silent()
             return
         # Forced stand after double
         await self._bj_finish(ctx, game, from_double=True)
@@ -615,7 +618,7 @@ class Gamble(commands.Cog, name="Gamble"):
                 result = "**Push** — stake returned."
 
         if total_pay:
-            new_bal = _payout_total(ctx, total_pay)
+            new_bal = await _payout_total(ctx, total_pay)
         else:
             new_bal = _user_bal(ctx)
 
@@ -625,7 +628,6 @@ class Gamble(commands.Cog, name="Gamble"):
             f"{result}  |  Bet: **{_fmt(game.bet)}**\n"
             f"**Balance:** {_fmt(new_bal)}   •   🏯 **Kami Bank:** {_fmt(_house_bal(ctx))}"
         )
-        _save_silent()
 
     # ---------- HOUSE ----------
     @commands.command(name="banker", aliases=["kamibank","house"])
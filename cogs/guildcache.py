@@ -0,0 +1,121 @@
+# cogs/guildcache.py
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Per-guild state is loaded from its own shard file on first access and
+# evicted (flushed, then dropped) once the guild has been idle for IDLE_SEC or
+# the resident caches hold more than MAX_ROWS user rows. Startup reads nothing,
+# and RSS follows the active guilds rather than every guild the bot is in.
+
+IDLE_SEC = 30 * 60      # evict guilds untouched for this long
+MAX_ROWS = 500_000      # resident user rows across one cache before LRU eviction
+
+CACHES: List["GuildCache"] = []
+
+
+class GuildCache:
+    """gid -> state, in LRU order. load(gid) builds the state from disk;
+    flush(gid, state) persists it before eviction."""
+
+    def __init__(self, name: str, load: Callable[[int], Any],
+                 flush: Callable[[int, Any], Awaitable[None]]):
+        self.name = name
+        self.load = load
+        self.flush = flush
+        self.idle_sec = IDLE_SEC
+        self.max_rows = MAX_ROWS
+        self._live: "OrderedDict[int, Any]" = OrderedDict()  # least recently used first
+        self._seen: Dict[int, float] = {}
+        self._evicting: Dict[int, Any] = {}                   # being flushed; still readable
+        # counters
+        self.loads = 0
+        self.evictions = 0
+        CACHES.append(self)
+
+    def __contains__(self, gid: int) -> bool:
+        return gid in self._live
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def get(self, gid: int) -> Any:
+        """State for gid, loading it on first access."""
+        st = self._live.get(gid)
+        if st is None:
+            st = self._evicting.get(gid)
+            if st is None:
+                st = self.load(gid)
+                self.loads += 1
+            self._live[gid] = st
+        else:
+            self._live.move_to_end(gid)
+        self._seen[gid] = time.monotonic()
+        return st
+
+    def peek(self, gid: int) -> Optional[Any]:
+        """Resident (or evicting) state without loading or touching LRU order."""
+        st = self._live.get(gid)
+        return st if st is not None else self._evicting.get(gid)
+
+    def items(self):
+        return list(self._live.items())
+
+    def clear(self) -> None:
+        self._live.clear()
+        self._seen.clear()
+
+    def rows(self) -> int:
+        return sum(len(st) for st in self._live.values())
+
+    async def sweep(self) -> int:
+        """Flush + drop idle guilds, then LRU guilds while over max_rows."""
+        now = time.monotonic()
+        victims = []
+        for gid in self._live:  # LRU order, so stop at the first recently used guild
+            if now - self._seen.get(gid, 0.0) < self.idle_sec:
+                break
+            victims.append(gid)
+        rows = self.rows()
+        if rows > self.max_rows:
+            for gid, st in self._live.items():
+                if rows <= self.max_rows:
+                    break
+                if gid not in victims:
+                    victims.append(gid)
+                rows -= len(st)
+
+        n = 0
+        for gid in victims:
+            st = self._live.pop(gid, None)
+            if st is None:
+                continue
+            self._seen.pop(gid, None)
+            self._evicting[gid] = st
+            try:
+                await self.flush(gid, st)
+                n += 1
+            except Exception as e:
+                print(f"[guildcache] {self.name} evict {gid} failed: {e!r}")
+                self._live.setdefault(gid, st)  # keep it; retry next sweep
+                self._seen.setdefault(gid, time.monotonic())
+            finally:
+                self._evicting.pop(gid, None)
+        self.evictions += n
+        return n
+
+
+def configure(*, idle_sec: Optional[float] = None, max_rows: Optional[int] = None) -> None:
+    """Set eviction limits for all caches (existing and future)."""
+    global IDLE_SEC, MAX_ROWS
+    if idle_sec is not None:
+        IDLE_SEC = idle_sec
+    if max_rows is not None:
+        MAX_ROWS = max_rows
+    for c in CACHES:
+        c.idle_sec, c.max_rows = IDLE_SEC, MAX_ROWS
+
+
+async def sweep_all() -> int:
+    return sum([await c.sweep() for c in CACHES])
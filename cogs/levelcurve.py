@@ -0,0 +1,131 @@
+# cogs/levelcurve.py
+from __future__ import annotations
+import math
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+try:  # optional: batch lookups become one searchsorted() call
+    import numpy as _np
+except ImportError:
+    _np = None
+
+# A level curve is a step cost per level: step(n) is the XP needed to go from
+# level n-1 to level n. starts[L] (cumulative) is the total XP at which level L
+# begins, so a lookup is one bisect instead of a walk over every level.
+# Formula curves extend their table on demand up to MAX_LEVEL; table curves
+# repeat their last step past the end of the table.
+
+MAX_LEVEL = 100_000
+_PRECOMPUTE = 1_000
+_MAX_XP = 1 << 62
+
+
+class LevelCurve:
+    __slots__ = ("spec", "starts")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = dict(spec)
+        kind = self.spec.get("kind")
+        if kind == "quadratic":
+            a, b, c = (int(self.spec[k]) for k in ("a", "b", "c"))
+            if a < 0 or b < 0 or c <= 0:
+                raise ValueError("quadratic curve needs a, b >= 0 and c > 0")
+        elif kind == "exponential":
+            growth = float(self.spec["growth"])
+            if int(self.spec["base"]) <= 0 or not math.isfinite(growth) or growth < 1.0:
+                raise ValueError("exponential curve needs base > 0 and a finite growth >= 1")
+        elif kind == "table":
+            steps = [int(x) for x in self.spec["steps"]]
+            if not steps or min(steps) <= 0:
+                raise ValueError("table curve needs at least one positive step")
+            self.spec["steps"] = steps
+        else:
+            raise ValueError(f"unknown curve kind {kind!r}")
+        self.starts = array("q", [0])
+        self._extend(_PRECOMPUTE)
+
+    def step(self, n: int) -> int:
+        """XP needed to go from level n-1 to level n (n >= 1)."""
+        s = self.spec
+        kind = s["kind"]
+        if kind == "quadratic":
+            return int(s["a"]) * n * n + int(s["b"]) * n + int(s["c"])
+        if kind == "exponential":
+            try:
+                cost = int(s["base"]) * float(s["growth"]) ** (n - 1)
+            except OverflowError:  # beyond any total a level can start at
+                return _MAX_XP + 1
+            return max(1, int(min(cost, _MAX_XP + 1)))
+        steps = s["steps"]
+        return steps[min(n, len(steps)) - 1]
+
+    def _extend(self, levels: int) -> bool:
+        """Grow starts up to `levels`; False once nothing more can be added."""
+        starts = self.starts
+        before = len(starts)
+        levels = min(levels, MAX_LEVEL)
+        total = starts[-1]
+        for n in range(before, levels + 1):
+            total += self.step(n)
+            if total > _MAX_XP:  # steep curves stop where int64 would overflow
+                break
+            starts.append(total)
+        return len(starts) > before
+
+    def _cover(self, xp: int) -> None:
+        while xp >= self.starts[-1] and self._extend(2 * len(self.starts)):
+            pass
+
+    def level(self, xp: int) -> Tuple[int, int, int]:
+        """(level, xp_into_level, needed_for_next) for a total, by bisect."""
+        xp = max(0, int(xp))
+        if xp >= self.starts[-1]:
+            self._cover(xp)
+        starts = self.starts
+        lvl = bisect_right(starts, xp) - 1
+        if lvl + 1 >= len(starts):  # at MAX_LEVEL
+            return lvl, xp - starts[lvl], self.step(lvl + 1)
+        return lvl, xp - starts[lvl], starts[lvl + 1] - starts[lvl]
+
+    def levels(self, totals: Sequence[int]) -> List[int]:
+        """Levels for many totals in one call."""
+        if not len(totals):
+            return []
+        self._cover(max(totals))
+        if _np is not None:
+            idx = _np.searchsorted(_np.frombuffer(self.starts, dtype=_np.int64),
+                                   _np.asarray(totals, dtype=_np.int64), side="right")
+            return (idx - 1).tolist()
+        starts = self.starts
+        return [bisect_right(starts, t) - 1 for t in totals]
+
+    def total_for(self, level: int) -> int:
+        """Total XP at which level begins (the curve's last level if beyond it)."""
+        level = max(0, int(level))
+        if level >= len(self.starts):
+            self._extend(level)
+        return self.starts[min(level, len(self.starts) - 1)]
+
+    def describe(self) -> str:
+        s = self.spec
+        if s["kind"] == "quadratic":
+            return f"quadratic {s['a']}·n² + {s['b']}·n + {s['c']}"
+        if s["kind"] == "exponential":
+            return f"exponential {s['base']} × {s['growth']}^(n-1)"
+        steps = s["steps"]
+        shown = ", ".join(map(str, steps[:8])) + (", …" if len(steps) > 8 else "")
+        return f"table [{shown}] (last step repeats)"
+
+
+def parse_spec(kind: str, args: Iterable[str]) -> Dict[str, Any]:
+    """Build a curve spec from command words, e.g. ("quadratic", ["5", "50", "100"])."""
+    args = [a.strip(",") for a in args]
+    kind = kind.lower()
+    if kind == "quadratic" and len(args) == 3:
+        return {"kind": kind, "a": int(args[0]), "b": int(args[1]), "c": int(args[2])}
+    if kind == "exponential" and len(args) == 2:
+        return {"kind": kind, "base": int(args[0]), "growth": float(args[1])}
+    if kind == "table" and args:
+        return {"kind": kind, "steps": [int(x) for a in args for x in a.split(",") if x]}
+    raise ValueError("use `quadratic <a> <b> <c>`, `exponential <base> <growth>` or `table <step> <step> ...`")
@@ -0,0 +1,71 @@
+# cogs/pager.py
+from __future__ import annotations
+from typing import Callable, Optional, Tuple, Union
+
+import discord
+from discord.ext import commands
+
+# ◀/▶ paging shared by the leaderboards, !inv and the catalog. A command
+# renders its first page itself, then hands the same render function to a
+# Pager; each click renders one more page on demand, so nothing is built for
+# pages nobody opens.
+
+PAGE_TIMEOUT = 180  # seconds the ◀/▶ buttons stay live
+
+# render(page) -> (text, page clamped, pages or None while the end isn't known)
+Render = Callable[[int], Tuple[str, int, Optional[int]]]
+
+
+class Pager(discord.ui.View):
+    """◀/▶ buttons over render(page); only the member who ran the command turns pages."""
+    def __init__(self, render: Render, page: int, pages: Optional[int], author_id: int):
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.render = render
+        self.page = page
+        self.author_id = author_id
+        self.message: Optional[discord.Message] = None  # set by the sender to grey the buttons out on timeout
+        self._sync(pages)
+
+    def _sync(self, pages: Optional[int]):
+        self.prev_btn.disabled = self.page <= 1
+        self.next_btn.disabled = pages is not None and self.page >= pages
+
+    async def interaction_check(self, i: discord.Interaction) -> bool:
+        if i.user and i.user.id == self.author_id:
+            return True
+        await i.response.send_message("Only the member who ran the command can turn these pages.", ephemeral=True)
+        return False
+
+    async def on_timeout(self):
+        self.prev_btn.disabled = self.next_btn.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+    async def _turn(self, i: discord.Interaction, step: int):
+        text, self.page, pages = self.render(self.page + step)
+        self._sync(pages)
+        await i.response.edit_message(content=text, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_btn(self, i: discord.Interaction, b: discord.ui.Button):
+        await self._turn(i, -1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_btn(self, i: discord.Interaction, b: discord.ui.Button):
+        await self._turn(i, +1)
+
+
+async def send_paged(dest: Union[commands.Context, discord.Interaction], text: str, view: Optional[Pager]) -> None:
+    """Send text with view to a command's channel or as an interaction's response,
+    remembering the message so on_timeout can grey the buttons out. A slash
+    response returns no message, so it is fetched back with original_response()."""
+    if isinstance(dest, discord.Interaction):
+        await dest.response.send_message(text, view=view)
+        msg = await dest.original_response() if view is not None else None
+    else:
+        msg = await dest.send(text, view=view)
+    if view is not None:
+        view.message = msg
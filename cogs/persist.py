@@ -0,0 +1,300 @@
+# cogs/persist.py
+from __future__ import annotations
+import asyncio, json, os, time
+from collections import deque
+from itertools import islice
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional
+
+# Shared save pipeline for the JSON stores (bank, XP, cards, funpack):
+#   1. prepare() runs on the event loop and takes a cheap snapshot
+#   2. write(snapshot) runs in a worker thread (serialize + fsync + replace)
+# Save requests that arrive while a write is in flight coalesce into a single
+# follow-up write, so a burst of N requests costs at most two writes.
+#
+# One json.dumps() call holds the GIL for its whole run, so a big store is
+# encoded in chunks of CHUNK_ITEMS entries to let the loop thread run between them.
+# Files are written compact (no indent); that alone is ~3x cheaper to encode.
+
+CHUNK_ITEMS = 2048
+_ENC = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+def _has_nested(obj: Any) -> bool:
+    # the large maps in our stores are homogeneous, so only small ones get a full check
+    vals = obj.values() if isinstance(obj, dict) else obj
+    if len(obj) <= 64:
+        return any(isinstance(v, (dict, list)) for v in vals)
+    return isinstance(next(iter(vals)), (dict, list))
+
+def snapshot(data: Any) -> Any:
+    """Copy JSON containers down to flat maps/lists, which are copied in C."""
+    if isinstance(data, dict):
+        if data and _has_nested(data):
+            return {k: snapshot(v) for k, v in data.items()}
+        return data.copy()
+    if isinstance(data, list):
+        if data and _has_nested(data):
+            return [snapshot(v) for v in data]
+        return data.copy()
+    return data
+
+def _iter_json(obj: Any) -> Iterator[str]:
+    """Compact JSON for obj, as chunks of at most CHUNK_ITEMS entries each."""
+    if isinstance(obj, dict) and obj and (len(obj) > CHUNK_ITEMS or _has_nested(obj)):
+        yield "{"
+        if _has_nested(obj):
+            for i, (k, v) in enumerate(obj.items()):
+                yield ("," if i else "") + _ENC.encode(str(k)) + ":"
+                yield from _iter_json(v)
+        else:
+            it, first = iter(obj.items()), True
+            while True:
+                part = dict(islice(it, CHUNK_ITEMS))
+                if not part:
+                    break
+                yield ("" if first else ",") + _ENC.encode(part)[1:-1]
+                first = False
+        yield "}"
+    elif isinstance(obj, list) and obj and (len(obj) > CHUNK_ITEMS or _has_nested(obj)):
+        yield "["
+        if _has_nested(obj):
+            for i, v in enumerate(obj):
+                if i:
+                    yield ","
+                yield from _iter_json(v)
+        else:
+            for i in range(0, len(obj), CHUNK_ITEMS):
+                yield ("," if i else "") + _ENC.encode(obj[i:i + CHUNK_ITEMS])[1:-1]
+        yield "]"
+    else:
+        yield _ENC.encode(obj)
+
+def write_json_atomic(path: str, data: Any) -> int:
+    """Serialize (chunked), fsync and atomically replace path; returns bytes written."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    n = 0
+    with open(tmp, "wb") as f:
+        for chunk in _iter_json(data):
+            b = chunk.encode("utf-8")
+            f.write(b)
+            n += len(b)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return n
+
+
+class OffloopWriter:
+    """Snapshot on the loop, write in a thread; concurrent saves share one write.
+
+    prepare() may hand its state over (e.g. clear a dirty set); on_failed(payload)
+    runs on the loop when the write raises, so it can take the state back.
+    """
+
+    def __init__(self, name: str, prepare: Callable[[], Any], write: Callable[[Any], int],
+                 on_written: Optional[Callable[[], None]] = None,
+                 on_failed: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.prepare = prepare
+        self.write = write
+        self.on_written = on_written
+        self.on_failed = on_failed
+        self._task: Optional[asyncio.Task] = None
+        self._again = False
+        # counters
+        self.writes = 0
+        self.coalesced = 0
+        self.bytes_written = 0
+
+    async def _run(self) -> None:
+        while True:
+            self._again = False
+            payload = self.prepare()
+            try:
+                n = await asyncio.to_thread(self.write, payload)
+            except BaseException:
+                if self.on_failed:
+                    self.on_failed(payload)
+                raise
+            self.writes += 1
+            self.bytes_written += int(n or 0)
+            if self.on_written:
+                self.on_written()
+            if not self._again:
+                return
+
+    async def save(self) -> None:
+        """Save the current state; returns once a write covering it has finished."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        else:
+            self._again = True  # the running loop picks up a fresh snapshot after this write
+            self.coalesced += 1
+        await asyncio.shield(self._task)
+
+    def save_sync(self) -> None:
+        """Blocking save for startup/shutdown paths."""
+        payload = self.prepare()
+        try:
+            n = self.write(payload)
+        except BaseException:
+            if self.on_failed:
+                self.on_failed(payload)
+            raise
+        self.writes += 1
+        self.bytes_written += int(n or 0)
+        if self.on_written:
+            self.on_written()
+
+
+def json_writer(path: str, source: Callable[[], Any]) -> OffloopWriter:
+    """OffloopWriter for a whole-file JSON store; source() returns the live object."""
+    return OffloopWriter(
+        path,
+        prepare=lambda: snapshot(source()),
+        write=lambda data: write_json_atomic(path, data),
+    )
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag: how late a periodic sleep wakes up."""
+
+    def __init__(self, interval: float = 0.05, window: int = 1200):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=window)  # seconds late per wakeup
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - t0 - self.interval))
+
+    def stats(self) -> Dict[str, float]:
+        """p50/p99/max lag in milliseconds over the sample window."""
+        if not self.samples:
+            return {"p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "samples": 0}
+        s = sorted(self.samples)
+        pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] * 1000.0
+        return {"p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": s[-1] * 1000.0, "samples": len(s)}
+
+
+# ---------- dirty tracking + debounced flushes ----------
+class _Store:
+    __slots__ = ("name", "flush", "interval", "dirty", "running", "last", "timer",
+                 "requested", "coalesced", "flushes", "bytes_written")
+
+    def __init__(self, name: str, flush: Callable[[], Awaitable[Optional[int]]], interval: float):
+        self.name = name
+        self.flush = flush
+        self.interval = interval
+        self.dirty = False
+        self.running = False
+        self.last = 0.0                      # monotonic time the last flush started
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.requested = 0                   # mark_dirty() calls
+        self.coalesced = 0                   # ...that landed on an already-dirty store
+        self.flushes = 0
+        self.bytes_written = 0
+
+
+class FlushScheduler:
+    """Stores call mark_dirty() on mutation; each dirty store is flushed at most
+    once per interval, clean stores are never written, flush_all() runs on shutdown."""
+
+    def __init__(self):
+        self._stores: Dict[str, _Store] = {}
+
+    def register(self, name: str, flush: Callable[[], Awaitable[Optional[int]]], *,
+                 interval_ms: int = 1000) -> None:
+        """flush() persists the store and returns the bytes it wrote (or None)."""
+        old = self._stores.get(name)
+        st = _Store(name, flush, interval_ms / 1000.0)
+        if old is not None:  # re-registered (cog reload): keep the pending state
+            st.dirty, st.requested, st.coalesced = old.dirty, old.requested, old.coalesced
+            st.flushes, st.bytes_written = old.flushes, old.bytes_written
+            if old.timer is not None:
+                old.timer.cancel()
+        self._stores[name] = st
+        if st.dirty:
+            self._schedule(st)
+
+    def mark_dirty(self, name: str) -> None:
+        st = self._stores.get(name)
+        if st is None:
+            return
+        st.requested += 1
+        if st.dirty:
+            st.coalesced += 1
+        else:
+            st.dirty = True
+        if st.timer is None and not st.running:
+            self._schedule(st)
+
+    def _schedule(self, st: _Store) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop yet; the next mark_dirty() or flush_all() picks it up
+        delay = max(0.0, st.last + st.interval - time.monotonic())
+        st.timer = loop.call_later(delay, lambda: loop.create_task(self._run(st)))
+
+    async def _run(self, st: _Store) -> None:
+        st.timer = None
+        if st.running or not st.dirty:
+            return
+        st.dirty = False
+        st.running = True
+        st.last = time.monotonic()
+        try:
+            n = await st.flush()
+            st.flushes += 1
+            st.bytes_written += int(n or 0)
+        except Exception as e:
+            st.dirty = True
+            print(f"[flush] {st.name} failed: {e!r}")
+        finally:
+            st.running = False
+        if st.dirty and st.timer is None:
+            self._schedule(st)  # mutated while we were writing
+
+    async def flush(self, name: str) -> None:
+        """Flush one store now if it is dirty."""
+        st = self._stores.get(name)
+        if st is None:
+            return
+        if st.timer is not None:
+            st.timer.cancel()
+            st.timer = None
+        while st.running:
+            await asyncio.sleep(0.01)
+        await self._run(st)
+
+    async def flush_all(self) -> None:
+        for name in list(self._stores):
+            await self.flush(name)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            st.name: {
+                "dirty": int(st.dirty),
+                "requested": st.requested,
+                "coalesced": st.coalesced,
+                "flushes": st.flushes,
+                "bytes_written": st.bytes_written,
+            }
+            for st in self._stores.values()
+        }
+
+
+SCHEDULER = FlushScheduler()
+mark_dirty = SCHEDULER.mark_dirty
@@ -0,0 +1,146 @@
+# cogs/ranking.py
+from __future__ import annotations
+from bisect import bisect_left, insort
+from typing import Iterable, List, Tuple
+
+# Order-statistics index for leaderboards. Entries are single ints that sort
+# best-first: key(score, uid) = (-score << 64) | uid, so equal scores fall back
+# to uid order and no tuples are allocated. The keys live in sorted buckets of
+# at most 2 * LOAD; a Fenwick tree over the bucket sizes turns "position of key"
+# and "key at position" into O(log n) lookups, so neither ever rescans a guild.
+
+BULK_REINDEX = 1024  # bulk updates larger than this drop an index instead of moving each key
+
+_UID_BITS = 64
+_UID_MASK = (1 << _UID_BITS) - 1
+
+
+def key(score: int, uid: int) -> int:
+    return (-int(score) << _UID_BITS) | int(uid)
+
+
+def unkey(k: int) -> Tuple[int, int]:
+    """(uid, score) for an index key."""
+    return k & _UID_MASK, -(k >> _UID_BITS)
+
+
+class RankIndex:
+    """Sorted multiset of int keys with positional access."""
+    LOAD = 512
+    __slots__ = ("_lists", "_maxes", "_tree", "_len")
+
+    def __init__(self, keys: Iterable[int] = ()):
+        ks = sorted(keys)
+        self._lists: List[List[int]] = [ks[i:i + self.LOAD] for i in range(0, len(ks), self.LOAD)]
+        self._maxes = [lst[-1] for lst in self._lists]
+        self._len = len(ks)
+        self._build()
+
+    def __len__(self) -> int:
+        return self._len
+
+    # ---- Fenwick tree over bucket sizes ----
+    def _build(self) -> None:
+        tree = [len(lst) for lst in self._lists]
+        for i in range(len(tree)):
+            j = i | (i + 1)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _bump(self, i: int, delta: int) -> None:
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i |= i + 1
+
+    def _prefix(self, i: int) -> int:
+        """Total size of buckets [0, i)."""
+        s, tree = 0, self._tree
+        while i > 0:
+            s += tree[i - 1]
+            i &= i - 1
+        return s
+
+    def _locate(self, pos: int) -> Tuple[int, int]:
+        """(bucket, offset) of the key at position pos."""
+        tree, i = self._tree, 0
+        step = 1 << (len(tree).bit_length() - 1) if tree else 0
+        while step:
+            j = i + step
+            if j <= len(tree) and tree[j - 1] <= pos:
+                pos -= tree[j - 1]
+                i = j
+            step >>= 1
+        return i, pos
+
+    # ---- mutation ----
+    def add(self, k: int) -> None:
+        if not self._lists:
+            self._lists, self._maxes, self._tree = [[k]], [k], [1]
+            self._len = 1
+            return
+        i = bisect_left(self._maxes, k)
+        if i == len(self._lists):
+            i -= 1
+        lst = self._lists[i]
+        insort(lst, k)
+        self._maxes[i] = lst[-1]
+        self._len += 1
+        if len(lst) > 2 * self.LOAD:
+            self._lists[i:i + 1] = [lst[:self.LOAD], lst[self.LOAD:]]
+            self._maxes[i:i + 1] = [lst[self.LOAD - 1], lst[-1]]
+            self._build()
+        else:
+            self._bump(i, 1)
+
+    def remove(self, k: int) -> None:
+        i = bisect_left(self._maxes, k)
+        lst = self._lists[i] if i < len(self._lists) else None
+        j = bisect_left(lst, k) if lst else 0
+        if not lst or j == len(lst) or lst[j] != k:
+            raise ValueError(f"{k} not in index")
+        del lst[j]
+        self._len -= 1
+        if lst:
+            self._maxes[i] = lst[-1]
+            self._bump(i, -1)
+        else:
+            del self._lists[i], self._maxes[i]
+            self._build()
+
+    def replace(self, old: int, new: int) -> None:
+        if old != new:
+            self.remove(old)
+            self.add(new)
+
+    # ---- queries ----
+    def index(self, k: int) -> int:
+        """Number of keys sorting before k (0-based rank of k if present)."""
+        i = bisect_left(self._maxes, k)
+        if i == len(self._lists):
+            return self._len
+        return self._prefix(i) + bisect_left(self._lists[i], k)
+
+    def __contains__(self, k: int) -> bool:
+        i = bisect_left(self._maxes, k)
+        if i == len(self._lists):
+            return False
+        lst = self._lists[i]
+        j = bisect_left(lst, k)
+        return j < len(lst) and lst[j] == k
+
+    def slice(self, start: int, stop: int) -> List[int]:
+        """Keys at positions [start, stop)."""
+        start, stop = max(0, start), min(stop, self._len)
+        if start >= stop:
+            return []
+        i, j = self._locate(start)
+        out: List[int] = []
+        need = stop - start
+        while need > 0:
+            part = self._lists[i][j:j + need]
+            out.extend(part)
+            need -= len(part)
+            i, j = i + 1, 0
+        return out
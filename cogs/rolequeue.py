@@ -0,0 +1,125 @@
+# cogs/rolequeue.py
+from __future__ import annotations
+import asyncio, time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import discord
+
+# Role grants (XP level rewards) go through one worker instead of a burst of
+# add_roles() calls. Grants for the same member coalesce into one request, and
+# each guild is paced to GRANT_PER_SEC calls so a mass !xpadd or airdrop drains
+# steadily instead of tripping Discord's rate limits. A 429 that still gets
+# through backs that guild off and requeues the grant.
+
+GRANT_PER_SEC = 2.0     # add_roles() calls per guild per second
+RETRY_BACKOFF = 5.0     # seconds a guild waits after a 429, times the attempt number
+MAX_TRIES = 3
+
+
+class RoleGrantQueue:
+    """gid -> {uid: role ids} in FIFO order, drained round-robin across guilds."""
+
+    def __init__(self, per_sec: float = GRANT_PER_SEC):
+        self.interval = 1.0 / per_sec
+        self._guilds: Dict[int, "OrderedDict[int, Set[int]]"] = {}
+        self._next_at: Dict[int, float] = {}             # gid -> earliest next call
+        self._tries: Dict[Tuple[int, int], int] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # counters
+        self.queued = 0
+        self.coalesced = 0
+        self.granted = 0
+        self.retried = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._guilds.values())
+
+    def put(self, gid: int, uid: int, role_ids: Iterable[int]) -> None:
+        q = self._guilds.get(gid)
+        if q is None:
+            q = self._guilds[gid] = OrderedDict()
+        roles = q.get(uid)
+        if roles is None:
+            q[uid] = set(role_ids)
+        else:
+            roles.update(role_ids)
+            self.coalesced += 1
+        self.queued += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self, bot: discord.Client) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._wake.set()
+            self._task = asyncio.get_running_loop().create_task(self._run(bot))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _ready(self, now: float) -> Tuple[Optional[int], Optional[float]]:
+        """A guild allowed to call now, else (None, seconds until one is)."""
+        wait = None
+        for gid in self._guilds:
+            t = self._next_at.get(gid, 0.0)
+            if t <= now:
+                return gid, None
+            wait = t - now if wait is None else min(wait, t - now)
+        return None, wait
+
+    async def _run(self, bot: discord.Client) -> None:
+        while True:
+            gid, wait = self._ready(time.monotonic())
+            if gid is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            q = self._guilds[gid]
+            uid, roles = q.popitem(last=False)
+            if not q:
+                del self._guilds[gid]
+            self._next_at[gid] = time.monotonic() + self.interval
+            try:
+                await self._grant(bot, gid, uid, roles)
+            except Exception as e:
+                self.failed += 1
+                print(f"[roles] grant to {uid} in {gid} failed: {e!r}")
+
+    async def _grant(self, bot: discord.Client, gid: int, uid: int, roles: Set[int]) -> None:
+        guild = bot.get_guild(gid)
+        member = guild.get_member(uid) if guild else None
+        if member is None:
+            return
+        have = {r.id for r in member.roles}
+        add = [r for r in (guild.get_role(rid) for rid in roles if rid not in have) if r is not None]
+        if not add:
+            return
+        try:
+            await member.add_roles(*add, reason="XP level reward")
+        except discord.HTTPException as e:
+            tries = self._tries.get((gid, uid), 0) + 1
+            if e.status != 429 or tries >= MAX_TRIES:
+                self._tries.pop((gid, uid), None)
+                raise
+            self._tries[(gid, uid)] = tries
+            self._next_at[gid] = time.monotonic() + RETRY_BACKOFF * tries
+            self.retried += 1
+            self.put(gid, uid, roles)
+            return
+        self._tries.pop((gid, uid), None)
+        self.granted += len(add)
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self), "queued": self.queued, "coalesced": self.coalesced,
+                "granted": self.granted, "retried": self.retried, "failed": self.failed}
+
+
+ROLE_QUEUE = RoleGrantQueue()
@@ -0,0 +1,131 @@
+# cogs/windows.py
+from __future__ import annotations
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .ranking import RankIndex, key as rank_key, unkey as rank_unkey
+
+# Rolling "this week / this month" counters. XP earned is added to today's
+# bucket in a ring of one dict per UTC day (uid -> xp); each window keeps a
+# running per-user total over its last N days. When the day rolls over, the
+# bucket that just left a window is subtracted from that window's totals, and
+# the bucket leaving the longest window is dropped, so only the last
+# max(windows) days of activity are ever held. A credit is a few dict bumps
+# plus, once a board has been queried, one move in that window's RankIndex.
+
+DAY = 86_400
+WINDOWS = {"week": 7, "month": 30}
+
+
+def today() -> int:
+    return int(time.time() // DAY)
+
+
+class RollingBoards:
+    __slots__ = ("windows", "span", "ring", "day", "totals", "ranks")
+
+    def __init__(self, windows: Dict[str, int] = WINDOWS, day: Optional[int] = None):
+        self.windows = dict(windows)
+        self.span = max(self.windows.values())
+        self.ring: List[Dict[int, int]] = [{} for _ in range(self.span)]  # ring[d % span] = day d
+        self.day = today() if day is None else day
+        self.totals: Dict[str, Dict[int, int]] = {w: {} for w in self.windows}
+        self.ranks: Dict[str, Optional[RankIndex]] = {w: None for w in self.windows}
+
+    # ---- time ----
+    def advance(self, day: Optional[int] = None) -> None:
+        """Roll forward to day, expiring buckets as they leave each window."""
+        day = today() if day is None else day
+        if day <= self.day:
+            return
+        if day - self.day >= self.span:  # idle longer than the longest window
+            self.ring = [{} for _ in range(self.span)]
+            for w in self.windows:
+                self.totals[w] = {}
+                self.ranks[w] = None
+            self.day = day
+            return
+        while self.day < day:
+            self.day += 1
+            for w, n in self.windows.items():
+                self._expire(w, self.ring[(self.day - n) % self.span])
+            self.ring[self.day % self.span] = {}  # the day that left the longest window
+
+    def _expire(self, w: str, bucket: Dict[int, int]) -> None:
+        totals, rank = self.totals[w], self.ranks[w]
+        for uid, v in bucket.items():
+            old = totals.get(uid, 0)
+            new = old - v
+            if new > 0:
+                totals[uid] = new
+            else:
+                totals.pop(uid, None)
+            if rank is not None:
+                rank.remove(rank_key(old, uid))
+                if new > 0:
+                    rank.add(rank_key(new, uid))
+
+    # ---- updates ----
+    def add(self, uid: int, amount: int) -> None:
+        if amount <= 0:
+            return
+        if today() != self.day:
+            self.advance()
+        b = self.ring[self.day % self.span]
+        b[uid] = b.get(uid, 0) + amount
+        for w, totals in self.totals.items():
+            old = totals.get(uid, 0)
+            totals[uid] = old + amount
+            rank = self.ranks[w]
+            if rank is not None:
+                if old:
+                    rank.replace(rank_key(old, uid), rank_key(old + amount, uid))
+                else:
+                    rank.add(rank_key(amount, uid))
+
+    # ---- queries ----
+    def _rank(self, w: str) -> RankIndex:
+        self.advance()
+        if self.ranks[w] is None:
+            self.ranks[w] = RankIndex(rank_key(v, u) for u, v in self.totals[w].items())
+        return self.ranks[w]
+
+    def top(self, w: str, start: int = 0, count: int = 10) -> List[Tuple[int, int]]:
+        return [rank_unkey(k) for k in self._rank(w).slice(start, start + count)]
+
+    def rank_of(self, w: str, uid: int) -> Optional[int]:
+        v = self.value(w, uid)
+        return self._rank(w).index(rank_key(v, uid)) + 1 if v else None
+
+    def value(self, w: str, uid: int) -> int:
+        self.advance()
+        return self.totals[w].get(uid, 0)
+
+    def count(self, w: str) -> int:
+        self.advance()
+        return len(self.totals[w])
+
+    # ---- persistence ----
+    def snapshot(self) -> Dict[str, Dict[int, int]]:
+        """Buckets by day; past days are never mutated again, so only today's is copied."""
+        out = {}
+        for d in range(self.day - self.span + 1, self.day + 1):
+            b = self.ring[d % self.span]
+            if b:
+                out[str(d)] = dict(b) if d == self.day else b
+        return out
+
+    @classmethod
+    def from_json(cls, days: Dict[str, Dict[str, int]], windows: Dict[str, int] = WINDOWS) -> "RollingBoards":
+        rb = cls(windows)
+        for d, bucket in sorted(((int(d), b) for d, b in days.items()), reverse=True):
+            age = rb.day - d
+            if age < 0 or age >= rb.span:
+                continue
+            b = rb.ring[d % rb.span] = {int(u): int(v) for u, v in bucket.items()}
+            for w, n in rb.windows.items():
+                if age < n:
+                    totals = rb.totals[w]
+                    for uid, v in b.items():
+                        totals[uid] = totals.get(uid, 0) + v
+        return rb
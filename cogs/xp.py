@@ -1,78 +1,597 @@
 # cogs/xp.py
 from __future__ import annotations
 import json, os, time, random
-from typing import Dict, Any, Tuple
+from array import array
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
 
 import discord
 from discord.ext import commands, tasks
 
+from .columns import SlotTable, Snapshot, checked
+from .cooldown import Cooldown
+from .dupfilter import DupFilter
+from .guildcache import GuildCache
+from .levelcurve import LevelCurve, parse_spec
+from .pager import Pager, send_paged
+from .ranking import BULK_REINDEX, RankIndex, key as rank_key, unkey as rank_unkey
+from .rolequeue import ROLE_QUEUE
+from .windows import WINDOWS, RollingBoards
+from .persist import SCHEDULER, OffloopWriter, mark_dirty, write_json_atomic
+
 # ---------- config ----------
 XP_FILE = "xp.json"
 
 MSG_XP_RANGE = (15, 25)     # per message, on cooldown
 MSG_COOLDOWN = 60           # seconds per-user
+DUP_MEMORY_SEC = 15 * 60    # how long a user's recent messages are remembered for the repeat check
 
 REACT_XP = 5                # when someone reacts (cooldown’d)
 REACT_COOLDOWN = 30         # seconds per-user
 
 VOICE_XP_PER_MIN = 5        # per active minute
-VOICE_TICK_SEC = 60         # how often to credit ongoing sessions
+VOICE_RECONCILE_MIN = 10    # how often open sessions are checked against live voice state
+
+FLUSH_INTERVAL_MS = 5000    # at most one write of the changed xp shards per 5s
+
+XPTOP_PAGE = 10             # leaderboard rows per page
+
+LEVELUP_DISPATCH_SEC = 2    # how often level-ups are turned into announcements + role grants
+ANNOUNCE_MAX_NAMES = 10     # names per announcement; the rest are summarised
+
+# leveling curve: XP needed to go from L -> L+1 (mild quadratic; tweak as you like).
+# Guilds can swap in their own curve with !xpcurve; see levelcurve.py.
+DEFAULT_CURVE = LevelCurve({"kind": "quadratic", "a": 5, "b": 50, "c": 100})
 
-# leveling curve: XP needed to go from L -> L+1
 def xp_needed_for(level: int) -> int:
-    # mild quadratic; tweak as you like
-    return 5 * level * level + 50 * level + 100
+    return DEFAULT_CURVE.step(level)
 
 # ---------- storage ----------
-DATA: Dict[str, Any] = {"guilds": {}}          # persisted
-_msg_cd: Dict[Tuple[int, int], float] = {}     # (gid, uid) -> last msg ts
-_react_cd: Dict[Tuple[int, int], float] = {}   # (gid, uid) -> last reaction ts
-_voice_join: Dict[Tuple[int, int], float] = {} # (gid, uid) -> joined ts (active session)
-
-def _g(gid: int) -> Dict[str, Any]:
-    g = DATA["guilds"].setdefault(str(gid), {})
-    g.setdefault("users", {})
-    return g
-
-def _u(gid: int, uid: int) -> Dict[str, Any]:
-    users = _g(gid)["users"]
-    return users.setdefault(str(uid), {"xp": 0})
+# One shard per guild under "<xp path without .json>/": <gid>.json holds
+# {"users": {"<uid>": {"xp": n}}}; in memory each guild is an XPTable (int uid ->
+# slot, array('q') xp column). Guilds load on first access and are written back
+# and dropped once idle (see guildcache.py); a flush rewrites only the guilds
+# that changed since the last one.
+#
+# Next to the persisted xp column each table caches every user's level and the
+# total at which their next level starts (lvl/next, memory only), so a credit
+# detects a level-up with one comparison; they are rebuilt in one batch on load
+# and whenever the guild's curve changes.
+class XPTable(SlotTable):
+    COLUMNS = (("xp", 0),)
+    __slots__ = ("xp", "gid", "curve", "rank", "lvl", "next", "rewards", "announce", "boards")
+
+    def __init__(self, gid: int = 0):
+        super().__init__()
+        self.gid = gid
+        self.curve: Optional[LevelCurve] = None  # None -> DEFAULT_CURVE
+        self.rank: Optional[RankIndex] = None    # built by the first leaderboard query
+        self.lvl = array("i")                    # cached level per slot
+        self.next = array("q")                   # total xp where lvl + 1 starts (0: recheck on next credit)
+        self.rewards: Dict[int, int] = {}        # level -> role id granted on reaching it
+        self.announce: Optional[int] = None      # level-up announcement channel id
+        self.boards = RollingBoards()            # week/month activity (see windows.py)
+
+    def slot(self, uid: int) -> int:
+        i = self.index.get(uid)
+        if i is None:
+            i = super().slot(uid)
+            self.lvl.append(0)
+            self.next.append(0)
+            if self.rank is not None:
+                self.rank.add(rank_key(0, uid))
+        return i
+
+    def relevel(self) -> None:
+        """Recompute the level cache for every row (load, curve change)."""
+        curve = self.curve or DEFAULT_CURVE
+        lv = curve.levels(self.xp)  # also extends curve.starts past the highest total
+        starts, top = curve.starts, len(curve.starts) - 1
+        self.lvl = array("i", lv)
+        self.next = array("q", (starts[l + 1] if l < top else _NO_NEXT for l in lv))
+
+    def meta(self) -> Dict[str, Any]:
+        """Per-guild settings persisted next to the users."""
+        out: Dict[str, Any] = {}
+        if self.curve:
+            out["curve"] = self.curve.spec
+        if self.rewards:
+            out["rewards"] = {str(lvl): rid for lvl, rid in sorted(self.rewards.items())}
+        if self.announce:
+            out["announce"] = self.announce
+        days = self.boards.snapshot()
+        if days:
+            out["days"] = days
+        return out
+
+_XP_PATH = XP_FILE
+_DIRTY: Set[int] = set()                       # guilds changed since their last write
+_msg_cd = Cooldown("xp messages", MSG_COOLDOWN)     # (gid, uid), forgotten after the cooldown
+_react_cd = Cooldown("xp reactions", REACT_COOLDOWN)
+_msg_dup = DupFilter("xp repeats", DUP_MEMORY_SEC)  # copy-pasted messages earn nothing
+
+# Message/reaction XP lands here first: gid -> {uid: xp not yet folded}. The
+# listeners only bump an int; the deltas are folded into the guild tables on
+# the next flush, or first thing when a read or an absolute write needs them.
+_PENDING: Dict[int, Dict[int, int]] = {}
+
+# Level-ups found by _set_xp as (gid, uid, old level, new level); the cog drains
+# them into announcements and role grants.
+_LEVELUPS: List[Tuple[int, int, int, int]] = []
+_NO_NEXT = 1 << 62
+
+# Voice sessions: gid -> {uid: credited-until ts}. Voice XP is settled lazily
+# from these marks (on leave, on !level/!rank/!xptop and when the guild is
+# flushed) rather than by a per-minute sweep; only whole minutes are credited
+# and the remainder carries over. The marks persist in <xp dir>/voice.json so
+# open sessions survive a restart. A leave event can be missed (a gateway
+# reconnect, a dropped event), so the reconciler checks every open session
+# against live voice state each VOICE_RECONCILE_MIN and closes the ones that
+# are gone, crediting them only up to its previous check rather than the
+# whole gap.
+_VOICE: Dict[int, Dict[int, float]] = {}
+_VOICE_DIRTY = False
+_VOICE_AT = 0.0                              # when the restored marks were last written
+_VOICE_CHECKED = 0.0                         # when the reconciler last saw open sessions in live voice
+_UNVERIFIED: Set[Tuple[int, int]] = set()    # restored sessions not yet seen in live voice state
+
+def _shard(gid: int) -> str:
+    return os.path.join(os.path.splitext(_XP_PATH)[0], f"{gid}.json")
+
+def _voice_path() -> str:
+    return os.path.join(os.path.splitext(_XP_PATH)[0], "voice.json")
+
+def _guild_from_json(gid: int, gd: Dict[str, Any]) -> XPTable:
+    t = XPTable(gid)
+    for uid, u in (gd.get("users") or {}).items():
+        t.xp[t.slot(int(uid))] = int(u.get("xp", 0))
+    if gd.get("curve"):
+        try:
+            t.curve = LevelCurve(gd["curve"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"[xp] ignoring bad level curve {gd['curve']!r}: {e!r}")
+    t.rewards = {int(lvl): int(rid) for lvl, rid in (gd.get("rewards") or {}).items()}
+    t.announce = int(gd["announce"]) if gd.get("announce") else None
+    if gd.get("days"):
+        t.boards = RollingBoards.from_json(gd["days"])
+    t.relevel()
+    return t
+
+def _guild_json(snap: Snapshot, meta: Dict[str, Any]) -> Dict[str, Any]:
+    uids, cols = snap
+    xp = cols["xp"]
+    out: Dict[str, Any] = {"users": {str(u): {"xp": xp[i]} for i, u in enumerate(uids)}}
+    out.update(meta)
+    return out
+
+def _load_guild(gid: int) -> XPTable:
+    path = _shard(gid)
+    if not os.path.exists(path):
+        return XPTable(gid)
+    with open(path, "r", encoding="utf-8") as f:
+        return _guild_from_json(gid, json.load(f))
+
+_Job = Tuple[Dict[int, Tuple[Snapshot, Dict[str, Any]]], Optional[Dict[str, Any]]]
+
+def _prepare() -> _Job:
+    global _VOICE_DIRTY
+    snaps = {}
+    for gid in _DIRTY:
+        g = GUILDS.peek(gid)
+        if g is not None:
+            snaps[gid] = g.snapshot(), g.meta()  # column memcpy
+    _DIRTY.clear()
+    voice = None
+    if _VOICE_DIRTY:
+        voice = {"at": time.time(),
+                 "sessions": {str(gid): {str(u): ts for u, ts in s.items()} for gid, s in _VOICE.items()}}
+        _VOICE_DIRTY = False
+    return snaps, voice
+
+def _write(job: _Job) -> int:
+    snaps, voice = job
+    n = sum(write_json_atomic(_shard(gid), _guild_json(*s)) for gid, s in snaps.items())  # JSON built off-loop
+    if voice is not None:
+        n += write_json_atomic(_voice_path(), voice)
+    return n
+
+def _unwritten(job: _Job) -> None:
+    """The write failed: the guilds (and voice marks) are still dirty."""
+    global _VOICE_DIRTY
+    snaps, voice = job
+    _DIRTY.update(snaps)
+    if voice is not None:
+        _VOICE_DIRTY = True
+
+_WRITER = OffloopWriter("xp", _prepare, _write, on_failed=_unwritten)
+
+async def _evict_guild(gid: int, g: XPTable) -> None:
+    if gid in _DIRTY:
+        await _WRITER.save()  # the same writer as flushes, so shard writes never race
+
+GUILDS = GuildCache("xp", _load_guild, _evict_guild)  # gid -> XPTable
+
+def _migrate_legacy(path: str) -> None:
+    """Split a single-file xp.json into per-guild shards (once)."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    guilds = raw.get("guilds") or {}
+    for gid, gd in guilds.items():
+        write_json_atomic(_shard(int(gid)), {"users": gd.get("users") or {}})
+    os.replace(path, path + ".migrated")
+    print(f"[xp] split {path} into {len(guilds)} guild shards")
 
 def xp_load(path: str = XP_FILE) -> None:
-    global DATA
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            DATA = json.load(f)
-    else:
-        DATA = {"guilds": {}}
-        xp_save(path)
+    """Point the store at path; guilds themselves load on first access."""
+    global _XP_PATH
+    _XP_PATH = path
+    os.makedirs(os.path.splitext(path)[0], exist_ok=True)
+    _migrate_legacy(path)
+    GUILDS.clear()
+    _DIRTY.clear()
+    _load_voice()
+
+def _load_voice() -> None:
+    """Restore open voice sessions; the reconciler checks them once the bot is ready."""
+    global _VOICE_AT, _VOICE_DIRTY
+    _VOICE.clear()
+    _UNVERIFIED.clear()
+    _VOICE_DIRTY = False
+    try:
+        with open(_voice_path(), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        print(f"[xp] ignoring unreadable voice sessions: {e!r}")
+        return
+    _VOICE_AT = float(raw.get("at", 0.0))
+    for gid, sessions in (raw.get("sessions") or {}).items():
+        if sessions:
+            _VOICE[int(gid)] = {int(u): float(ts) for u, ts in sessions.items()}
+            _UNVERIFIED.update((int(gid), int(u)) for u in sessions)
+
+def xp_save() -> None:
+    """Blocking write of every changed guild (startup/shutdown)."""
+    _fold_all()
+    _settle_dirty_voice()
+    _WRITER.save_sync()
+
+async def xp_save_async() -> int:
+    """Snapshot changed guilds on the loop, write them from a worker thread (saves coalesce)."""
+    _fold_all()
+    _settle_dirty_voice()
+    before = _WRITER.bytes_written
+    await _WRITER.save()
+    return _WRITER.bytes_written - before
+
+# buffered xp
+def buffer_xp(gid: int, uid: int, amount: int) -> None:
+    """add_xp() for the listener hot path: one int bump, folded in later."""
+    buf = _PENDING.get(gid)
+    if buf is None:
+        buf = _PENDING[gid] = {}
+    buf[uid] = buf.get(uid, 0) + amount
+    mark_dirty("xp")
+
+def _fold(gid: int) -> XPTable:
+    """The guild's table with its buffered deltas applied. A delta the table
+    refuses is logged and dropped on its own; the rest of the buffer still lands."""
+    g = GUILDS.get(gid)
+    buf = _PENDING.pop(gid, None)
+    if buf:
+        xp, slot, boards = g.xp, g.slot, g.boards
+        for uid, amount in buf.items():
+            try:
+                i = slot(uid)
+                _set_xp(g, i, uid, max(0, xp[i] + amount))
+            except ValueError as e:
+                print(f"[xp] dropped {amount} buffered xp for {uid} in {gid}: {e}")
+                continue
+            boards.add(uid, amount)
+        _DIRTY.add(gid)
+    return g
 
-def xp_save(path: str = XP_FILE) -> None:
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(DATA, f, indent=2)
+def _fold_all() -> None:
+    """Fold every buffered guild; one that fails stays buffered and the rest still fold."""
+    for gid in list(_PENDING):
+        try:
+            _fold(gid)
+        except Exception as e:
+            print(f"[xp] could not fold buffered xp for {gid}: {e!r}")
+
+def pending_xp() -> int:
+    """Users with buffered XP not yet folded (for stats)."""
+    return sum(len(b) for b in _PENDING.values())
 
 # helpers
 def total_xp(gid: int, uid: int) -> int:
-    return int(_u(gid, uid)["xp"])
+    g = _fold(gid)
+    i = g.find(uid)
+    return g.xp[i] if i >= 0 else 0
+
+def _rank_index(g: XPTable) -> RankIndex:
+    if g.rank is None:
+        g.rank = RankIndex(rank_key(x, u) for u, x in zip(g.uids, g.xp))
+    return g.rank
+
+def _set_xp(g: XPTable, i: int, uid: int, new: int) -> None:
+    """Write one total and keep the leaderboard index and level cache in step.
+    The column is stored first, so a value it refuses never reaches the index."""
+    new = checked(new, "Total XP")
+    old = g.xp[i]
+    g.xp[i] = new
+    if g.rank is not None:
+        g.rank.replace(rank_key(old, uid), rank_key(new, uid))
+    if new >= g.next[i] or new < old:  # crossed a boundary (or lost xp): look the level up
+        _relevel(g, i, uid, new)
+
+def _relevel(g: XPTable, i: int, uid: int, total: int) -> None:
+    curve = g.curve or DEFAULT_CURVE
+    lvl = curve.level(total)[0]
+    before = g.lvl[i]
+    g.lvl[i] = lvl
+    nxt = curve.total_for(lvl + 1)
+    g.next[i] = nxt if nxt > total else _NO_NEXT  # at the curve's last level
+    if lvl > before:
+        _LEVELUPS.append((g.gid, uid, before, lvl))
 
 def set_total_xp(gid: int, uid: int, value: int) -> int:
-    _u(gid, uid)["xp"] = max(0, int(value))
-    return _u(gid, uid)["xp"]
+    new = checked(max(0, int(value)), "Total XP")
+    g = _fold(gid)
+    _set_xp(g, g.slot(uid), uid, new)
+    _DIRTY.add(gid)
+    mark_dirty("xp")
+    return new
 
 def add_xp(gid: int, uid: int, amount: int) -> int:
-    return set_total_xp(gid, uid, total_xp(gid, uid) + int(amount))
+    g = _fold(gid)
+    i = g.find(uid)
+    new = checked(max(0, (g.xp[i] if i >= 0 else 0) + int(amount)), "Total XP")  # before a slot is claimed
+    _set_xp(g, g.slot(uid), uid, new)
+    _DIRTY.add(gid)
+    mark_dirty("xp")
+    return new
+
+def add_xp_many(gid: int, uids: Iterable[int], amount: int) -> int:
+    """add_xp() for many users in one pass with one dirty mark; returns users changed.
+    Every new total is range-checked before any is applied (OutOfRange)."""
+    uids = list(dict.fromkeys(int(u) for u in uids))
+    amount = checked(amount, "An amount")
+    if not uids or not amount:
+        return 0
+    g = _fold(gid)
+    find, xp = g.find, g.xp
+    for uid in uids:
+        i = find(uid)
+        checked(max(0, (xp[i] if i >= 0 else 0) + amount), "Total XP")
+    if g.rank is not None and len(uids) > BULK_REINDEX:
+        g.rank = None  # cheaper to rebuild on the next leaderboard query than to move each key
+    slot = g.slot
+    for uid in uids:
+        i = slot(uid)
+        _set_xp(g, i, uid, max(0, xp[i] + amount))
+    _DIRTY.add(gid)
+    mark_dirty("xp")
+    return len(uids)
+
+# voice
+def _credit_voice(gid: int, uid: int, now: float) -> int:
+    """Credit uid's whole voice minutes up to now and advance the mark; returns xp added."""
+    global _VOICE_DIRTY
+    mark = _VOICE.get(gid, {}).get(uid)
+    minutes = int((now - mark) // 60) if mark is not None else 0
+    if minutes <= 0:
+        return 0
+    _VOICE[gid][uid] = mark + minutes * 60
+    _VOICE_DIRTY = True
+    g = GUILDS.get(gid)
+    i = g.slot(uid)
+    _set_xp(g, i, uid, g.xp[i] + minutes * VOICE_XP_PER_MIN)
+    g.boards.add(uid, minutes * VOICE_XP_PER_MIN)
+    _DIRTY.add(gid)
+    return minutes * VOICE_XP_PER_MIN
+
+def _close_restored(gid: int, uid: int) -> None:
+    """A session restored from disk: credit it only up to when it was last written."""
+    _UNVERIFIED.discard((gid, uid))
+    _credit_voice(gid, uid, _VOICE_AT)
+
+def _settle_dirty_voice() -> None:
+    """Fold open sessions into guilds that are about to be written anyway."""
+    now = time.time()
+    for gid in _DIRTY & _VOICE.keys():
+        for uid in list(_VOICE[gid]):
+            if (gid, uid) not in _UNVERIFIED:
+                _credit_voice(gid, uid, now)
+
+def voice_join(gid: int, uid: int, now: Optional[float] = None) -> None:
+    global _VOICE_DIRTY
+    if (gid, uid) in _UNVERIFIED:  # left while the bot was down; this is a new session
+        _close_restored(gid, uid)
+    elif uid in _VOICE.get(gid, ()):
+        return
+    _VOICE.setdefault(gid, {})[uid] = time.time() if now is None else now
+    _VOICE_DIRTY = True
+    mark_dirty("xp")
+
+def voice_leave(gid: int, uid: int, now: Optional[float] = None) -> int:
+    """Close uid's session, crediting its whole minutes; returns xp added."""
+    global _VOICE_DIRTY
+    if uid not in _VOICE.get(gid, ()):
+        return 0
+    if (gid, uid) in _UNVERIFIED:
+        _close_restored(gid, uid)
+        added = 0
+    else:
+        added = _credit_voice(gid, uid, time.time() if now is None else now)
+    del _VOICE[gid][uid]
+    if not _VOICE[gid]:
+        del _VOICE[gid]
+    _VOICE_DIRTY = True
+    mark_dirty("xp")
+    return added
+
+def settle_voice(gid: int, uid: Optional[int] = None) -> int:
+    """Credit open sessions (one user, or the whole guild) before reading XP."""
+    sessions = _VOICE.get(gid)
+    if not sessions:
+        return 0
+    now = time.time()
+    uids = [uid] if uid is not None else list(sessions)
+    added = sum(_credit_voice(gid, u, now) for u in uids if (gid, u) not in _UNVERIFIED)
+    if added:
+        mark_dirty("xp")
+    return added
+
+def reconcile_voice(bot: commands.Bot, *, scan: bool = False) -> int:
+    """Check open sessions against live voice state; returns sessions opened or closed.
+
+    Restored sessions whose member is no longer in voice are credited up to
+    the last write and closed; those still in voice carry on. Live sessions
+    whose member has left without a leave event are closed with credit only
+    up to the previous check. With scan=True, members already in voice when
+    the bot came up get a session too.
+    """
+    global _VOICE_DIRTY, _VOICE_CHECKED
+    changed = 0
+    now = time.time()
+    for gid in list(_VOICE):
+        guild = bot.get_guild(gid)
+        if guild is None:
+            continue
+        for uid in list(_VOICE[gid]):
+            if (gid, uid) in _UNVERIFIED:
+                continue  # restored from disk: handled below
+            m = guild.get_member(uid)
+            if m is None or not (m.voice and m.voice.channel):  # its leave event never arrived
+                voice_leave(gid, uid, _VOICE_CHECKED)
+                changed += 1
+    _VOICE_CHECKED = now
+    for gid, uid in list(_UNVERIFIED):
+        guild = bot.get_guild(gid)
+        if guild is None:
+            continue  # not available yet; next run
+        m = guild.get_member(uid)
+        if m is not None and m.voice and m.voice.channel:
+            _UNVERIFIED.discard((gid, uid))
+            _credit_voice(gid, uid, _VOICE_AT)
+            _VOICE[gid][uid] = max(_VOICE[gid][uid], time.time())  # downtime is not voice time
+            _VOICE_DIRTY = True
+        else:
+            voice_leave(gid, uid)
+            changed += 1
+    if scan:
+        for guild in bot.guilds:
+            for ch in (*guild.voice_channels, *guild.stage_channels):
+                for m in ch.members:
+                    if m.id not in _VOICE.get(guild.id, ()):
+                        voice_join(guild.id, m.id, now)
+                        changed += 1
+    if changed or _VOICE_DIRTY:
+        mark_dirty("xp")
+    return changed
+
+# leaderboard
+def xp_top(gid: int, start: int = 0, count: int = 10) -> List[Tuple[int, int]]:
+    """(uid, total xp) for ranks start+1 .. start+count."""
+    return [rank_unkey(k) for k in _rank_index(_fold(gid)).slice(start, start + count)]
+
+def xp_rank(gid: int, uid: int) -> Optional[int]:
+    """1-based XP rank of uid, or None if the user has no XP row."""
+    g = _fold(gid)
+    i = g.find(uid)
+    return _rank_index(g).index(rank_key(g.xp[i], uid)) + 1 if i >= 0 else None
+
+def xp_ranked_count(gid: int) -> int:
+    return len(_rank_index(_fold(gid)))
+
+# rolling boards: XP earned from activity (messages, reactions, voice) in the
+# last WINDOWS[period] days; admin grants and airdrops don't count
+def window_top(gid: int, period: str, start: int = 0, count: int = 10) -> List[Tuple[int, int]]:
+    return _fold(gid).boards.top(period, start, count)
+
+def window_rank(gid: int, period: str, uid: int) -> Optional[int]:
+    return _fold(gid).boards.rank_of(period, uid)
+
+def window_xp(gid: int, period: str, uid: int) -> int:
+    return _fold(gid).boards.value(period, uid)
+
+def window_count(gid: int, period: str) -> int:
+    return _fold(gid).boards.count(period)
 
 def level_from_total(xp: int) -> Tuple[int, int, int]:
-    """returns (level, xp_into_level, needed_for_next)"""
-    level = 0
-    rem = xp
-    while True:
-        need = xp_needed_for(level + 1)
-        if rem < need:
-            return level, rem, need
-        rem -= need
-        level += 1
+    """returns (level, xp_into_level, needed_for_next) on the default curve"""
+    return DEFAULT_CURVE.level(xp)
+
+def curve_for(gid: int) -> LevelCurve:
+    return GUILDS.get(gid).curve or DEFAULT_CURVE
+
+def set_curve(gid: int, spec: Optional[Dict[str, Any]]) -> LevelCurve:
+    """Give a guild its own curve (None restores the default); raises ValueError on a bad spec."""
+    g = GUILDS.get(gid)
+    g.curve = LevelCurve(spec) if spec else None
+    g.relevel()  # levels move with the curve; no level-up events for that
+    _DIRTY.add(gid)
+    mark_dirty("xp")
+    return g.curve or DEFAULT_CURVE
+
+def set_reward(gid: int, level: int, role_id: Optional[int]) -> None:
+    """Grant role_id on reaching level (None removes the reward)."""
+    g = GUILDS.get(gid)
+    if role_id:
+        g.rewards[level] = role_id
+    else:
+        g.rewards.pop(level, None)
+    _DIRTY.add(gid)
+    mark_dirty("xp")
+
+def set_announce(gid: int, channel_id: Optional[int]) -> None:
+    g = GUILDS.get(gid)
+    g.announce = channel_id
+    _DIRTY.add(gid)
+    mark_dirty("xp")
+
+def drain_levelups() -> Dict[int, Dict[int, Tuple[int, int]]]:
+    """Pending level-ups grouped as gid -> {uid: (from level, to level)}."""
+    out: Dict[int, Dict[int, Tuple[int, int]]] = {}
+    for gid, uid, before, after in _LEVELUPS:
+        ups = out.setdefault(gid, {})
+        prev = ups.get(uid)
+        ups[uid] = (min(before, prev[0]), max(after, prev[1])) if prev else (before, after)
+    _LEVELUPS.clear()
+    return out
+
+def xptop_page(guild: discord.Guild, page: int, period: Optional[str] = None) -> Tuple[str, int, int]:
+    """Render one leaderboard page (all-time, or a rolling period); returns
+    (text, page, pages) with page clamped."""
+    gid = guild.id
+    settle_voice(gid)
+    total = window_count(gid, period) if period else xp_ranked_count(gid)
+    pages = max(1, -(-total // XPTOP_PAGE))
+    page = max(1, min(page, pages))
+    start = (page - 1) * XPTOP_PAGE
+    if period:
+        lines = [f"📅 **XP this {period}** — page {page}/{pages}"]
+        for n, (uid, gained) in enumerate(window_top(gid, period, start, XPTOP_PAGE), start=start + 1):
+            m = guild.get_member(uid)
+            name = m.display_name if m else f"<left:{uid}>"
+            lines.append(f"**{n}.** {name} — +{gained} XP")
+        if len(lines) == 1:
+            lines.append(f"Nobody has earned XP this {period} yet.")
+        return "\n".join(lines), page, pages
+    users = xp_top(gid, start, XPTOP_PAGE)
+    levels = curve_for(gid).levels([txp for _, txp in users])
+    lines = [f"🏆 **XP leaderboard** — page {page}/{pages}"]
+    for n, ((uid, txp), lvl) in enumerate(zip(users, levels), start=start + 1):
+        m = guild.get_member(uid)
+        name = m.display_name if m else f"<left:{uid}>"
+        lines.append(f"**{n}.** {name} — L{lvl} ({txp} XP)")
+    if len(lines) == 1:
+        lines.append("Nobody has XP yet.")
+    return "\n".join(lines), page, pages
+
 
 # ---------- Cog ----------
 class XP(commands.Cog):
@@ -80,34 +599,63 @@ class XP(commands.Cog):
         self.bot = bot
         self.file_path = file_path
         xp_load(self.file_path)
+        SCHEDULER.register("xp", xp_save_async, interval_ms=FLUSH_INTERVAL_MS)
+        self._voice_scanned = False
         # start loops inside cogs (discord.py 2.x)
-        if not self.autosave.is_running():
-            self.autosave.start()
-        if not self.voice_tick.is_running():
-            self.voice_tick.start()
+        if not self.voice_reconcile.is_running():
+            self.voice_reconcile.start()
+        if not self.levelup_dispatch.is_running():
+            self.levelup_dispatch.start()
+
+    async def cog_load(self):
+        ROLE_QUEUE.start(self.bot)
+
+    async def cog_unload(self):
+        ROLE_QUEUE.stop()
 
     # ===== Loops =====
-    @tasks.loop(minutes=5)
-    async def autosave(self):
-        xp_save(self.file_path)
-
-    @tasks.loop(seconds=VOICE_TICK_SEC)
-    async def voice_tick(self):
-        now = time.time()
-        for (gid, uid), joined in list(_voice_join.items()):
-            member = self.bot.get_guild(gid).get_member(uid) if self.bot.get_guild(gid) else None
-            if not member or not member.voice or not member.voice.channel:
-                # ended elsewhere; finalize and drop
-                minutes = max(0, int((now - joined) // 60))
-                if minutes:
-                    add_xp(gid, uid, minutes * VOICE_XP_PER_MIN)
-                _voice_join.pop((gid, uid), None)
+    @tasks.loop(seconds=LEVELUP_DISPATCH_SEC)
+    async def levelup_dispatch(self):
+        if not _LEVELUPS:
+            return
+        for gid, ups in drain_levelups().items():
+            guild = self.bot.get_guild(gid)
+            if guild is None:  # the bot left (or lost sight of) the guild since the level-up
+                print(f"[xp] skipped {len(ups)} level-up(s) in {gid}: guild not available")
                 continue
-
-            # still in voice; credit last tick interval
-            minutes = VOICE_TICK_SEC // 60
-            if minutes:
-                add_xp(gid, uid, minutes * VOICE_XP_PER_MIN)
+            g = GUILDS.get(gid)  # by id: reloads a shard evicted since the level-up, for its rewards/channel
+            if g.rewards:
+                for uid, (before, after) in ups.items():
+                    roles = [rid for lvl, rid in g.rewards.items() if before < lvl <= after]
+                    if roles:
+                        ROLE_QUEUE.put(gid, uid, roles)
+            channel = guild.get_channel(g.announce) if g.announce else None
+            if channel is not None:
+                await self._announce(guild, channel, ups)
+
+    async def _announce(self, guild: discord.Guild, channel, ups: Dict[int, Tuple[int, int]]):
+        """One message per guild per dispatch, however many members levelled up."""
+        lines = []
+        for uid, (_, after) in list(ups.items())[:ANNOUNCE_MAX_NAMES]:
+            m = guild.get_member(uid)
+            lines.append(f"🎉 {m.mention if m else f'<left:{uid}>'} reached **Level {after}**!")
+        if len(ups) > ANNOUNCE_MAX_NAMES:
+            lines.append(f"…and **{len(ups) - ANNOUNCE_MAX_NAMES}** more levelled up.")
+        try:
+            await channel.send("\n".join(lines), allowed_mentions=discord.AllowedMentions.none())
+        except discord.HTTPException as e:
+            print(f"[xp] level-up announcement in {guild.id} failed: {e!r}")
+
+    @tasks.loop(minutes=VOICE_RECONCILE_MIN)
+    async def voice_reconcile(self):
+        n = reconcile_voice(self.bot, scan=not self._voice_scanned)
+        self._voice_scanned = True
+        if n:
+            print(f"[xp] voice reconcile: {n} session(s) opened/closed")
+
+    @voice_reconcile.before_loop
+    async def _before_voice_reconcile(self):
+        await self.bot.wait_until_ready()
 
     # ===== Events =====
     @commands.Cog.listener()
@@ -115,76 +663,78 @@ class XP(commands.Cog):
         if msg.author.bot or not msg.guild:
             return
         key = (msg.guild.id, msg.author.id)
-        last = _msg_cd.get(key, 0.0)
-        now = time.time()
-        if now - last < MSG_COOLDOWN:
+        if not _msg_cd.hit(key):
+            return
+        if msg.content and _msg_dup.repeat(key, msg.content):
             return
-        _msg_cd[key] = now
-        add_xp(msg.guild.id, msg.author.id, random.randint(*MSG_XP_RANGE))
+        buffer_xp(msg.guild.id, msg.author.id, random.randint(*MSG_XP_RANGE))
 
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User | discord.Member):
         if user.bot or not reaction.message.guild:
             return
         key = (reaction.message.guild.id, user.id)
-        last = _react_cd.get(key, 0.0)
-        now = time.time()
-        if now - last < REACT_COOLDOWN:
+        if not _react_cd.hit(key):
             return
-        _react_cd[key] = now
-        add_xp(reaction.message.guild.id, user.id, REACT_XP)
+        buffer_xp(reaction.message.guild.id, user.id, REACT_XP)
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
-        gid, uid = member.guild.id, member.id
-        key = (gid, uid)
-        now = time.time()
-
         before_ch = before.channel.id if before and before.channel else None
         after_ch = after.channel.id if after and after.channel else None
-
-        # joined
+        # moving channels (or muting) keeps the session going; nothing to do
         if not before_ch and after_ch:
-            _voice_join[key] = now
-            return
-
-        # left
-        if before_ch and not after_ch:
-            joined = _voice_join.pop(key, None)
-            if joined:
-                minutes = max(0, int((now - joined) // 60))
-                if minutes:
-                    add_xp(gid, uid, minutes * VOICE_XP_PER_MIN)
-            return
-
-        # moved channels: treat as continuous
-        if before_ch and after_ch and before_ch != after_ch:
-            # nothing special; session continues
-            return
+            voice_join(member.guild.id, member.id)
+        elif before_ch and not after_ch:
+            voice_leave(member.guild.id, member.id)
 
     # ===== Commands =====
     @commands.command(name="level", aliases=["xp"])
     async def level_cmd(self, ctx: commands.Context, member: discord.Member | None = None):
         """Show your (or someone’s) level + XP."""
         member = member or ctx.author
+        settle_voice(ctx.guild.id, member.id)
         txp = total_xp(ctx.guild.id, member.id)
-        lvl, into, need = level_from_total(txp)
+        lvl, into, need = curve_for(ctx.guild.id).level(txp)
         await ctx.send(f"⭐ **{member.display_name}** — Level **{lvl}** ({into}/{need} XP into next) • Total XP: **{txp}**")
 
+    async def _send_top(self, ctx: commands.Context, page: int, period: Optional[str] = None):
+        text, page, pages = xptop_page(ctx.guild, page, period)
+        view = Pager(lambda p: xptop_page(ctx.guild, p, period), page, pages, ctx.author.id) if pages > 1 else None
+        await send_paged(ctx, text, view)
+
     @commands.command(name="xptop", aliases=["levels", "leaderboard"])
-    async def xptop_cmd(self, ctx: commands.Context, limit: int = 10):
-        """Top XP users in this server."""
-        g = _g(ctx.guild.id)
-        users = [(int(uid), data.get("xp", 0)) for uid, data in g["users"].items()]
-        users.sort(key=lambda t: t[1], reverse=True)
-        lines = []
-        for i, (uid, txp) in enumerate(users[:max(1, min(25, limit))], start=1):
-            m = ctx.guild.get_member(uid)
-            name = m.display_name if m else f"<left:{uid}>"
-            lvl, into, need = level_from_total(txp)
-            lines.append(f"**{i}.** {name} — L{lvl} ({txp} XP)")
-        if not lines:
-            lines = ["Nobody has XP yet."]
+    async def xptop_cmd(self, ctx: commands.Context, page: int = 1):
+        """Top XP users in this server, XPTOP_PAGE per page."""
+        await self._send_top(ctx, page)
+
+    @commands.command(name="weektop", aliases=["xpweek"])
+    async def weektop_cmd(self, ctx: commands.Context, page: int = 1):
+        """Most XP earned in the last 7 days."""
+        await self._send_top(ctx, page, "week")
+
+    @commands.command(name="monthtop", aliases=["xpmonth"])
+    async def monthtop_cmd(self, ctx: commands.Context, page: int = 1):
+        """Most XP earned in the last 30 days."""
+        await self._send_top(ctx, page, "month")
+
+    @commands.command(name="rank")
+    async def rank_cmd(self, ctx: commands.Context, member: discord.Member | None = None):
+        """Your (or someone’s) place on the XP leaderboard."""
+        member = member or ctx.author
+        gid = ctx.guild.id
+        settle_voice(gid, member.id)
+        rank = xp_rank(gid, member.id)
+        if rank is None:
+            return await ctx.send(f"📉 **{member.display_name}** has no XP yet.")
+        txp = total_xp(gid, member.id)
+        lvl, _, _ = curve_for(gid).level(txp)
+        lines = [f"🏅 **{member.display_name}** is **#{rank}** of {xp_ranked_count(gid)} "
+                 f"— Level **{lvl}** • Total XP: **{txp}**"]
+        for period in WINDOWS:
+            wr = window_rank(gid, period, member.id)
+            if wr is not None:
+                lines.append(f"📅 This {period}: **#{wr}** (+{window_xp(gid, period, member.id)} XP)")
         await ctx.send("\n".join(lines))
 
     # --- admin ---
@@ -196,17 +746,82 @@ class XP(commands.Cog):
     @commands.command(name="xpadd")
     @_is_admin()
     async def xpadd_cmd(self, ctx: commands.Context, member: discord.Member, amount: int):
-        new = add_xp(ctx.guild.id, member.id, amount)
+        try:
+            new = add_xp(ctx.guild.id, member.id, amount)
+        except ValueError as e:  # OutOfRange: nothing changed
+            return await ctx.send(f"❌ {e} Usage: `!xpadd @member <amount>`")
         await ctx.send(f"✅ Added **{amount}** XP to **{member.display_name}** (now {new} total).")
 
     @commands.command(name="xpset")
     @_is_admin()
     async def xpset_cmd(self, ctx: commands.Context, member: discord.Member, total: int):
-        new = set_total_xp(ctx.guild.id, member.id, total)
+        try:
+            new = set_total_xp(ctx.guild.id, member.id, total)
+        except ValueError as e:
+            return await ctx.send(f"❌ {e} Usage: `!xpset @member <total>`")
         await ctx.send(f"🛠️ Set **{member.display_name}** total XP to **{new}**.")
 
+    @commands.command(name="xpairdrop")
+    @_is_admin()
+    async def xpairdrop_cmd(self, ctx: commands.Context, amount: int, role: discord.Role | None = None):
+        """Give XP to every member (or every member of a role)."""
+        members = role.members if role else ctx.guild.members
+        try:
+            n = add_xp_many(ctx.guild.id, (m.id for m in members if not m.bot), amount)
+        except ValueError as e:  # OutOfRange: nobody was credited
+            return await ctx.send(f"❌ {e} Usage: `!xpairdrop <amount> [@role]`")
+        target = f" with {role.name}" if role else ""
+        await ctx.send(f"🪂 Gave **{amount}** XP to **{n}** member(s){target}.")
+
+    @commands.command(name="xpcurve")
+    @_is_admin()
+    async def xpcurve_cmd(self, ctx: commands.Context, kind: str | None = None, *args: str):
+        """Show or set this server's level curve: quadratic <a> <b> <c> | exponential <base> <growth> | table <steps...> | reset."""
+        gid = ctx.guild.id
+        if kind is None:
+            curve = curve_for(gid)
+        else:
+            try:
+                curve = set_curve(gid, None if kind.lower() == "reset" else parse_spec(kind, args))
+            except (KeyError, TypeError, ValueError) as e:
+                return await ctx.send(f"❌ {e}")
+        marks = ", ".join(f"L{n}: {curve.total_for(n):,}" for n in (1, 5, 10, 25, 50))
+        await ctx.send(f"📈 Level curve: **{curve.describe()}**\nTotal XP for {marks}")
+
+    @commands.command(name="xpreward")
+    @_is_admin()
+    async def xpreward_cmd(self, ctx: commands.Context, level: int | None = None, role: discord.Role | None = None):
+        """List level rewards, or set one: !xpreward <level> <@role> (omit the role to remove it)."""
+        gid = ctx.guild.id
+        if level is None:
+            rewards = GUILDS.get(gid).rewards
+            if not rewards:
+                return await ctx.send("🎁 No level rewards yet. Add one with `!xpreward <level> <@role>`.")
+            lines = ["🎁 **Level rewards**"]
+            for lvl, rid in sorted(rewards.items()):
+                r = ctx.guild.get_role(rid)
+                lines.append(f"• Level **{lvl}** → {r.name if r else f'<deleted role {rid}>'}")
+            return await ctx.send("\n".join(lines))
+        if level < 1:
+            return await ctx.send("❌ Level must be 1 or higher.")
+        set_reward(gid, level, role.id if role else None)
+        if role:
+            await ctx.send(f"🎁 Reaching Level **{level}** now grants **{role.name}**.")
+        else:
+            await ctx.send(f"🗑️ Removed the Level **{level}** reward.")
+
+    @commands.command(name="xpannounce")
+    @_is_admin()
+    async def xpannounce_cmd(self, ctx: commands.Context, channel: discord.TextChannel | None = None):
+        """Post level-ups in a channel: !xpannounce #channel (no channel turns it off)."""
+        set_announce(ctx.guild.id, channel.id if channel else None)
+        if channel:
+            await ctx.send(f"📣 Level-ups will be announced in {channel.mention}.")
+        else:
+            await ctx.send("🔕 Level-up announcements are off.")
+
     @commands.command(name="xpsave")
     @_is_admin()
     async def xpsave_cmd(self, ctx: commands.Context):
-        xp_save(self.file_path)
+        await SCHEDULER.flush("xp")
         await ctx.message.add_reaction("💾")
\ No newline at end of file
@@ -0,0 +1,36 @@
+# tests/conftest.py
+from __future__ import annotations
+import os, sys
+
+import pytest
+
+# The bot runs from the repo root (python bot.py), so its packages import from there.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def bank(tmp_path):
+    """cogs.bank pointed at an empty JSON bank under tmp_path."""
+    from cogs import bank as mod
+    before = mod._BANK_PATH
+    mod.set_path(str(tmp_path / "bank.json"))
+    mod.bank_load()
+    yield mod
+    mod.set_path(before)
+
+
+@pytest.fixture
+def xp(tmp_path):
+    """cogs.xp pointed at an empty store under tmp_path."""
+    pytest.importorskip("discord")
+    from cogs import xp as mod
+    before = mod._XP_PATH
+    mod.xp_load(str(tmp_path / "xp.json"))
+    mod._PENDING.clear()
+    mod._LEVELUPS.clear()
+    yield mod
+    mod._PENDING.clear()
+    mod._LEVELUPS.clear()
+    mod._XP_PATH = before
+    mod.GUILDS.clear()
+    mod._DIRTY.clear()
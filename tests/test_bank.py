@@ -0,0 +1,146 @@
+# tests/test_bank.py
+from __future__ import annotations
+import asyncio, json, os
+
+import pytest
+
+from cogs.columns import INT64_MAX, OutOfRange
+
+GID = 1
+
+
+def restart(bank):
+    """What a restart does to the bank: buffered records hit the file, the cache is dropped."""
+    bank.bank_load()
+
+
+def journal(bank, ext=".journal"):
+    return bank._shard(GID, ext)
+
+
+def assert_ranked(bank, gid=GID):
+    """The leaderboard index agrees with the balance column."""
+    g = bank._guild(gid)
+    want = sorted(((u, g.balance[i]) for i, u in enumerate(g.uids) if bank._ranked(u)),
+                  key=lambda ub: (-ub[1], ub[0]))
+    assert bank.balance_top(gid, 0, len(want) + 1) == want
+    for n, (uid, _) in enumerate(want, start=1):
+        assert bank.balance_rank(gid, uid) == n
+
+
+async def pay(bank, legs):
+    async with bank.transaction(GID) as tx:
+        for uid, delta in legs:
+            tx.add(uid, delta)
+
+
+# ---- journal ----
+def test_replay_restores_every_field(bank):
+    bank.add_balance(GID, 10, 500)
+    bank.add_balance(GID, 11, 70)
+    bank.set_last_daily(GID, 10, 1_700_000_000)
+    bank.set_pity(GID, 11, 3)
+    asyncio.run(pay(bank, [(10, -200), (11, +200)]))
+    restart(bank)
+    assert bank.get_balance(GID, 10) == 300
+    assert bank.get_balance(GID, 11) == 270
+    assert bank.get_last_daily(GID, 10) == 1_700_000_000
+    assert bank.get_last_daily(GID, 11) is None
+    assert bank.get_pity(GID, 11) == 3
+
+
+def test_torn_line_is_cut_off(bank):
+    bank.add_balance(GID, 10, 500)
+    bank.add_balance(GID, 10, 25)
+    bank.bank_save()
+    good = os.path.getsize(journal(bank))
+    with open(journal(bank), "a", encoding="utf-8") as f:
+        f.write('["b",10,99')  # crash mid-record
+    restart(bank)
+    assert bank.get_balance(GID, 10) == 525
+    assert os.path.getsize(journal(bank)) == good
+    bank.add_balance(GID, 10, 5)  # new records land after the cut, not after the torn bytes
+    restart(bank)
+    assert bank.get_balance(GID, 10) == 530
+
+
+def test_torn_transaction_drops_every_leg(bank):
+    bank.add_balance(GID, 10, 100)
+    bank.bank_save()
+    with open(journal(bank), "a", encoding="utf-8") as f:
+        f.write('["t",[["b",10,0],["b",11,10')
+    restart(bank)
+    assert bank.get_balance(GID, 10) == 100
+    assert bank.get_balance(GID, 11) == 0
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(bank):
+    for uid in range(1, 6):
+        bank.add_balance(GID, uid, uid * 10)
+    bank.set_pity(GID, 2, 4)
+    assert bank.bank_compact() > 0
+    assert not os.path.exists(journal(bank, ".journal.1"))
+    assert not os.path.exists(journal(bank)) or os.path.getsize(journal(bank)) == 0
+    with open(bank._shard(GID), encoding="utf-8") as f:
+        snap = json.load(f)
+    assert snap["balances"] == {str(u): u * 10 for u in range(1, 6)}
+    restart(bank)
+    assert [bank.get_balance(GID, u) for u in range(1, 6)] == [10, 20, 30, 40, 50]
+    assert bank.get_pity(GID, 2) == 4
+
+
+def test_interrupted_compaction_replays_the_rotated_journal(bank):
+    bank.add_balance(GID, 10, 100)
+    bank.bank_compact()
+    bank.add_balance(GID, 10, 50)
+    bank._rotate_journal(GID)  # crash after the rotate, before the snapshot was written
+    bank.add_balance(GID, 11, 7)
+    restart(bank)
+    assert bank.get_balance(GID, 10) == 150
+    assert bank.get_balance(GID, 11) == 7
+    bank.bank_compact()
+    assert not os.path.exists(journal(bank, ".journal.1"))
+    restart(bank)
+    assert (bank.get_balance(GID, 10), bank.get_balance(GID, 11)) == (150, 7)
+
+
+# ---- int64 range and the leaderboard ----
+def test_overflow_changes_nothing(bank):
+    bank.add_balance(GID, 10, INT64_MAX - 5)
+    bank.add_balance(GID, 11, 40)
+    assert_ranked(bank)
+    with pytest.raises(OutOfRange):
+        bank.add_balance(GID, 10, 6)
+    with pytest.raises(OutOfRange):
+        bank.add_balance(GID, 12, INT64_MAX + 1)
+    assert bank.get_balance(GID, 10) == INT64_MAX - 5
+    assert bank._guild(GID).find(12) == -1  # no slot claimed for the refused write
+    assert_ranked(bank)
+    restart(bank)  # nothing refused reached the journal either
+    assert bank.get_balance(GID, 10) == INT64_MAX - 5
+    assert_ranked(bank)
+
+
+def test_batch_overflow_applies_no_leg(bank):
+    bank.add_balance(GID, 10, INT64_MAX - 5)
+    bank.add_balance(GID, 11, 40)
+    with pytest.raises(OutOfRange):
+        bank.add_balance_many(GID, [11, 12, 10], 10)
+    with pytest.raises(OutOfRange):
+        asyncio.run(pay(bank, [(11, -10), (10, +10)]))
+    assert bank.get_balance(GID, 11) == 40
+    assert bank._guild(GID).find(12) == -1
+    assert_ranked(bank)
+    assert bank.add_balance_many(GID, [11, 12], 10) == 2
+    assert_ranked(bank)
+
+
+def test_leaderboard_follows_every_write(bank):
+    bank.add_balance(GID, 0, 10_000)  # house account: stored, never ranked
+    for uid in range(1, 40):
+        bank.add_balance(GID, uid, (uid * 37) % 11)
+    assert_ranked(bank)
+    bank.add_balance_many(GID, range(1, 40, 3), 5)
+    asyncio.run(pay(bank, [(2, -1), (3, +1)]))
+    bank.add_balance(GID, 7, -3)
+    assert_ranked(bank)
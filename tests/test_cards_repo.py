@@ -0,0 +1,55 @@
+# tests/test_cards_repo.py
+from __future__ import annotations
+import json
+from array import array
+
+from carddata import RARITIES
+from cogs import cards_repo, catalog
+from cogs.cards_repo import from_json, new_card, pack, power, rarity_of, to_json, unpack, view
+
+
+def test_pack_round_trips_every_field():
+    tid = catalog.tid_for("chibi-luffy")
+    for r in range(len(RARITIES)):
+        for atk, de in ((0, 0), (170, 160), (0xFFFF, 1), (1, 0xFFFF)):
+            x = pack(tid, r, atk, de)
+            assert unpack(x) == (tid, r, atk, de)
+            assert rarity_of(x) == RARITIES[r]
+            assert power(x) == atk + de
+
+
+def test_stats_clamp_to_their_field():
+    x = pack(3, 1, -5, 0x1_0000)
+    assert unpack(x) == (3, 1, 0, 0xFFFF)
+
+
+def test_view_resolves_the_template():
+    x = new_card("chibi-luffy", "rare", 210, 190)
+    assert view(x) == {"id": "chibi-luffy", "name": "Chibi Luffy", "element": "Spirit",
+                       "series": "One Piece", "rarity": "rare", "atk": 210, "def": 190}
+
+
+def test_shard_json_round_trip():
+    inv = {
+        7: array("q", [new_card("chibi-luffy", "common", 170, 160),
+                       new_card("chibi-nami", "epic", 300, 310),
+                       new_card("chibi-luffy", "legendary", 999, 998)]),
+        8: array("q", [new_card("not-in-carddata-anymore", "rare", 5, 6)]),
+        9: array("q"),
+    }
+    data = json.loads(json.dumps(to_json(inv)))  # through text, as on disk
+    assert data["version"] == cards_repo.SCHEMA_VERSION
+    assert len(data["templates"]) == 3
+    back, upgraded = from_json(data)
+    assert not upgraded
+    assert {u: list(c) for u, c in back.items()} == {u: list(c) for u, c in inv.items() if c}
+    assert view(back[8][0])["id"] == "not-in-carddata-anymore"
+
+
+def test_old_card_dicts_are_upgraded():
+    data = {"123": [{"id": "chibi-nami", "name": "Chibi Nami", "element": "Water",
+                     "rarity": "Epic", "atk": 301, "def": 302}, {"bogus": True}]}
+    inv, upgraded = from_json(data)
+    assert upgraded
+    [x] = inv[123]
+    assert view(x)["name"] == "Chibi Nami" and unpack(x)[1:] == (RARITIES.index("epic"), 301, 302)
@@ -0,0 +1,67 @@
+# tests/test_ranking.py
+from __future__ import annotations
+import random
+from bisect import bisect_left, insort
+
+import pytest
+
+from cogs.ranking import RankIndex, key, unkey
+
+
+class SmallIndex(RankIndex):
+    LOAD = 4  # tiny buckets, so a few hundred keys split and empty many of them
+
+
+def check(idx, ref):
+    assert len(idx) == len(ref)
+    assert idx.slice(0, len(ref)) == ref
+    for k in ref[::7]:
+        assert idx.index(k) == bisect_left(ref, k)
+        assert k in idx
+    for start in range(0, len(ref) + 3, 5):
+        assert idx.slice(start, start + 6) == ref[start:start + 6]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_a_sorted_list(seed):
+    rng = random.Random(seed)
+    ref = sorted(key(rng.randrange(50), uid) for uid in range(60))
+    idx = SmallIndex(ref)
+    uids = {unkey(k)[0]: k for k in ref}
+    next_uid = 60
+    for step in range(600):
+        op = rng.random()
+        if op < 0.4 and uids:  # a score change
+            uid = rng.choice(list(uids))
+            old, new = uids[uid], key(rng.randrange(-20, 80), uid)
+            idx.replace(old, new)
+            ref.remove(old)
+            insort(ref, new)
+            uids[uid] = new
+        elif op < 0.7:
+            k = uids[next_uid] = key(rng.randrange(50), next_uid)
+            next_uid += 1
+            idx.add(k)
+            insort(ref, k)
+        elif uids:
+            k = uids.pop(rng.choice(list(uids)))
+            idx.remove(k)
+            ref.remove(k)
+        if step % 25 == 0:
+            check(idx, ref)
+    check(idx, ref)
+    probe = key(1000, 0)  # sorts before every key: more than any score
+    assert idx.index(probe) == 0 and probe not in idx
+
+
+def test_keys_sort_best_first_then_by_uid():
+    ks = [key(5, 2), key(9, 7), key(5, 1), key(0, 3), key(-4, 1)]
+    assert [unkey(k) for k in sorted(ks)] == [(7, 9), (1, 5), (2, 5), (3, 0), (1, -4)]
+
+
+def test_remove_missing_raises():
+    idx = RankIndex([key(1, 1)])
+    with pytest.raises(ValueError):
+        idx.remove(key(2, 1))
+    idx.remove(key(1, 1))
+    assert len(idx) == 0 and idx.slice(0, 10) == [] and idx.index(key(1, 1)) == 0
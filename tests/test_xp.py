@@ -0,0 +1,80 @@
+# tests/test_xp.py
+from __future__ import annotations
+import asyncio
+
+import pytest
+
+from cogs.columns import INT64_MAX, OutOfRange
+
+GID = 1
+
+
+def assert_ranked(xp, gid=GID):
+    """The leaderboard index agrees with the xp column."""
+    g = xp._fold(gid)
+    want = sorted(zip(g.uids, g.xp), key=lambda ux: (-ux[1], ux[0]))
+    assert xp.xp_top(gid, 0, len(want) + 1) == want
+    for n, (uid, _) in enumerate(want, start=1):
+        assert xp.xp_rank(gid, uid) == n
+
+
+def test_overflow_changes_nothing(xp):
+    xp.set_total_xp(GID, 10, INT64_MAX - 5)
+    xp.add_xp(GID, 11, 40)
+    assert_ranked(xp)
+    with pytest.raises(OutOfRange):
+        xp.add_xp(GID, 10, 6)
+    with pytest.raises(OutOfRange):
+        xp.set_total_xp(GID, 12, INT64_MAX + 1)
+    with pytest.raises(OutOfRange):
+        xp.add_xp(GID, 13, INT64_MAX + 1)
+    assert xp.total_xp(GID, 10) == INT64_MAX - 5
+    g = xp.GUILDS.get(GID)
+    assert g.find(12) == -1 and g.find(13) == -1  # no slot claimed for a refused write
+    assert_ranked(xp)
+
+
+def test_batch_overflow_applies_no_leg(xp):
+    xp.set_total_xp(GID, 10, INT64_MAX - 5)
+    xp.add_xp(GID, 11, 40)
+    with pytest.raises(OutOfRange):
+        xp.add_xp_many(GID, [11, 12, 10], 10)
+    assert xp.total_xp(GID, 11) == 40
+    assert xp.GUILDS.get(GID).find(12) == -1
+    assert_ranked(xp)
+    assert xp.add_xp_many(GID, [11, 12], 10) == 2
+    assert_ranked(xp)
+
+
+def test_refused_buffered_delta_keeps_the_rest(xp):
+    xp.set_total_xp(GID, 10, INT64_MAX - 5)
+    xp.buffer_xp(GID, 10, 100)
+    xp.buffer_xp(GID, 11, 20)
+    xp.buffer_xp(GID + 1, 11, 7)
+    asyncio.run(xp.xp_save_async())
+    assert xp.total_xp(GID, 10) == INT64_MAX - 5
+    assert xp.total_xp(GID, 11) == 20
+    assert xp.total_xp(GID + 1, 11) == 7
+    assert xp.pending_xp() == 0
+    assert_ranked(xp)
+
+
+def test_leaderboard_follows_every_write(xp):
+    for uid in range(1, 40):
+        xp.add_xp(GID, uid, (uid * 37) % 11)
+    assert_ranked(xp)
+    xp.add_xp_many(GID, range(1, 40, 3), 5)
+    xp.set_total_xp(GID, 4, 0)
+    xp.add_xp(GID, 7, -100)  # clamps at zero
+    for uid in range(20, 30):
+        xp.buffer_xp(GID, uid, uid)
+    assert_ranked(xp)
+
+
+def test_totals_survive_a_reload(xp, tmp_path):
+    xp.add_xp(GID, 10, 123)
+    xp.buffer_xp(GID, 11, 45)
+    xp.xp_save()
+    xp.xp_load(str(tmp_path / "xp.json"))
+    assert (xp.total_xp(GID, 10), xp.total_xp(GID, 11)) == (123, 45)
+    assert_ranked(xp)